@@ -1,14 +1,52 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from uuid import uuid4
+
 from loguru import logger
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Request, UploadFile, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from pydantic.v1 import ValidationError
 
+from ffmpeg_runner import FFmpegError, progress_broker
+from hls import HLS_DIR
+from jobs import batch_status, job_store
 from main import process_video_cut_request
-from models import VideoTranscript, TranscriptSegment
+from models import OUTPUT_PROFILES, BatchManifest, OutputProfile, VideoTranscript
+from probe import probe_media_info
+from render_cache import remember_file_hash, render_cache
+from selections import selection_store
+from tracing import current_run_id, metrics, span
+from transcript_ingest import ingest_transcript, iter_file_lines
+from upload_stream import UploadedPart, receive_multipart, store_upload
 import os
 
-app = FastAPI()
-
 UPLOAD_DIR = "uploads"
 
+# Worker processes started with the API (0 = run `python worker.py --workers N` separately)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+
+SSE_KEEPALIVE_SECONDS = 15
+JOB_PROGRESS_POLL_SECONDS = 1
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Starts the job worker processes with the API and stops them on shutdown."""
+    from worker import start_workers
+
+    workers = start_workers(JOB_WORKERS, job_store.path) if JOB_WORKERS > 0 else []
+    yield
+    for worker in workers:
+        worker.terminate()
+
+
+app = FastAPI(lifespan=lifespan)
+# HLS playlists (RENDER_MODE=hls) grow while the reel renders: /hls/<run_id>/index.m3u8
+app.mount("/hls", StaticFiles(directory=HLS_DIR, check_dir=False), name="hls")
+
 
 def format_time(seconds):
     """Format seconds to hh:mm:ss"""
@@ -21,19 +59,32 @@ def format_time(seconds):
 # get transcript
 def parse_transcript(file_content: str) -> VideoTranscript:
     """Parse tactiq.io transcript from .txt into VideoTranscript"""
-    segments = []
+    transcript_model, _ = ingest_transcript(file_content.splitlines())
+    return transcript_model
 
-    for line in file_content.splitlines():
-        if line.strip() and not line.startswith("#") and not "youtube.com" in line:
-            timestamp, text = line.split(" ", 1)
-            segments.append(TranscriptSegment(start_time=timestamp.strip(), text=text.strip()))
 
-    return VideoTranscript(segments=segments)
+def parse_output_profiles(profiles: Optional[str]) -> Optional[List[OutputProfile]]:
+    """
+    Parses the requested output profiles: comma-separated preset names ("landscape,vertical") or a JSON list of
+    preset names and/or profile objects. None renders a single reel at the source size.
+    """
+    if not profiles:
+        return None
+    try:
+        requested = json.loads(profiles) if profiles.lstrip().startswith("[") else profiles.split(",")
+        parsed = [OUTPUT_PROFILES[item.strip()] if isinstance(item, str) else OutputProfile.parse_obj(item)
+                  for item in requested]
+    except KeyError as e:
+        raise HTTPException(status_code=422, detail=f"Unknown output profile {e}, presets: {list(OUTPUT_PROFILES)}")
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid output profiles: {str(e)}")
+    if len({profile.name for profile in parsed}) != len(parsed):
+        raise HTTPException(status_code=422, detail="Output profile names must be unique")
+    return parsed
 
 
-@app.post("/cut-video/")
-async def cut_video_endpoint(transcript_file: UploadFile = File(...)):
-    """Endpoint to handle video cutting based on the uploaded transcript file."""
+def local_video_path() -> str:
+    """Returns the local source video, or raises a 404 if it is missing."""
     if not os.path.exists(UPLOAD_DIR):
         os.mkdir(UPLOAD_DIR)
 
@@ -43,25 +94,329 @@ async def cut_video_endpoint(transcript_file: UploadFile = File(...)):
         raise HTTPException(status_code=404, detail="Video file not found")
 
     logger.info(f"Using local video file: {video_path}")
+    return video_path
+
+
+def upload_file_path(name: str) -> str:
+    """Returns the path of a file in the upload directory, or raises a 404 (422 for names outside of it)."""
+    upload_dir = os.path.realpath(UPLOAD_DIR)
+    path = os.path.realpath(os.path.join(upload_dir, name))
+    if os.path.commonpath([upload_dir, path]) != upload_dir:
+        raise HTTPException(status_code=422, detail=f"{name} is not in the upload directory")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"File not found: {name}")
+    return path
+
 
-    # read and parse the transcript file
+def read_transcript_upload(transcript_file: UploadFile):
+    """Parses the transcript upload line by line, once, into the model and its time index."""
+    return read_transcript_file(transcript_file.file)
+
+
+def read_transcript_file(file):
+    """Parses a binary transcript file line by line, once, into the model and its time index."""
     try:
-        transcript_data = await transcript_file.read()
-        transcript_content = transcript_data.decode("utf-8")
-        transcript_model = parse_transcript(transcript_content)
+        with span("transcript_parse") as parse_span:
+            transcript_model, transcript_index = ingest_transcript(iter_file_lines(file))
+            parse_span.set(segments=len(transcript_model.segments))
+        return transcript_model, transcript_index
     except Exception as e:
         logger.error(f"Error parsing transcript file: {e}")
         raise HTTPException(status_code=500, detail="Failed to parse transcript file")
 
-    # cut and merge
+
+async def run_cut_request(video_path: str, transcript_model: VideoTranscript, run_id: str,
+                          output_profiles: Optional[List[OutputProfile]], preview: bool, **kwargs) -> dict:
+    """
+    Runs the pipeline and builds the endpoint response. Preview selections are saved so they can be
+    finalized later; their id is returned as selection_id.
+    """
     try:
-        video_cut_response = await process_video_cut_request(video_path, transcript_model)
+        video_cut_response = await process_video_cut_request(video_path, transcript_model, run_id=run_id,
+                                                             profiles=output_profiles, preview=preview, **kwargs)
     except HTTPException as e:
         logger.error(f"Error during video processing: {e}")
         raise e
 
-    return {
+    response = {
         "message": "Video processed successfully!",
+        "run_id": run_id,
         "merged_output": video_cut_response.merged_video_path,
+        "stage_timings": video_cut_response.stage_timings,
+        "workspace_peak_bytes": video_cut_response.workspace_peak_bytes,
+        "renditions": video_cut_response.renditions,
         # "summary": video_cut_response.summary
     }
+    if preview:
+        response["selection_id"] = await asyncio.to_thread(selection_store.save, video_path, transcript_model,
+                                                           video_cut_response.soundbites)
+        response["soundbites"] = [soundbite.dict(exclude={"file_path"}) for soundbite in video_cut_response.soundbites]
+    return response
+
+
+@app.post("/cut-video/")
+async def cut_video_endpoint(transcript_file: UploadFile = File(...), run_id: Optional[str] = None,
+                             profiles: Optional[str] = None, preview: bool = False):
+    """
+    Endpoint to handle video cutting based on the uploaded transcript file.
+    Pass a run_id to follow the FFmpeg progress of this request on /cut-video/progress, and output profiles
+    (e.g. ?profiles=landscape,vertical,square) to get one reel per profile from a single render.
+    With preview=true a small, fast reel is rendered; finalize it with POST /cut-video/finalize/{selection_id}.
+    """
+    run_id = run_id or uuid4().hex
+    current_run_id.set(run_id)  # so the spans before the pipeline (e.g. transcript parsing) join its trace
+    output_profiles = parse_output_profiles(profiles)
+    video_path = local_video_path()
+    transcript_model, transcript_index = read_transcript_upload(transcript_file)
+
+    # cut and merge
+    return await run_cut_request(video_path, transcript_model, run_id, output_profiles, preview,
+                                 transcript_index=transcript_index)
+
+
+@app.post("/cut-video/finalize/{selection_id}")
+async def finalize_cut_video_endpoint(selection_id: str, run_id: Optional[str] = None,
+                                      profiles: Optional[str] = None):
+    """Renders the soundbites of a preview at full quality (optionally per output profile), without the LLM."""
+    run_id = run_id or uuid4().hex
+    current_run_id.set(run_id)
+    output_profiles = parse_output_profiles(profiles)
+    selection = await asyncio.to_thread(selection_store.load, selection_id)
+    if selection is None:
+        raise HTTPException(status_code=404, detail="Selection not found or expired")
+    video_path, transcript_model, soundbites = selection
+    if not os.path.exists(video_path):
+        raise HTTPException(status_code=404, detail="Video file not found")
+
+    return await run_cut_request(video_path, transcript_model, run_id, output_profiles, False,
+                                 soundbites=soundbites)
+
+
+@app.post("/cut-video/upload/")
+async def cut_uploaded_video_endpoint(request: Request, run_id: Optional[str] = None,
+                                      profiles: Optional[str] = None, preview: bool = False):
+    """
+    Cuts an uploaded source video: a multipart upload with video_file and transcript_file.
+    Both are streamed to disk in fixed-size chunks, the video is hashed while it arrives (for the render cache)
+    and probed as soon as its first bytes are on disk.
+    """
+    run_id = run_id or uuid4().hex
+    current_run_id.set(run_id)
+    output_profiles = parse_output_profiles(profiles)
+    media_info = {}
+
+    async def probe_source(part: UploadedPart):
+        try:
+            media_info.update(await probe_media_info(part.path))
+        except FFmpegError as e:
+            # e.g. MP4s with the moov atom at the end can only be probed once complete
+            logger.info(f"Early probe of {part.filename} was inconclusive ({e.reason}), probing after the upload")
+
+    parts = await receive_multipart(request, UPLOAD_DIR, on_probe_ready=probe_source)
+    video_part, transcript_part = parts.pop("video_file", None), parts.pop("transcript_file", None)
+    for part in parts.values():
+        part.discard()
+    if video_part is None or transcript_part is None:
+        for part in (video_part, transcript_part):
+            if part is not None:
+                part.discard()
+        raise HTTPException(status_code=422, detail="Both video_file and transcript_file are required")
+
+    try:
+        with open(transcript_part.path, "rb") as f:
+            transcript_model, transcript_index = read_transcript_file(f)
+    finally:
+        transcript_part.discard()
+
+    video_path = store_upload(video_part, UPLOAD_DIR)
+    remember_file_hash(video_path, video_part.sha256)
+    if not media_info.get("video_codec"):
+        try:
+            media_info.update(await probe_media_info(video_path))
+        except FFmpegError as e:
+            logger.error(f"Uploaded file is not a readable video: {str(e)}")
+    if not media_info.get("video_codec"):
+        os.remove(video_path)
+        raise HTTPException(status_code=415, detail="The uploaded file has no readable video stream")
+
+    response = await run_cut_request(video_path, transcript_model, run_id, output_profiles, preview,
+                                     transcript_index=transcript_index)
+    response["source"] = {"sha256": video_part.sha256, "size_bytes": video_part.size, **media_info}
+    return response
+
+
+def sse_event(event: dict) -> str:
+    """Formats a progress event as a Server-Sent Event."""
+    return f"event: progress\ndata: {json.dumps(event)}\n\n"
+
+
+@app.get("/cut-video/progress")
+async def cut_video_progress(run_id: Optional[str] = None):
+    """
+    Streams FFmpeg progress (out_time, fps, speed as x realtime) of every stage and segment as Server-Sent Events,
+    for one request when run_id is given. A keep-alive comment is sent when nothing happens for a while.
+    """
+    async def events():
+        subscription = progress_broker.subscribe(run_id).__aiter__()
+        next_event = None
+        try:
+            while True:
+                next_event = next_event or asyncio.ensure_future(subscription.__anext__())
+                done, _ = await asyncio.wait({next_event}, timeout=SSE_KEEPALIVE_SECONDS)
+                if not done:
+                    yield ": keep-alive\n\n"
+                    continue
+                event, next_event = next_event.result(), None
+                yield sse_event(event)
+        finally:
+            if next_event:
+                next_event.cancel()
+            await subscription.aclose()
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Stage durations, bytes in/out and FFmpeg speed of this process in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/render-cache/")
+async def render_cache_endpoint():
+    """Lists the cached render artifacts and the disk space they use."""
+    return {**render_cache.stats(), "items": render_cache.entries()}
+
+
+@app.delete("/render-cache/")
+async def purge_render_cache_endpoint(key: Optional[str] = None):
+    """Purges one cached artifact (by key) or the whole render cache."""
+    removed = render_cache.purge(key)
+    if key and not removed:
+        raise HTTPException(status_code=404, detail="Cache entry not found")
+    return {"removed": removed}
+
+
+@app.post("/batches/cut-video/", status_code=202)
+async def submit_batch_endpoint(request: Request, profiles: Optional[str] = None):
+    """
+    Queues a batch of episodes from a JSON manifest, {"items": [{"video": ..., "transcript": ...}, ...]}, naming
+    videos and transcripts in the upload directory. Every episode is a job of the persistent queue, run by the
+    workers; poll GET /batches/{batch_id} for the status and output of every episode.
+    """
+    output_profiles = parse_output_profiles(profiles)
+    try:
+        manifest = BatchManifest.parse_obj(await request.json())
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid batch manifest: {str(e)}")
+
+    def read_manifest_transcript(name: str) -> VideoTranscript:
+        with open(upload_file_path(name), "rb") as f:
+            return read_transcript_file(f)[0]
+
+    # every file is checked and every transcript parsed before the first episode is queued
+    payloads = []
+    for item in manifest.items:
+        video_path = upload_file_path(item.video)
+        transcript_model = await asyncio.to_thread(read_manifest_transcript, item.transcript)
+        payloads.append({"video": item.video, "video_path": video_path, "transcript": transcript_model.json(),
+                         "profiles": [profile.dict() for profile in output_profiles or []], "run_id": item.run_id})
+
+    batch_id = uuid4().hex
+    await asyncio.to_thread(job_store.enqueue_many, payloads, batch_id)
+    return await asyncio.to_thread(batch_response, batch_id)
+
+
+def batch_response(batch_id: str) -> dict:
+    """Returns the status of a batch and of each of its episodes, or raises a 404."""
+    jobs = job_store.get_batch(batch_id)
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    items = []
+    for index, job in enumerate(jobs):
+        payload = job.pop("payload")
+        items.append({"index": index, "video": payload["video"], "run_id": payload.get("run_id") or job["id"],
+                      **{key: value for key, value in job.items() if key != "batch_id"}})
+    return {"batch_id": batch_id, "status": batch_status([job["status"] for job in jobs]),
+            "created_at": jobs[0]["created_at"], "items": items}
+
+
+@app.get("/batches/{batch_id}")
+def get_batch_status(batch_id: str):
+    """Returns the status of a batch and the status and result of each of its episodes."""
+    return batch_response(batch_id)
+
+
+@app.delete("/batches/{batch_id}")
+def cancel_batch(batch_id: str):
+    """Cancels the queued episodes of a batch and asks the workers to stop the running ones."""
+    if job_store.cancel_batch(batch_id) is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch_response(batch_id)
+
+
+@app.post("/jobs/cut-video/", status_code=202)
+def submit_cut_video_job(transcript_file: UploadFile = File(...), profiles: Optional[str] = None):
+    """Queues a cut-video job and returns its id right away; poll GET /jobs/{job_id} for its status."""
+    output_profiles = parse_output_profiles(profiles)
+    video_path = local_video_path()
+    transcript_model, _ = read_transcript_upload(transcript_file)
+    job_id = job_store.enqueue({
+        "video_path": video_path,
+        "transcript": transcript_model.json(),
+        "profiles": [profile.dict() for profile in output_profiles or []],
+    })
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Returns the status of a job (queued, running, succeeded, failed or cancelled)."""
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {key: value for key, value in job.items() if key != "result"}
+
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str):
+    """Returns the result of a finished job."""
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return {"message": "Video processed successfully!", **job["result"]}
+
+
+@app.get("/jobs/{job_id}/progress")
+async def job_progress(job_id: str):
+    """Streams the FFmpeg progress reported by the worker running the job as Server-Sent Events."""
+    if job_store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        sent = {}
+        while True:
+            job = await asyncio.to_thread(job_store.get, job_id)
+            for key, event in (await asyncio.to_thread(job_store.get_progress, job_id)).items():
+                if sent.get(key) != event.get("updated_at"):
+                    sent[key] = event.get("updated_at")
+                    yield sse_event(event)
+            if job["status"] not in ("queued", "running"):
+                yield f"event: status\ndata: {json.dumps({'job_id': job_id, 'status': job['status']})}\n\n"
+                return
+            await asyncio.sleep(JOB_PROGRESS_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancels a queued job, or asks the worker to stop a running one."""
+    status = job_store.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job_id, "status": status}
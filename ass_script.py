@@ -0,0 +1,132 @@
+from itertools import accumulate
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from transcript_index import TranscriptIndex
+
+ASS_WRAP_WIDTH = 60  # characters per subtitle line
+ASS_MARGIN_V = 50
+ASS_FONT = "Red Hat Display"
+ASS_FONT_SIZE = 24
+
+
+# (start_ms, end_ms, text) of one word, in milliseconds of the source video; plain tuples keep 10k-line scripts fast
+TimedWord = Tuple[int, int, str]
+
+
+def milliseconds_to_ass_time(ms: int) -> str:
+    """
+    Convert milliseconds to ASS time format: h:mm:ss.cs
+    """
+    hours = ms // 3600000
+    minutes = (ms % 3600000) // 60000
+    seconds = (ms % 60000) // 1000
+    centiseconds = (ms % 1000) // 10
+
+    return f"{hours}:{minutes:02}:{seconds:02}.{centiseconds:02}"
+
+
+def proportional_word_timings(text: str, start_ms: int, end_ms: int) -> List[TimedWord]:
+    """
+    Spreads the words of text over [start_ms, end_ms] in proportion to their length (plus the following space),
+    so the last word ends exactly at end_ms.
+    """
+    words = text.split()
+    total = sum(map(len, words)) + len(words)
+    span = max(0, end_ms - start_ms)
+    ends = [start_ms + span * elapsed // total for elapsed in accumulate(len(word) + 1 for word in words)]
+    return list(zip([start_ms] + ends[:-1], ends, words))
+
+
+def transcript_word_timings(segments: Sequence[Tuple[int, str]], start_ms: int, end_ms: int,
+                            next_start_ms: Optional[int] = None) -> List[TimedWord]:
+    """
+    Times words from transcript segments (start_ms, text): each segment's words run from its start to the start of
+    the next segment (next_start_ms after the last one) and are spread proportionally within it. Everything is
+    clamped to the [start_ms, end_ms] window of the soundbite.
+    """
+    timed = []
+    for i, (segment_start_ms, text) in enumerate(segments):
+        segment_end_ms = segments[i + 1][0] if i + 1 < len(segments) else (next_start_ms or end_ms)
+        segment_start_ms = max(segment_start_ms, start_ms)
+        segment_end_ms = min(segment_end_ms, end_ms)
+        if segment_start_ms >= end_ms:
+            break
+        timed += proportional_word_timings(text, segment_start_ms, max(segment_start_ms, segment_end_ms))
+    return timed
+
+
+def indexed_word_timings(transcript_index: TranscriptIndex, start_ms: int, end_ms: int) -> List[TimedWord]:
+    """Word timings of the transcript segments starting within [start_ms, end_ms]."""
+    lo, hi = transcript_index.range_indices(start_ms, end_ms)
+    next_start_ms = transcript_index.starts_ms[hi] if hi < len(transcript_index) else None
+    return transcript_word_timings(list(zip(transcript_index.starts_ms[lo:hi], transcript_index.texts[lo:hi])),
+                                   start_ms, end_ms, next_start_ms)
+
+
+def wrap_words(words: Sequence[TimedWord], width: int) -> List[Sequence[TimedWord]]:
+    """Greedily groups words into lines of at most width characters (a longer word gets a line of its own)."""
+    lines = []
+    line_start, line_length = 0, -1
+    for i, (_, _, text) in enumerate(words):
+        line_length += 1 + len(text)
+        if line_length > width and i > line_start:
+            lines.append(words[line_start:i])
+            line_start, line_length = i, len(text)
+    if line_start < len(words):
+        lines.append(words[line_start:])
+    return lines
+
+
+class AssScriptBuilder:
+    """
+    Builds karaoke .ass scripts in memory. The header and style block are rendered once per builder; every line
+    is timed by its words and every word is highlighted with {\\k} for exactly its own duration.
+    """
+
+    def __init__(self, margin_v: int = ASS_MARGIN_V, wrap_width: int = ASS_WRAP_WIDTH, font: str = ASS_FONT,
+                 font_size: int = ASS_FONT_SIZE):
+        self.wrap_width = wrap_width
+        self.header = (
+            "[Script Info]\n"
+            "Title: Soundbite Subtitle\n"
+            "ScriptType: v4.00+\nPlayDepth: 0\n"
+            "\n[V4+ Styles]\n"
+            "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+            "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, "
+            "Shadow, Alignment, MarginL, MarginR, MarginV, Encoding\n"
+            f"Style: Default,{font},{font_size},&H00FFFFFF,&H00602DE9,&H00602DE9,&H00000000,0,0,0,0,100,100,0,"
+            f"0,1,1.5,0,2,10,10,{margin_v},1\n"
+            "\n[Events]\n"
+            "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+        )
+
+    def dialogue_lines(self, words: Sequence[TimedWord], offset_ms: int) -> List[str]:
+        """Dialogue lines of the words, with times relative to offset_ms (the start of the rendered clip)."""
+        dialogues = []
+        for line in wrap_words(words, self.wrap_width):
+            # \k durations are taken between rounded word starts, so rounding never accumulates along a line
+            line_start_ms, line_end_ms = line[0][0], line[-1][1]
+            starts_cs = [(start_ms - offset_ms) // 10 for start_ms, _, _ in line]
+            starts_cs.append((line_end_ms - offset_ms) // 10)
+            karaoke = " ".join([f"{{\\k{starts_cs[i + 1] - start_cs}}}{word[2]}"
+                                for i, (start_cs, word) in enumerate(zip(starts_cs, line))])
+            dialogues.append(f"Dialogue: 0,{milliseconds_to_ass_time(line_start_ms - offset_ms)},"
+                             f"{milliseconds_to_ass_time(line_end_ms - offset_ms)},Default,,0,0,0,,{karaoke}\n")
+        return dialogues
+
+    def render(self, words: Sequence[TimedWord], offset_ms: int) -> str:
+        """Returns the whole script for the words."""
+        return self.header + "".join(self.dialogue_lines(words, offset_ms))
+
+    def render_batch(self, items: Iterable[Tuple[Sequence[TimedWord], int]]) -> List[str]:
+        """Returns the script of every (words, offset_ms) item, e.g. all soundbites of a request."""
+        return [self.render(words, offset_ms) for words, offset_ms in items]
+
+
+def write_ass_file(path: str, script: str):
+    """Writes a script built in memory with a single write call."""
+    with open(path, "w") as ass_file:
+        ass_file.write(script)
+
+
+ass_builder = AssScriptBuilder()
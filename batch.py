@@ -0,0 +1,164 @@
+import asyncio
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+from jobs import JOB_DB_PATH
+
+# LLM selections are I/O-bound and LLM requests are rate limited by the provider (0 = no rate limit); the budgets
+# below hold for all worker processes on the host together
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+BATCH_LLM_REQUESTS_PER_MINUTE = float(os.getenv("BATCH_LLM_REQUESTS_PER_MINUTE", "0"))
+# Renders are CPU-bound: each episode already runs SEGMENT_CONCURRENCY FFmpeg processes
+BATCH_ENCODE_CONCURRENCY = int(os.getenv("BATCH_ENCODE_CONCURRENCY", "1"))
+# how often a task waiting for a slot held by another process checks again
+HOST_LIMITS_POLL_SECONDS = 0.2
+
+
+class HostLimits:
+    """
+    Slots and request start times shared by every process on the host, in SQLite tables of the job database, so
+    the budgets hold for all worker processes together. Slots of processes that died are freed on the next acquire.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS pool_slots (token TEXT PRIMARY KEY, pool TEXT NOT NULL, "
+                               "pid INTEGER NOT NULL, acquired_at REAL NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS rate_limits (name TEXT PRIMARY KEY, "
+                               "next_start REAL NOT NULL)")
+            self._initialized = True
+        return connection
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def try_acquire(self, pool: str, slots: int) -> Optional[str]:
+        """Takes one of the `slots` slots of a pool. Returns its token, or None when all are held."""
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                holders = connection.execute("SELECT token, pid FROM pool_slots WHERE pool = ?", (pool,)).fetchall()
+                dead = [(token,) for token, pid in holders if not self._alive(pid)]
+                connection.executemany("DELETE FROM pool_slots WHERE token = ?", dead)
+                token = None
+                if len(holders) - len(dead) < slots:
+                    token = uuid4().hex
+                    connection.execute("INSERT INTO pool_slots (token, pool, pid, acquired_at) VALUES (?, ?, ?, ?)",
+                                       (token, pool, os.getpid(), time.time()))
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        return token
+
+    def release(self, token: str):
+        with closing(self._connect()) as connection:
+            connection.execute("DELETE FROM pool_slots WHERE token = ?", (token,))
+
+    def reserve_start(self, name: str, interval: float) -> float:
+        """Reserves the next start of a rate-limited request. Returns how many seconds to wait for it."""
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute("SELECT next_start FROM rate_limits WHERE name = ?", (name,)).fetchone()
+                now = time.time()
+                start = max(now, row[0] if row else 0.0)
+                connection.execute("INSERT OR REPLACE INTO rate_limits (name, next_start) VALUES (?, ?)",
+                                   (name, start + interval))
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        return start - now
+
+
+class ResourcePool:
+    """
+    Bounds how many tasks hold a resource at once, across all processes on the host when given HostLimits.
+    Waiting tasks of one process are served first come, first served.
+    """
+
+    def __init__(self, name: str, slots: int, limits: Optional[HostLimits] = None):
+        self.name = name
+        self.slots = max(1, slots)
+        self.limits = limits
+        self.in_use = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(self.slots)
+        self._tokens: List[str] = []
+
+    async def acquire(self):
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+            try:
+                while self.limits:
+                    token = await asyncio.to_thread(self.limits.try_acquire, self.name, self.slots)
+                    if token:
+                        self._tokens.append(token)
+                        break
+                    await asyncio.sleep(HOST_LIMITS_POLL_SECONDS)
+            except BaseException:
+                self._semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+        self.in_use += 1
+
+    async def release(self):
+        self.in_use -= 1
+        self._semaphore.release()
+        if self.limits:
+            # shielded: a slot must not stay taken because the task holding it was cancelled
+            await asyncio.shield(asyncio.to_thread(self.limits.release, self._tokens.pop()))
+
+    def stats(self) -> Dict:
+        return {"slots": self.slots, "in_use": self.in_use, "waiting": self.waiting}
+
+
+class RateLimiter:
+    """Spaces the starts of requests (e.g. LLM calls) to requests_per_minute, across processes with HostLimits."""
+
+    def __init__(self, name: str, requests_per_minute: float, limits: Optional[HostLimits] = None):
+        self.name = name
+        self.interval = 60 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self.limits = limits
+        self._next_start = 0.0
+
+    async def wait(self):
+        """Waits until the next request may start."""
+        if not self.interval:
+            return
+        if self.limits:
+            delay = await asyncio.to_thread(self.limits.reserve_start, self.name, self.interval)
+        else:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+            delay = start - now
+        await asyncio.sleep(delay)
+
+
+# Shared by the jobs of every worker process on the host (see worker.WORKER_JOB_CONCURRENCY)
+host_limits = HostLimits(JOB_DB_PATH)
+llm_pool = ResourcePool("llm", BATCH_LLM_CONCURRENCY, host_limits)
+encode_pool = ResourcePool("encode", BATCH_ENCODE_CONCURRENCY, host_limits)
+# every LLM request, including each chunk and the ranking of a map-reduce selection
+llm_rate_limiter = RateLimiter("llm", BATCH_LLM_REQUESTS_PER_MINUTE, host_limits)
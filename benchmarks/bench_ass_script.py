@@ -0,0 +1,108 @@
+"""
+Compares the previous line-by-line .ass writer with AssScriptBuilder on large scripts.
+
+    python benchmarks/bench_ass_script.py --lines 10000 --soundbites 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import textwrap
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ass_script import ass_builder, indexed_word_timings, milliseconds_to_ass_time, write_ass_file  # noqa: E402
+from models import TranscriptSegment  # noqa: E402
+from transcript_index import TranscriptIndex  # noqa: E402
+
+LINE_TEXT = "this is a synthetic subtitle line with roughly sixty chars"  # wraps to one line
+
+
+def timestamp(ms: int) -> str:
+    return f"{ms // 3600000:02}:{ms % 3600000 // 60000:02}:{ms % 60000 // 1000:02}.{ms % 1000:03}"
+
+
+def legacy_write(transcript_text: str, ass_file_path: str, start_ms: int, end_ms: int, margin_v: int = 50):
+    """The previous implementation: many small writes, string concatenation and the * 0.4 timing heuristic."""
+    total_duration_ms = end_ms - start_ms
+    lines = textwrap.wrap(transcript_text, width=60)
+    soundbite_start_ms = start_ms
+    with open(ass_file_path, "w") as ass_file:
+        ass_file.write("[Script Info]\n")
+        ass_file.write("Title: Soundbite Subtitle\n")
+        ass_file.write("ScriptType: v4.00+\nPlayDepth: 0\n")
+        ass_file.write("\n[V4+ Styles]\n")
+        ass_file.write("Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+                       "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, "
+                       "Shadow, Alignment, MarginL, MarginR, MarginV, Encoding\n")
+        ass_file.write(
+            f"Style: Default,Red Hat Display,24,&H00FFFFFF,&H00602DE9,&H00602DE9,&H00000000,0,0,0,0,100,100,0,"
+            f"0,1,1.5,0,2,10,10,{margin_v},1\n")
+        ass_file.write("\n[Events]\n")
+        ass_file.write("Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n")
+        remaining_duration_ms = total_duration_ms
+        for line in lines:
+            words = line.split()
+            total_chars = sum(len(word) for word in words)
+            duration_per_char = (total_duration_ms / total_chars) * 0.4 if total_chars > 0 else 0
+            karaoke_text = ""
+            for word in words:
+                karaoke_text += f"{{\\k{int(len(word) * duration_per_char / 10)}}}{word} "
+            formatted_start_time = milliseconds_to_ass_time(soundbite_start_ms - start_ms)
+            soundbite_start_ms += int(len(line) * duration_per_char)
+            formatted_end_time = milliseconds_to_ass_time(soundbite_start_ms - start_ms)
+            remaining_duration_ms -= (len(line) * duration_per_char)
+            ass_file.write(f"Dialogue: 0,{formatted_start_time},{formatted_end_time},Default,,0,0,0,,"
+                           f"{karaoke_text.strip()}\n")
+        if remaining_duration_ms > 0:
+            formatted_end_time = milliseconds_to_ass_time(end_ms - start_ms)
+            ass_file.write(f"Dialogue: 0,{formatted_end_time},{formatted_end_time},Default,,0,0,{margin_v},, \n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=10_000, help="subtitle lines in total")
+    parser.add_argument("--soundbites", type=int, default=50, help="scripts the lines are split into")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per writer, the fastest is reported")
+    args = parser.parse_args()
+
+    segment_ms = 3000
+    segments = [TranscriptSegment(start_time=timestamp(i * segment_ms), text=LINE_TEXT)
+                for i in range(args.lines)]
+    index = TranscriptIndex.from_segments(segments)
+    lines_per_soundbite = max(1, args.lines // args.soundbites)
+    windows = [(i * segment_ms, (i + lines_per_soundbite) * segment_ms)
+               for i in range(0, args.lines, lines_per_soundbite)]
+
+    def run_legacy(directory: str):
+        for n, (start_ms, end_ms) in enumerate(windows):
+            legacy_write(index.text_between(start_ms, end_ms - 1), os.path.join(directory, f"legacy_{n}.ass"),
+                         start_ms, end_ms)
+
+    def run_builder(directory: str):
+        scripts = ass_builder.render_batch((indexed_word_timings(index, start_ms, end_ms - 1), start_ms)
+                                           for start_ms, end_ms in windows)
+        for n, script in enumerate(scripts):
+            write_ass_file(os.path.join(directory, f"builder_{n}.ass"), script)
+
+    def best_of(run) -> float:
+        timings = []
+        with tempfile.TemporaryDirectory() as directory:
+            for _ in range(args.repeat):
+                started = perf_counter()
+                run(directory)
+                timings.append(perf_counter() - started)
+        return min(timings)
+
+    legacy_s = best_of(run_legacy)
+    builder_s = best_of(run_builder)
+
+    print(f"lines={args.lines} scripts={len(windows)}")
+    print(f"legacy writer:   {legacy_s * 1000:9.2f} ms (character heuristic, one write per line)")
+    print(f"builder:         {builder_s * 1000:9.2f} ms (word-timed, one write per script, "
+          f"{legacy_s / max(builder_s, 1e-9):.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
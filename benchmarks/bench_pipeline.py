@@ -0,0 +1,273 @@
+"""
+Benchmarks the cut / subtitle / watermark / merge stages and the full pipeline on synthetic sources.
+
+    python benchmarks/bench_pipeline.py --resolutions 640x360,1920x1080 --durations 60,600 --soundbites 5
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/<older commit>.json
+
+Sources are generated locally with FFmpeg (testsrc video + sine audio, H.264/AAC) and cached in the work
+directory; transcripts and soundbites are synthetic and the LLM is stubbed. Every stage runs in a fresh process,
+so its CPU time (including the FFmpeg children) and peak RSS are not mixed with other stages. Results (wall time,
+CPU time, peak RSS, bytes written, encode speed in x realtime) are written as JSON per commit.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# no API calls (the LLM is stubbed) and no render cache, so every run does the full work
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ["RENDER_CACHE_MAX_BYTES"] = "0"
+
+WATERMARK_PATH = os.path.join(ROOT, "GV_Watermark.png")
+STAGES = ("cut_copy", "cut_accurate", "cut_smart", "subtitle", "watermark", "render", "merge",
+          "pipeline_segments", "pipeline_one_shot")
+SOUNDBITE_SECONDS = 10
+TRANSCRIPT_SEGMENT_SECONDS = 2.5
+
+
+def timestamp(seconds: float) -> str:
+    ms = int(round(seconds * 1000))
+    return f"{ms // 3600000:02}:{ms % 3600000 // 60000:02}:{ms % 60000 // 1000:02}.{ms % 1000:03}"
+
+
+### SYNTHETIC INPUTS ###
+
+def generate_source(path: str, width: int, height: int, duration: int):
+    """Encodes a testsrc + sine source like a typical upload (H.264 with 2 s GOPs, AAC)."""
+    if os.path.exists(path):
+        return
+    subprocess.run([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc=size={width}x{height}:rate=30:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}",
+        "-c:v", "libx264", "-preset", "veryfast", "-g", "60", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", "128k", "-shortest", f"{path}.tmp.mp4",
+    ], check=True)
+    os.replace(f"{path}.tmp.mp4", path)
+
+
+def synthetic_transcript(duration: int):
+    from models import TranscriptSegment, VideoTranscript
+
+    count = int(duration / TRANSCRIPT_SEGMENT_SECONDS)
+    return VideoTranscript(segments=[
+        TranscriptSegment(start_time=timestamp(i * TRANSCRIPT_SEGMENT_SECONDS),
+                          text=f"this is synthetic transcript line number {i} with a few more words")
+        for i in range(count)
+    ])
+
+
+def synthetic_soundbites(duration: int, count: int):
+    """count soundbites of SOUNDBITE_SECONDS spread evenly over the source, off the keyframe grid."""
+    from models import Soundbite
+
+    step = duration / count
+    starts = [i * step + 0.7 for i in range(count)]
+    return [Soundbite(start_time=timestamp(start), end_time=timestamp(min(start + SOUNDBITE_SECONDS, duration)),
+                      text="synthetic soundbite") for start in starts]
+
+
+async def prepare_clips(source_path: str, soundbites, directory: str) -> List[str]:
+    """Accurate cuts of every soundbite, used as the input of the subtitle/watermark/render/merge stages."""
+    from main import cut_video
+
+    os.makedirs(directory, exist_ok=True)
+    clips = []
+    for soundbite in soundbites:
+        clip = os.path.join(directory, f"clip_{len(clips)}.mp4")
+        if not os.path.exists(clip):
+            os.replace(await cut_video(source_path, soundbite.start_time, soundbite.end_time, clip, "accurate"), clip)
+        clips.append(clip)
+    return clips
+
+
+### STAGES ###
+
+async def run_stage(stage: str, case: Dict, directory: str) -> float:
+    """Runs one stage in directory and returns the seconds of media it processed."""
+    import main
+    from subtitles import add_subtitles_to_segment, add_watermark, render_segment
+    from transcript_index import TranscriptIndex
+
+    transcript = synthetic_transcript(case["duration"])
+    soundbites = synthetic_soundbites(case["duration"], case["soundbites"])
+    media_seconds = sum(main.time_to_milliseconds(s.end_time) - main.time_to_milliseconds(s.start_time)
+                        for s in soundbites) / 1000
+
+    if stage.startswith("cut_"):
+        for i, soundbite in enumerate(soundbites):
+            await main.cut_video(case["source"], soundbite.start_time, soundbite.end_time,
+                                 os.path.join(directory, f"cut_{i}.mp4"), stage[len("cut_"):])
+        return media_seconds
+
+    if stage.startswith("pipeline_"):
+        async def stub_llm(_transcript):
+            return soundbites
+
+        main.GV_WATERMARK = WATERMARK_PATH
+        main.retrieve_soundbites_with_llm = stub_llm
+        os.makedirs("uploads", exist_ok=True)
+        await main.process_video_cut_request(case["source"], transcript, render_mode=stage[len("pipeline_"):])
+        return media_seconds
+
+    # the remaining stages start from the pre-cut clips copied into the directory
+    clips = [os.path.join(directory, os.path.basename(clip)) for clip in case["clips"]]
+    index = TranscriptIndex.from_segments(transcript.segments)
+
+    for i, (clip, soundbite) in enumerate(zip(clips, soundbites)):
+        output_path = os.path.join(directory, f"{stage}_{i}.mp4")
+        if stage == "watermark":
+            await add_watermark(clip, output_path, WATERMARK_PATH)
+        elif stage in ("subtitle", "render"):
+            ass_file_path = main.write_soundbite_ass_file(soundbite, index, directory)
+            if stage == "subtitle":
+                await add_subtitles_to_segment(clip, ass_file_path, output_path)
+            else:
+                await render_segment(clip, output_path, ass_file_path, WATERMARK_PATH)
+    if stage == "merge":
+        await main.merge_segments(clips, directory)
+    return media_seconds
+
+
+def directory_bytes(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for path, _, names in os.walk(directory) for name in names)
+
+
+def measure_case(stage: str, case: Dict, directory: str) -> Dict:
+    """Runs in a fresh process: resource usage of this process and its FFmpeg children is the stage's own."""
+    import main  # noqa: F401 (imported up front so the import time is not measured)
+    from loguru import logger
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    os.makedirs(directory, exist_ok=True)
+    os.chdir(directory)  # the pipeline writes its workspace and reels relative to the working directory
+    if not stage.startswith(("cut_", "pipeline_")):
+        for clip in case["clips"]:  # copies, so merge can consume them
+            shutil.copy(clip, directory)
+    bytes_before = directory_bytes(directory)
+
+    before = [resource.getrusage(who) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+    started = perf_counter()
+    media_seconds = asyncio.run(run_stage(stage, case, directory))
+    wall_seconds = perf_counter() - started
+    after = [resource.getrusage(who) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+
+    cpu_seconds = sum((a.ru_utime + a.ru_stime) - (b.ru_utime + b.ru_stime) for a, b in zip(after, before))
+    # ru_maxrss is in KiB on Linux and in bytes on macOS; for children it is the largest FFmpeg process
+    rss_unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "cpu_seconds": round(cpu_seconds, 3),
+        "peak_rss_bytes": max(usage.ru_maxrss for usage in after) * rss_unit,
+        "bytes_written": max(0, directory_bytes(directory) - bytes_before),
+        "media_seconds": media_seconds,
+        "encode_speed": round(media_seconds / wall_seconds, 2) if wall_seconds else None,
+    }
+
+
+### RESULTS ###
+
+def environment() -> Dict:
+    def output(command: List[str]) -> Optional[str]:
+        try:
+            return subprocess.run(command, capture_output=True, text=True, cwd=ROOT).stdout.strip() or None
+        except OSError:
+            return None
+
+    ffmpeg_version = output(["ffmpeg", "-version"])
+    return {
+        "commit": output(["git", "rev-parse", "HEAD"]),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": ffmpeg_version.splitlines()[0] if ffmpeg_version else None,
+    }
+
+
+def result_key(result: Dict) -> Tuple:
+    return result["stage"], result["resolution"], result["duration"]
+
+
+def compare(current: Dict, baseline_path: str):
+    """Prints the wall/CPU time and peak RSS of every case relative to an earlier results file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {result_key(result): result for result in baseline["results"]}
+    print(f"\nvs {baseline['environment'].get('commit')} (ratio > 1 = slower / larger):")
+    for result in current["results"]:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        ratios = [f"{metric} {result[metric] / old[metric]:5.2f}x"
+                  for metric in ("wall_seconds", "cpu_seconds", "peak_rss_bytes") if old[metric]]
+        print(f"{result['stage']:<18} {result['resolution']:>9} {result['duration']:>5}s  " + "  ".join(ratios))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resolutions", default="640x360,1280x720,1920x1080")
+    parser.add_argument("--durations", default="60,300", help="source durations in seconds")
+    parser.add_argument("--soundbites", type=int, default=5)
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--work-dir", default=os.path.join(ROOT, ".bench"))
+    parser.add_argument("--output", help="defaults to benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    stages = [stage for stage in args.stages.split(",") if stage]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    report = {"environment": environment(), "settings": vars(args), "results": []}
+    context = multiprocessing.get_context("spawn")
+    for resolution in args.resolutions.split(","):
+        width, height = (int(value) for value in resolution.split("x"))
+        for duration in (int(value) for value in args.durations.split(",")):
+            name = f"{resolution}_{duration}s"
+            source = os.path.join(args.work_dir, "sources", f"{name}.mp4")
+            os.makedirs(os.path.dirname(source), exist_ok=True)
+            generate_source(source, width, height, duration)
+            clips = asyncio.run(prepare_clips(source, synthetic_soundbites(duration, args.soundbites),
+                                              os.path.join(args.work_dir, "clips", name)))
+            case = {"source": source, "clips": clips, "duration": duration, "soundbites": args.soundbites}
+
+            for stage in stages:
+                directory = os.path.join(args.work_dir, "runs", name, stage)
+                shutil.rmtree(directory, ignore_errors=True)
+                with context.Pool(1) as pool:
+                    metrics = pool.apply(measure_case, (stage, case, directory))
+                shutil.rmtree(directory, ignore_errors=True)
+                result = {"stage": stage, "resolution": resolution, "duration": duration, **metrics}
+                report["results"].append(result)
+                print(f"{stage:<18} {resolution:>9} {duration:>5}s  wall {metrics['wall_seconds']:8.2f}s  "
+                      f"cpu {metrics['cpu_seconds']:8.2f}s  rss {metrics['peak_rss_bytes'] / 1024 ** 2:7.1f} MiB  "
+                      f"written {metrics['bytes_written'] / 1024 ** 2:8.1f} MiB  {metrics['encode_speed']}x")
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results",
+                                         f"{report['environment']['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Measures the cold-start time of the API, of worker processes and of the lightweight modules.
+
+    python benchmarks/bench_startup.py --repeat 5
+    python benchmarks/bench_startup.py --compare benchmarks/results/startup-<older commit>.json
+
+Every target runs in a fresh interpreter with `python -X importtime`; the wall time of the process and the
+import time reported by the interpreter are recorded (median of --repeat runs), together with the packages
+that take the longest to import. Results are written as JSON per commit.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# target -> code run by the fresh interpreter
+TARGETS = {
+    "api": "import app",
+    # a worker process up to the point where it can run its first job
+    "worker": "import worker; from main import process_video_cut_request",
+    "subtitles": "import subtitles",
+    "ass_script": "import ass_script",
+    # what is deferred until the first LLM call (no request is sent)
+    "first_llm_call": "import main; main.get_chain('soundbite_selection')",
+}
+
+
+def parse_importtime(stderr: str) -> Tuple[int, Dict[str, int]]:
+    """Returns the total import time and the self time per top-level package (microseconds) of -X importtime."""
+    total = 0
+    packages: Dict[str, int] = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not name[1:].startswith(" "):  # imported directly by the target, not nested
+            total += int(cumulative_us)
+        packages[name.strip().split(".")[0]] += int(self_us)
+    return total, packages
+
+
+def measure_target(code: str, repeat: int, top: int) -> Dict:
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "benchmark")}
+    walls, imports = [], []
+    packages: Dict[str, List[int]] = defaultdict(list)
+    for _ in range(repeat):
+        started = perf_counter()
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                                   capture_output=True, text=True)
+        walls.append(perf_counter() - started)
+        if completed.returncode != 0:
+            raise RuntimeError(f"`{code}` failed: {completed.stderr.strip().splitlines()[-1:]}")
+        total, by_package = parse_importtime(completed.stderr)
+        imports.append(total / 1e6)
+        for package, self_us in by_package.items():
+            packages[package].append(self_us)
+
+    slowest = sorted(((statistics.median(values) / 1e6, package) for package, values in packages.items()),
+                     reverse=True)[:top]
+    return {
+        "wall_seconds": statistics.median(walls),
+        "import_seconds": statistics.median(imports),
+        "top_packages": {package: round(seconds, 4) for seconds, package in slowest},
+    }
+
+
+def environment() -> Dict:
+    def output(command: List[str]) -> Optional[str]:
+        try:
+            return subprocess.run(command, capture_output=True, text=True, cwd=ROOT).stdout.strip() or None
+        except OSError:
+            return None
+
+    return {
+        "commit": output(["git", "rev-parse", "HEAD"]),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def compare(current: Dict, baseline_path: str):
+    """Prints the wall and import time of every target relative to an earlier results file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {result["target"]: result for result in baseline["results"]}
+    print(f"\nvs {baseline['environment'].get('commit')} (ratio > 1 = slower):")
+    for result in current["results"]:
+        old = previous.get(result["target"])
+        if old is None:
+            continue
+        ratios = [f"{metric} {result[metric] / old[metric]:5.2f}x"
+                  for metric in ("wall_seconds", "import_seconds") if old[metric]]
+        print(f"{result['target']:<15} " + "  ".join(ratios))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="slowest packages listed per target")
+    parser.add_argument("--output", help="defaults to benchmarks/results/startup-<commit>.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    targets = [target for target in args.targets.split(",") if target]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+
+    report = {"environment": environment(), "settings": vars(args), "results": []}
+    for target in targets:
+        result = {"target": target, **measure_target(TARGETS[target], args.repeat, args.top)}
+        report["results"].append(result)
+        slowest = ", ".join(f"{package} {seconds * 1000:.0f}ms" for package, seconds in result["top_packages"].items())
+        print(f"{target:<15} wall {result['wall_seconds'] * 1000:7.0f}ms  imports {result['import_seconds'] * 1000:7.0f}ms"
+              f"  ({slowest})")
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results",
+                                         f"startup-{report['environment']['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Compares the old linear, string-compared soundbite matching with TranscriptIndex range queries.
+
+    python benchmarks/bench_transcript_index.py --segments 100000 --queries 10
+"""
+import argparse
+import os
+import random
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Soundbite, TranscriptSegment  # noqa: E402
+from subtitles import match_soundbite_with_transcript  # noqa: E402
+from transcript_index import TranscriptIndex  # noqa: E402
+
+
+def timestamp(ms: int) -> str:
+    return f"{ms // 3600000:02}:{ms % 3600000 // 60000:02}:{ms % 60000 // 1000:02}.{ms % 1000:03}"
+
+
+def linear_match(soundbite: Soundbite, segments) -> str:
+    """The previous implementation: a full scan comparing timestamp strings."""
+    relevant_text = ""
+    for segment in segments:
+        if soundbite.start_time <= segment.start_time <= soundbite.end_time:
+            relevant_text += segment.text + " "
+    return relevant_text.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=10)
+    args = parser.parse_args()
+
+    random.seed(0)
+    segments = [TranscriptSegment(start_time=timestamp(i * 2500), text=f"segment number {i}")
+                for i in range(args.segments)]
+    span_ms = args.segments * 2500
+    soundbites = []
+    for _ in range(args.queries):
+        start_ms = random.randrange(0, max(1, span_ms - 60000))
+        soundbites.append(Soundbite(start_time=timestamp(start_ms), end_time=timestamp(start_ms + 45000), text=""))
+
+    started = perf_counter()
+    index = TranscriptIndex.from_segments(segments)
+    build_s = perf_counter() - started
+
+    started = perf_counter()
+    indexed = [match_soundbite_with_transcript(soundbite, index) for soundbite in soundbites]
+    indexed_s = perf_counter() - started
+
+    started = perf_counter()
+    linear = [linear_match(soundbite, segments) for soundbite in soundbites]
+    linear_s = perf_counter() - started
+
+    assert indexed == linear
+    print(f"segments={args.segments} queries={args.queries}")
+    print(f"index build:     {build_s * 1000:9.2f} ms (once per transcript)")
+    print(f"indexed queries: {indexed_s * 1000:9.3f} ms")
+    print(f"linear queries:  {linear_s * 1000:9.2f} ms ({linear_s / max(indexed_s, 1e-9):.0f}x slower)")
+
+
+if __name__ == "__main__":
+    main()
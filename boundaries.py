@@ -0,0 +1,140 @@
+import asyncio
+import os
+from typing import List, Optional
+
+import numpy as np
+from loguru import logger
+
+from ffmpeg_runner import FFmpegError, run_process
+from models import Soundbite
+from transcript_index import format_timestamp_ms, parse_timestamp_ms
+
+# Cuts move to the nearest low-energy gap at most this far away (0 disables snapping)
+BOUNDARY_TOLERANCE_SECONDS = float(os.getenv("BOUNDARY_TOLERANCE_SECONDS", "2"))
+BOUNDARY_SAMPLE_RATE = 16000  # mono PCM decoded around each cut
+BOUNDARY_FRAME_SECONDS = 0.02
+BOUNDARY_HOP_SECONDS = 0.01
+# a frame is quiet below this share of the window's median RMS, and always below the silence floor (-45 dBFS)
+BOUNDARY_QUIET_RATIO = float(os.getenv("BOUNDARY_QUIET_RATIO", "0.15"))
+SILENCE_FLOOR_RMS = 10 ** (-45 / 20)
+MIN_SOUNDBITE_SECONDS = 1.0
+
+
+def build_pcm_command(input_path: str, start: float, duration: float,
+                      sample_rate: int = BOUNDARY_SAMPLE_RATE) -> List[str]:
+    """Builds the FFmpeg command that decodes only [start, start + duration] of the audio to mono s16le on stdout."""
+    return [
+        "ffmpeg", "-v", "error", "-ss", f"{start:.3f}", "-t", f"{duration:.3f}", "-i", input_path,
+        "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "pipe:1",
+    ]
+
+
+async def decode_pcm(input_path: str, start: float, duration: float,
+                     sample_rate: int = BOUNDARY_SAMPLE_RATE) -> np.ndarray:
+    """Returns the samples of the window as float32 in [-1, 1]."""
+    output = await run_process(build_pcm_command(input_path, start, duration, sample_rate), "boundary",
+                               capture_stdout=True)
+    return np.frombuffer(output[:len(output) // 2 * 2], dtype="<i2").astype(np.float32) / 32768.0
+
+
+def short_time_rms(samples: np.ndarray, frame: int, hop: int) -> np.ndarray:
+    """RMS energy of every frame (frame samples long, hop samples apart), from a running sum of squares."""
+    if len(samples) < frame:
+        return np.empty(0, dtype=np.float64)
+    squares = np.concatenate(([0.0], np.cumsum(samples.astype(np.float64) ** 2)))
+    starts = np.arange(0, len(samples) - frame + 1, hop)
+    return np.sqrt(np.maximum(squares[starts + frame] - squares[starts], 0.0) / frame)
+
+
+def nearest_quiet_time(rms: np.ndarray, target: float, tolerance: float,
+                       frame_seconds: float = BOUNDARY_FRAME_SECONDS, hop_seconds: float = BOUNDARY_HOP_SECONDS,
+                       quiet_ratio: float = BOUNDARY_QUIET_RATIO) -> Optional[float]:
+    """
+    Returns the centre (seconds from the window start) of the quiet frame nearest to target, or None when there
+    is no quiet frame within tolerance. A target that is already quiet is returned unchanged.
+    """
+    if not len(rms):
+        return None
+    threshold = max(SILENCE_FLOOR_RMS, quiet_ratio * float(np.median(rms)))
+    centres = np.arange(len(rms)) * hop_seconds + frame_seconds / 2
+    distances = np.abs(centres - target)
+    candidates = np.flatnonzero((rms <= threshold) & (distances <= tolerance))
+    if not len(candidates):
+        return None
+    nearest = candidates[np.argmin(distances[candidates])]
+    if distances[nearest] <= hop_seconds / 2:
+        return target
+    return float(centres[nearest])
+
+
+async def snap_boundary(input_path: str, seconds: float, tolerance: float = BOUNDARY_TOLERANCE_SECONDS) -> float:
+    """Moves one cut to the nearest low-energy gap, decoding only the tolerance window around it."""
+    window_start = max(0.0, seconds - tolerance)
+    samples = await decode_pcm(input_path, window_start, seconds + tolerance - window_start)
+    rms = short_time_rms(samples, int(BOUNDARY_FRAME_SECONDS * BOUNDARY_SAMPLE_RATE),
+                         int(BOUNDARY_HOP_SECONDS * BOUNDARY_SAMPLE_RATE))
+    quiet = nearest_quiet_time(rms, seconds - window_start, tolerance)
+    return seconds if quiet is None else window_start + quiet
+
+
+async def snap_soundbite(input_path: str, soundbite: Soundbite,
+                         tolerance: float = BOUNDARY_TOLERANCE_SECONDS) -> Soundbite:
+    """
+    Returns the soundbite with both cuts snapped to the nearest pauses, or unchanged when the audio cannot be
+    decoded or snapping would leave less than MIN_SOUNDBITE_SECONDS.
+    """
+    start = parse_timestamp_ms(soundbite.start_time) / 1000
+    end = parse_timestamp_ms(soundbite.end_time) / 1000
+    try:
+        snapped_start, snapped_end = await asyncio.gather(snap_boundary(input_path, start, tolerance),
+                                                          snap_boundary(input_path, end, tolerance))
+    except (FFmpegError, OSError) as e:
+        logger.warning(f"Could not snap [{soundbite.start_time} - {soundbite.end_time}] to pauses: {str(e)}")
+        return soundbite
+    if (snapped_start, snapped_end) == (start, end) or snapped_end - snapped_start < MIN_SOUNDBITE_SECONDS:
+        return soundbite
+
+    start_time = format_timestamp_ms(round(snapped_start * 1000))
+    end_time = format_timestamp_ms(round(snapped_end * 1000))
+    logger.info(f"Snapped [{soundbite.start_time} - {soundbite.end_time}] to [{start_time} - {end_time}]")
+    return soundbite.copy(update={"start_time": start_time, "end_time": end_time})
+
+
+async def snap_soundbites(input_path: str, soundbites: List[Soundbite], concurrency: int,
+                          tolerance: float = BOUNDARY_TOLERANCE_SECONDS) -> List[Soundbite]:
+    """Snaps the cuts of every soundbite, at most `concurrency` soundbites at a time."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def snap(soundbite: Soundbite) -> Soundbite:
+        async with semaphore:
+            return await snap_soundbite(input_path, soundbite, tolerance)
+
+    return list(await asyncio.gather(*(snap(soundbite) for soundbite in soundbites)))
+
+
+def clamp_soundbites(soundbites: List[Soundbite], duration: float) -> List[Soundbite]:
+    """
+    Validates soundbite ranges against the source duration (seconds) before any FFmpeg work: ends past the end of
+    the video are clamped to it, while empty or reversed ranges and soundbites that start after the end, or that
+    clamping leaves shorter than MIN_SOUNDBITE_SECONDS, are dropped.
+    """
+    duration_ms = int(duration * 1000)
+    valid = []
+    for soundbite in soundbites:
+        start_ms = parse_timestamp_ms(soundbite.start_time)
+        end_ms = parse_timestamp_ms(soundbite.end_time)
+        if end_ms <= start_ms:
+            logger.warning(f"Dropping soundbite [{soundbite.start_time} - {soundbite.end_time}]: empty range")
+            continue
+        if end_ms <= duration_ms:
+            valid.append(soundbite)
+            continue
+        if duration_ms - start_ms < MIN_SOUNDBITE_SECONDS * 1000:
+            logger.warning(f"Dropping soundbite [{soundbite.start_time} - {soundbite.end_time}]: "
+                           f"the video ends at {format_timestamp_ms(duration_ms)}")
+            continue
+        end_time = format_timestamp_ms(duration_ms)
+        logger.warning(f"Clamping soundbite [{soundbite.start_time} - {soundbite.end_time}] to the end of the video "
+                       f"({end_time})")
+        valid.append(soundbite.copy(update={"end_time": end_time}))
+    return valid
@@ -0,0 +1,270 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set
+
+from loguru import logger
+
+from tracing import current_run_id, tracer
+
+STDERR_TAIL_LINES = 20
+
+# Limits applied to every FFmpeg/FFprobe process
+FFMPEG_TIMEOUT_SECONDS = float(os.getenv("FFMPEG_TIMEOUT_SECONDS", "1800"))
+FFMPEG_THREADS = int(os.getenv("FFMPEG_THREADS", "0"))  # 0 lets FFmpeg decide
+FFMPEG_NICE = int(os.getenv("FFMPEG_NICE", "0"))
+FFMPEG_CPU_AFFINITY = os.getenv("FFMPEG_CPU_AFFINITY", "")  # e.g. "0-7,16"
+
+# stderr fragments -> error reason, checked from the last line up
+FFMPEG_ERROR_REASONS = (
+    ("No such file or directory", "missing_input"),
+    ("Invalid data found when processing input", "invalid_input"),
+    ("moov atom not found", "invalid_input"),
+    ("Permission denied", "permission_denied"),
+    ("No space left on device", "disk_full"),
+    ("Error initializing filter", "filter_error"),
+    ("Error opening filters", "filter_error"),
+    ("Unknown encoder", "unknown_codec"),
+    ("Unknown decoder", "unknown_codec"),
+    ("Conversion failed", "conversion_failed"),
+)
+
+
+class FFmpegError(Exception):
+    """Raised when an FFmpeg/FFprobe process fails, with the stage, exit status, reason and stderr tail."""
+
+    def __init__(self, stage: str, returncode: Optional[int], stderr_tail: List[str], reason: Optional[str] = None,
+                 command: Optional[List[str]] = None):
+        self.stage = stage
+        self.returncode = returncode
+        self.stderr_tail = stderr_tail
+        self.reason = reason or classify_stderr(stderr_tail)
+        self.command = command or []
+        message = stderr_tail[-1] if stderr_tail else "no output"
+        super().__init__(f"{stage} failed ({self.reason}, status {returncode}): {message}")
+
+    def to_dict(self) -> Dict:
+        return {
+            "stage": self.stage,
+            "returncode": self.returncode,
+            "reason": self.reason,
+            "stderr_tail": self.stderr_tail,
+        }
+
+
+class FFmpegTimeout(FFmpegError):
+    """Raised when a process runs longer than its timeout and is killed."""
+
+    def __init__(self, stage: str, timeout: float, stderr_tail: List[str], command: Optional[List[str]] = None):
+        self.timeout = timeout
+        super().__init__(stage, None, stderr_tail, reason="timeout", command=command)
+
+
+def classify_stderr(stderr_tail: List[str]) -> str:
+    """Maps the stderr output of a failed process to a short error reason."""
+    for line in reversed(stderr_tail):
+        for fragment, reason in FFMPEG_ERROR_REASONS:
+            if fragment in line:
+                return reason
+    return "unknown"
+
+
+def parse_cpu_list(cpu_list: str) -> Set[int]:
+    """Parses a taskset-style CPU list ("0-3,8") into a set of CPU ids."""
+    cpus = set()
+    for part in filter(None, (part.strip() for part in cpu_list.split(","))):
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def apply_resource_limits(pid: int, nice: int, cpu_affinity: str):
+    """Lowers the priority and pins the CPUs of a freshly started process (best effort)."""
+    try:
+        if nice:
+            os.setpriority(os.PRIO_PROCESS, pid, nice)
+        if cpu_affinity and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(pid, parse_cpu_list(cpu_affinity))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not apply resource limits to process {pid}: {str(e)}")
+
+
+### PROGRESS ###
+
+def parse_progress_block(fields: Dict[str, str]) -> Dict:
+    """Converts one `-progress` key=value block into numbers (out_time in seconds, fps, speed as x realtime)."""
+    def number(value: Optional[str]) -> Optional[float]:
+        try:
+            return float(value.rstrip("x")) if value else None
+        except ValueError:
+            return None  # "N/A" before the first frame
+
+    out_time_us = number(fields.get("out_time_us") or fields.get("out_time_ms"))
+    return {
+        "out_time": round(out_time_us / 1_000_000, 3) if out_time_us is not None else None,
+        "fps": number(fields.get("fps")),
+        "speed": number(fields.get("speed")),
+        "frame": int(number(fields.get("frame")) or 0),
+        "done": fields.get("progress") == "end",
+    }
+
+
+class ProgressBroker:
+    """
+    In-process fan-out of FFmpeg progress events to any number of subscribers (e.g. SSE connections).
+    The latest event of every running stage is kept so new subscribers start with a snapshot.
+    """
+
+    def __init__(self):
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._sinks: List[Callable[[Dict], None]] = []
+        self.latest: Dict[tuple, Dict] = {}
+
+    def add_sink(self, sink: Callable[[Dict], None]):
+        """Registers a callback that receives every event (e.g. to persist progress of a job)."""
+        self._sinks.append(sink)
+
+    def publish(self, event: Dict):
+        key = (event.get("run_id"), event["stage"], event.get("segment"))
+        if event.get("done"):
+            self.latest.pop(key, None)
+        else:
+            self.latest[key] = event
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()  # drop the oldest event for slow consumers
+            queue.put_nowait(event)
+        for sink in self._sinks:
+            try:
+                sink(event)
+            except Exception as e:
+                logger.warning(f"Progress sink failed: {str(e)}")
+
+    async def subscribe(self, run_id: Optional[str] = None) -> AsyncIterator[Dict]:
+        """Yields the current snapshot, then live events (only those of run_id when given)."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+        self._subscribers.add(queue)
+        try:
+            for event in list(self.latest.values()):
+                if run_id is None or event.get("run_id") == run_id:
+                    yield event
+            while True:
+                event = await queue.get()
+                if run_id is None or event.get("run_id") == run_id:
+                    yield event
+        finally:
+            self._subscribers.discard(queue)
+
+
+progress_broker = ProgressBroker()
+
+
+### RUNNER ###
+
+async def run_process(command: List[str], stage: str, timeout: Optional[float] = None,
+                      on_stdout_line: Optional[Callable[[str], None]] = None,
+                      capture_stdout: bool = False) -> bytes:
+    """
+    Runs a command (argument list, no shell) with a timeout, niceness and CPU affinity.
+    stdout is either handed line by line to on_stdout_line or captured and returned.
+    Raises FFmpegError on a non-zero exit status and FFmpegTimeout when the timeout expires.
+    The process is killed if the calling task is cancelled.
+    """
+    timeout = FFMPEG_TIMEOUT_SECONDS if timeout is None else timeout
+    process = await asyncio.create_subprocess_exec(
+        *command, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+    apply_resource_limits(process.pid, FFMPEG_NICE, FFMPEG_CPU_AFFINITY)
+    stderr_tail: List[str] = []
+    stdout_chunks: List[bytes] = []
+
+    async def read_stdout():
+        if on_stdout_line is not None:
+            async for raw_line in process.stdout:
+                on_stdout_line(raw_line.decode(errors="replace").strip())
+        else:
+            while chunk := await process.stdout.read(1 << 16):
+                if capture_stdout:
+                    stdout_chunks.append(chunk)
+
+    async def read_stderr():
+        async for raw_line in process.stderr:
+            stderr_tail.append(raw_line.decode(errors="replace").rstrip())
+            del stderr_tail[:-STDERR_TAIL_LINES]
+
+    try:
+        await asyncio.wait_for(asyncio.gather(read_stdout(), read_stderr(), process.wait()), timeout or None)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        logger.error(f"{stage} timed out after {timeout:.0f}s")
+        raise FFmpegTimeout(stage, timeout, stderr_tail, command)
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+
+    if process.returncode != 0:
+        error = FFmpegError(stage, process.returncode, stderr_tail, command=command)
+        logger.error(str(error))
+        raise error
+    return b"".join(stdout_chunks)
+
+
+async def run_ffmpeg(args: List[str], stage: str, segment: Optional[str] = None,
+                     broker: ProgressBroker = progress_broker, timeout: Optional[float] = None,
+                     threads: Optional[int] = None):
+    """
+    Runs an FFmpeg command (argument list ending with the output path) and publishes its `-progress` output
+    (out_time, fps, speed) for the stage/segment. threads defaults to FFMPEG_THREADS (0 lets FFmpeg decide).
+    """
+    if args[0] != "ffmpeg":
+        raise ValueError("run_ffmpeg expects an ffmpeg command")
+    threads = FFMPEG_THREADS if threads is None else threads
+    command = ["ffmpeg", "-hide_banner", "-nostats", "-progress", "pipe:1"] + args[1:]
+    if threads:
+        command[-1:-1] = ["-threads", str(threads)]  # output option, right before the output path
+    run_id = current_run_id.get()
+    started = time.monotonic()
+    logger.info(f"Running {stage}: {' '.join(command)}")
+    fields: Dict[str, str] = {}
+    last_event: Dict = {}
+
+    def on_progress_line(line: str):
+        key, _, value = line.partition("=")
+        fields[key] = value
+        if key == "progress":
+            event = parse_progress_block(fields)
+            event.update(run_id=run_id, stage=stage, segment=segment,
+                         elapsed=round(time.monotonic() - started, 3), updated_at=time.time())
+            broker.publish(event)
+            last_event.update(event)
+            fields.clear()
+
+    with tracer.span(f"ffmpeg.{stage}", segment=segment) as span:
+        span.files(outputs=[args[-1]])
+        try:
+            await run_process(command, stage, timeout, on_stdout_line=on_progress_line)
+        except FFmpegError as e:
+            span.set(reason=e.reason)
+            broker.publish({"run_id": run_id, "stage": stage, "segment": segment, "done": True, "failed": True,
+                            "elapsed": round(time.monotonic() - started, 3), "updated_at": time.time()})
+            raise
+        except asyncio.CancelledError:
+            # the process was killed: close the stage so its last event does not stay in the broker's snapshot
+            span.set(reason="cancelled")
+            broker.publish({"run_id": run_id, "stage": stage, "segment": segment, "done": True, "cancelled": True,
+                            "elapsed": round(time.monotonic() - started, 3), "updated_at": time.time()})
+            raise
+        finally:
+            span.set(speed=last_event.get("speed"), out_time=last_event.get("out_time"))
+    logger.info(f"{stage} finished in {time.monotonic() - started:.2f}s")
+
+
+async def run_ffprobe(args: List[str], stage: str = "probe", timeout: Optional[float] = None) -> str:
+    """Runs an FFprobe command and returns its stdout."""
+    if args[0] != "ffprobe":
+        raise ValueError("run_ffprobe expects an ffprobe command")
+    output = await run_process(args, stage, timeout, capture_stdout=True)
+    return output.decode(errors="replace")
@@ -0,0 +1,123 @@
+import math
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from loguru import logger
+
+from ffmpeg_runner import run_ffmpeg
+
+# Live playlists are published under HLS_DIR/<run id>/ (one sub-directory per output profile)
+HLS_DIR = os.getenv("HLS_DIR", os.path.join("uploads", "hls"))
+HLS_SEGMENT_SECONDS = float(os.getenv("HLS_SEGMENT_SECONDS", "4"))
+HLS_PLAYLIST_NAME = "index.m3u8"
+
+EXTINF_PATTERN = re.compile(r"^#EXTINF:([\d.]+)")
+MAP_PATTERN = re.compile(r'^#EXT-X-MAP:URI="([^"]+)"')
+
+
+def build_hls_remux_command(input_path: str, directory: str, prefix: str,
+                            segment_seconds: float = HLS_SEGMENT_SECONDS) -> List[str]:
+    """
+    Builds the FFmpeg command that stream-copies a rendered clip into fMP4 HLS segments
+    (<prefix>_init.mp4, <prefix>_000.m4s, ...) with a playlist of its own, <prefix>.m3u8.
+    """
+    return [
+        "ffmpeg", "-y", "-i", input_path, "-c", "copy",
+        "-f", "hls", "-hls_time", f"{segment_seconds:g}", "-hls_playlist_type", "vod",
+        "-hls_segment_type", "fmp4", "-hls_fmp4_init_filename", f"{prefix}_init.mp4",
+        "-hls_segment_filename", os.path.join(directory, f"{prefix}_%03d.m4s"),
+        os.path.join(directory, f"{prefix}.m3u8"),
+    ]
+
+
+def parse_media_playlist(text: str) -> Tuple[Optional[str], List[Tuple[float, str]]]:
+    """Parses an fMP4 media playlist into its init segment URI and (duration, URI) segments."""
+    init_uri = None
+    segments = []
+    duration = None
+    for line in text.splitlines():
+        line = line.strip()
+        if match := MAP_PATTERN.match(line):
+            init_uri = match.group(1)
+        elif match := EXTINF_PATTERN.match(line):
+            duration = float(match.group(1))
+        elif line and not line.startswith("#") and duration is not None:
+            segments.append((duration, line))
+            duration = None
+    return init_uri, segments
+
+
+class LivePlaylist:
+    """
+    HLS event playlist of the highlight reel that grows while the soundbites are rendered.
+    Clips finish in any order but are published strictly in soundbite order, each after a discontinuity
+    with its own init segment, so playback can start as soon as the first clip is ready.
+    """
+
+    def __init__(self, directory: str, segment_seconds: float = HLS_SEGMENT_SECONDS):
+        self.directory = directory
+        self.path = os.path.join(directory, HLS_PLAYLIST_NAME)
+        self.segment_seconds = segment_seconds
+        self._ready: Dict[int, Optional[Tuple[Optional[str], List[Tuple[float, str]]]]] = {}
+        self._next_index = 0
+        self._published: List[Tuple[Optional[str], List[Tuple[float, str]]]] = []
+        os.makedirs(directory, exist_ok=True)
+        self._write()
+
+    async def add_clip(self, index: int, rendered_path: str, segment: Optional[str] = None):
+        """Segments the rendered clip of soundbite `index` and publishes every clip that is now in order."""
+        prefix = f"clip{index:03d}"
+        await run_ffmpeg(build_hls_remux_command(rendered_path, self.directory, prefix, self.segment_seconds),
+                         "hls", segment)
+        clip_playlist = os.path.join(self.directory, f"{prefix}.m3u8")
+        with open(clip_playlist) as f:
+            self._ready[index] = parse_media_playlist(f.read())
+        os.remove(clip_playlist)
+        self._publish()
+
+    def skip(self, index: int):
+        """Marks a soundbite that could not be rendered, so later clips are not held back by it."""
+        self._ready[index] = None
+        self._publish()
+
+    def finish(self):
+        """Closes the playlist (#EXT-X-ENDLIST) once every clip is published."""
+        self._write(ended=True)
+        logger.info(f"HLS playlist complete: {self.path} ({len(self._published)} clips)")
+
+    def _publish(self):
+        published = len(self._published)
+        while self._next_index in self._ready:
+            clip = self._ready.pop(self._next_index)
+            if clip is not None:
+                self._published.append(clip)
+            self._next_index += 1
+        if len(self._published) > published:
+            self._write()
+            logger.info(f"HLS playlist {self.path} now has {len(self._published)} clips")
+
+    def render(self, ended: bool = False) -> str:
+        """Returns the playlist text."""
+        durations = [duration for _, segments in self._published for duration, _ in segments]
+        target_duration = math.ceil(max(durations + [self.segment_seconds]))
+        lines = ["#EXTM3U", "#EXT-X-VERSION:7", f"#EXT-X-TARGETDURATION:{target_duration}",
+                 "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:EVENT"]
+        for clip_index, (init_uri, segments) in enumerate(self._published):
+            if clip_index:
+                lines.append("#EXT-X-DISCONTINUITY")
+            if init_uri:
+                lines.append(f'#EXT-X-MAP:URI="{init_uri}"')
+            for duration, uri in segments:
+                lines += [f"#EXTINF:{duration:.6f},", uri]
+        if ended:
+            lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+    def _write(self, ended: bool = False):
+        # write next to the playlist first so players never read a partial file
+        temp_path = f"{self.path}.{uuid4().hex}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(self.render(ended))
+        os.replace(temp_path, self.path)
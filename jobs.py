@@ -0,0 +1,221 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from loguru import logger
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.sqlite3")
+# running jobs whose worker has not sent a heartbeat for this long are handed to another worker
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "60"))
+# a job is claimed at most this many times; one whose worker keeps dying (e.g. killed for memory) is failed instead
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+# what get() and get_batch() return of a job (the payload is left out)
+JOB_FIELDS = ("id, batch_id, status, result, error, worker, cancel_requested, attempts, created_at, started_at, "
+              "finished_at")
+
+
+class JobStore:
+    """
+    SQLite-backed persistent job queue shared by the API and the worker processes on one host.
+    Jobs survive restarts: queued jobs stay queued, and running jobs whose worker stopped sending
+    heartbeats are claimed again by the next free worker.
+    """
+
+    def __init__(self, path: str, stale_seconds: float = JOB_STALE_SECONDS, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL, result TEXT, error TEXT, "
+                "worker TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0, "
+                "created_at REAL NOT NULL, started_at REAL, finished_at REAL, heartbeat_at REAL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+            columns = {row["name"] for row in connection.execute("PRAGMA table_info(jobs)")}
+            if "progress" not in columns:
+                connection.execute("ALTER TABLE jobs ADD COLUMN progress TEXT")
+            if "batch_id" not in columns:
+                connection.execute("ALTER TABLE jobs ADD COLUMN batch_id TEXT")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id, created_at)")
+            self._initialized = True
+        return connection
+
+    def enqueue(self, payload: Dict, batch_id: Optional[str] = None) -> str:
+        """Adds a job (optionally an episode of a batch) to the queue and returns its id."""
+        return self.enqueue_many([payload], batch_id)[0]
+
+    def enqueue_many(self, payloads: List[Dict], batch_id: Optional[str] = None) -> List[str]:
+        """Adds jobs to the queue in one transaction, in order, and returns their ids."""
+        job_ids = [uuid4().hex for _ in payloads]
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                # created_at orders the claims, so the episodes of a batch keep the manifest order
+                connection.executemany(
+                    "INSERT INTO jobs (id, status, payload, batch_id, created_at) VALUES (?, 'queued', ?, ?, ?)",
+                    [(job_id, json.dumps(payload), batch_id, now + index * 1e-6)
+                     for index, (job_id, payload) in enumerate(zip(job_ids, payloads))],
+                )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        logger.info(f"Queued job(s) {', '.join(job_ids)}" + (f" of batch {batch_id}" if batch_id else ""))
+        return job_ids
+
+    def claim(self, worker_id: str) -> Optional[Tuple[str, Dict]]:
+        """
+        Atomically takes the oldest queued (or abandoned running) job. Returns (job id, payload) or None.
+        Abandoned jobs are not run again when their cancellation was requested (they are cancelled) or when they
+        used up max_attempts (they fail).
+        """
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                stale = now - self.stale_seconds
+                connection.execute(
+                    "UPDATE jobs SET status = 'cancelled', finished_at = ? "
+                    "WHERE status = 'running' AND heartbeat_at < ? AND cancel_requested = 1",
+                    (now, stale),
+                )
+                connection.execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = ?, "
+                    "error = 'Abandoned by its worker ' || attempts || ' times' "
+                    "WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+                    (now, stale, self.max_attempts),
+                )
+                row = connection.execute(
+                    "SELECT id, payload FROM jobs WHERE status = 'queued' "
+                    "OR (status = 'running' AND heartbeat_at < ?) ORDER BY created_at LIMIT 1",
+                    (stale,),
+                ).fetchone()
+                if row is None:
+                    connection.execute("COMMIT")
+                    return None
+                connection.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (worker_id, now, now, row["id"]),
+                )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        logger.info(f"Worker {worker_id} claimed job {row['id']}")
+        return row["id"], json.loads(row["payload"])
+
+    def heartbeat(self, job_id: str) -> bool:
+        """Marks a running job as alive. Returns True if cancellation was requested."""
+        with closing(self._connect()) as connection:
+            connection.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time(), job_id))
+            row = connection.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def update_progress(self, job_id: str, event: Dict):
+        """Stores the latest FFmpeg progress event of a job stage/segment."""
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            progress = json.loads(row["progress"]) if row and row["progress"] else {}
+            progress[f"{event['stage']}:{event.get('segment') or ''}"] = event
+            connection.execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(progress), job_id))
+
+    def get_progress(self, job_id: str) -> Dict:
+        """Returns the latest progress event per stage/segment of a job."""
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["progress"]) if row and row["progress"] else {}
+
+    def _finish(self, job_id: str, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+        logger.info(f"Job {job_id} {status}")
+
+    def complete(self, job_id: str, result: Dict):
+        self._finish(job_id, "succeeded", result=result)
+
+    def fail(self, job_id: str, error: str):
+        self._finish(job_id, "failed", error=error)
+
+    def mark_cancelled(self, job_id: str):
+        self._finish(job_id, "cancelled")
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """
+        Cancels a queued job right away, or asks the worker of a running job to stop.
+        Returns the job status after the request, or None if the job does not exist.
+        """
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+            connection.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+            row = connection.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    def cancel_batch(self, batch_id: str) -> Optional[List[str]]:
+        """Cancels every unfinished job of a batch. Returns the job statuses afterwards, or None for unknown batches."""
+        with closing(self._connect()) as connection:
+            job_ids = [row["id"] for row in connection.execute(
+                "SELECT id FROM jobs WHERE batch_id = ? ORDER BY created_at", (batch_id,))]
+        if not job_ids:
+            return None
+        return [self.cancel(job_id) for job_id in job_ids]
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Returns the job as a dict (payload excluded), or None if it does not exist."""
+        with closing(self._connect()) as connection:
+            row = connection.execute(f"SELECT {JOB_FIELDS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row is not None else None
+
+    def get_batch(self, batch_id: str) -> List[Dict]:
+        """Returns the jobs of a batch with their payloads, in the order they were queued (empty if unknown)."""
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                f"SELECT {JOB_FIELDS}, payload FROM jobs WHERE batch_id = ? ORDER BY created_at", (batch_id,)
+            ).fetchall()
+        jobs = [self._job(row) for row in rows]
+        for job in jobs:
+            job["payload"] = json.loads(job["payload"])
+        return jobs
+
+
+def batch_status(statuses: List[str]) -> str:
+    """Status of a batch from the statuses of its jobs."""
+    remaining = set(statuses)
+    if remaining & {"queued", "running"}:
+        return "running"
+    if remaining == {"succeeded"}:
+        return "succeeded"
+    if remaining == {"cancelled"}:
+        return "cancelled"
+    return "failed" if remaining == {"failed"} else "partially_failed"
+
+
+job_store = JobStore(JOB_DB_PATH)
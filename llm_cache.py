@@ -0,0 +1,108 @@
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import closing
+from threading import Lock
+from typing import Optional
+
+from loguru import logger
+
+from models import AllSoundbites, VideoTranscript
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# 0 disables the cache
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+
+
+def normalize_transcript(transcript: VideoTranscript) -> str:
+    """Serializes a transcript with collapsed whitespace so cosmetic differences hash the same."""
+    return "\n".join(
+        f"{segment.start_time.strip()}|{' '.join(segment.text.split())}" for segment in transcript.segments
+    )
+
+
+class SoundbiteCache:
+    """
+    Persistent memoization of LLM soundbite selections in SQLite.
+    Entries expire after ttl_seconds and the least recently used ones are dropped beyond max_entries.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int, max_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = Lock()
+        self._initialized = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(transcript: VideoTranscript, prompt_templates: str, model: str) -> str:
+        """Hashes everything that determines the LLM response: transcript, prompt templates and model."""
+        digest = hashlib.sha256()
+        for part in (normalize_transcript(transcript), prompt_templates, model):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS soundbites ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.commit()
+            self._initialized = True
+        return connection
+
+    def get(self, key: str) -> Optional[AllSoundbites]:
+        """Returns the cached selection for key, or None when missing or expired."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock, closing(self._connect()) as connection:
+            row = connection.execute("SELECT response, created_at FROM soundbites WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            if now - created_at > self.ttl_seconds:
+                connection.execute("DELETE FROM soundbites WHERE key = ?", (key,))
+                connection.commit()
+                return None
+            connection.execute("UPDATE soundbites SET last_used = ? WHERE key = ?", (now, key))
+            connection.commit()
+        logger.info(f"LLM cache hit {key[:12]}")
+        return AllSoundbites.parse_raw(response)
+
+    def put(self, key: str, soundbites: AllSoundbites):
+        """Stores a validated selection, then trims expired and least recently used entries."""
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock, closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO soundbites (key, response, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, soundbites.json(), now, now),
+            )
+            connection.execute("DELETE FROM soundbites WHERE created_at < ?", (now - self.ttl_seconds,))
+            connection.execute(
+                "DELETE FROM soundbites WHERE key NOT IN "
+                "(SELECT key FROM soundbites ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            connection.commit()
+
+    def purge(self) -> int:
+        """Removes every cached selection. Returns the number removed."""
+        with self._lock, closing(self._connect()) as connection:
+            removed = connection.execute("DELETE FROM soundbites").rowcount
+            connection.commit()
+        return removed
+
+
+soundbite_cache = SoundbiteCache(LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES)
@@ -1,37 +1,99 @@
+import asyncio
 import os
+import re
+import shutil
 from asyncio import to_thread
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
-from typing import List
+from functools import lru_cache
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
 from uuid import uuid4
-import ffmpeg
-import openai
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from fastapi import HTTPException
-from langchain_core.prompts import ChatPromptTemplate
 from loguru import logger
 
-from models import SYSTEM_PROMPT, USER_PROMPT, Soundbite, VideoTranscript, AllSoundbites, GV_WATERMARK, TRANSCRIPT_PATH
-from subtitles import add_watermark, add_subtitles_to_segment, \
-    create_ass_file_for_segment, match_soundbite_with_transcript, parse_transcript, format_timestamp_for_filename
+from models import SYSTEM_PROMPT, USER_PROMPT, MAP_SYSTEM_PROMPT, REDUCE_SYSTEM_PROMPT, REDUCE_USER_PROMPT, Soundbite, \
+    VideoTranscript, AllSoundbites, GV_WATERMARK, OutputProfile, PREVIEW_PROFILE, VideoCutResponse
+from ass_script import ass_builder, indexed_word_timings, write_ass_file
+from batch import ResourcePool, llm_rate_limiter
+from boundaries import BOUNDARY_TOLERANCE_SECONDS, clamp_soundbites, snap_soundbites
+from ffmpeg_runner import FFmpegError, current_run_id, run_ffmpeg
+from tracing import span, tracer
+from hls import HLS_DIR, LivePlaylist
+from llm_cache import SoundbiteCache, soundbite_cache
+from probe import probe_encoding_params, probe_keyframes, probe_metadata
+from render_cache import RenderCache, file_hash, render_cache, text_hash
+from soundbite_selection import invoke_with_retries, select_soundbites_map_reduce, transcript_span_seconds
+from transcript_format import encode_transcript_compact, transcript_token_report
+from transcript_index import TranscriptIndex
+from workspace import Workspace, WorkspaceQuotaExceeded
+from subtitles import render_segment, render_segment_renditions, render_highlight_reel, \
+    render_highlight_reel_renditions, format_timestamp_for_filename, time_to_milliseconds, \
+    VIDEO_CODEC, WATERMARK_POSITION
 
 ### SETUP ###
 
 
 load_dotenv(".env")
 
-openai.api_key = os.getenv('OPENAI_API_KEY')
+LLM_MODEL = "gpt-4o"
+# cheaper model that only ranks the pre-selected candidates of long transcripts
+REDUCE_LLM_MODEL = os.getenv("REDUCE_LLM_MODEL", "gpt-4o-mini")
 
-llm = ChatOpenAI(model="gpt-4o", temperature=0)
+# Maximum number of soundbites processed (cut -> ASS -> render) at the same time
+SEGMENT_CONCURRENCY = int(os.getenv("SEGMENT_CONCURRENCY", "4"))
+
+# "segments" cuts, renders and concatenates each soundbite separately; "one_shot" renders the reel in one FFmpeg call
+RENDER_MODES = ("segments", "one_shot", "hls")
+RENDER_MODE = os.getenv("RENDER_MODE", "segments")
+
+# "copy" snaps cuts to keyframes, "accurate" re-encodes whole clips, "smart" re-encodes only the partial GOPs
+CUT_MODES = ("copy", "accurate", "smart")
+CUT_MODE = os.getenv("CUT_MODE", "copy")
+# smart cuts seek the stream-copied middle this far past its keyframe, so input seeking cannot land on the GOP before
+KEYFRAME_SEEK_EPSILON = 0.001
+
+# Transcripts longer than one chunk are split into overlapping windows and selected with map-reduce
+LLM_CHUNK_SECONDS = float(os.getenv("LLM_CHUNK_SECONDS", "1200"))
+LLM_CHUNK_OVERLAP_SECONDS = float(os.getenv("LLM_CHUNK_OVERLAP_SECONDS", "60"))
+LLM_MAP_CONCURRENCY = int(os.getenv("LLM_MAP_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+# Adjacent transcript segments are merged into prompt lines of at most this many tokens (0 keeps every segment)
+TRANSCRIPT_MERGE_TOKENS = int(os.getenv("TRANSCRIPT_MERGE_TOKENS", "0"))
 
 
 ### CHAINING ###
 
-prompt = ChatPromptTemplate.from_messages([SYSTEM_PROMPT, USER_PROMPT])
+# Part of the LLM cache key, so editing the prompts invalidates cached selections
+PROMPT_TEMPLATES = SYSTEM_PROMPT + USER_PROMPT
+MAP_REDUCE_PROMPT_TEMPLATES = MAP_SYSTEM_PROMPT + USER_PROMPT + REDUCE_SYSTEM_PROMPT + REDUCE_USER_PROMPT
+
+# run name -> (system prompt, user prompt, model) of the chains built by get_chain
+CHAIN_SPECS = {
+    "soundbite_selection": (SYSTEM_PROMPT, USER_PROMPT, LLM_MODEL),
+    "soundbite_candidates": (MAP_SYSTEM_PROMPT, USER_PROMPT, LLM_MODEL),
+    "soundbite_ranking": (REDUCE_SYSTEM_PROMPT, REDUCE_USER_PROMPT, REDUCE_LLM_MODEL),
+}
+
+
+@lru_cache(maxsize=None)
+def get_llm(model: str):
+    """Chat model client, created on first use so importing main does not load LangChain/OpenAI."""
+    from langchain_openai import ChatOpenAI
 
-structured_llm = llm.with_structured_output(AllSoundbites)
+    return ChatOpenAI(model=model, temperature=0)
 
-chain = (prompt | structured_llm.with_config({"run_name": "soundbite_selection"}))
+
+@lru_cache(maxsize=None)
+def get_chain(run_name: str):
+    """The prompt | structured LLM chain of CHAIN_SPECS[run_name], compiled once on first use."""
+    from langchain_core.prompts import ChatPromptTemplate
+
+    system_prompt, user_prompt, model = CHAIN_SPECS[run_name]
+    prompt = ChatPromptTemplate.from_messages([("system", system_prompt), ("human", user_prompt)])
+    return prompt | get_llm(model).with_structured_output(AllSoundbites).with_config({"run_name": run_name})
 
 
 ### SOUNDBITE RETRIEVAL ###
@@ -40,7 +102,35 @@ async def retrieve_soundbites_with_llm(transcript: VideoTranscript) -> List[Soun
     """Retrieve soundbites from a video and transcript using LLM."""
     logger.info("RETRIEVING SOUNDBITES FROM LLM")
 
-    response = await chain.ainvoke({"transcript": transcript})
+    chunked = transcript_span_seconds(transcript) > LLM_CHUNK_SECONDS
+
+    # temperature=0, so an identical transcript + prompt + model gives the same selection
+    if chunked:
+        cache_key = SoundbiteCache.key(transcript, MAP_REDUCE_PROMPT_TEMPLATES, f"{LLM_MODEL}+{REDUCE_LLM_MODEL}")
+    else:
+        cache_key = SoundbiteCache.key(transcript, PROMPT_TEMPLATES, LLM_MODEL)
+    cached = await to_thread(soundbite_cache.get, cache_key)
+    if cached is not None:
+        return cached.soundbites
+
+    def encode(chunk: VideoTranscript) -> str:
+        return encode_transcript_compact(chunk, TRANSCRIPT_MERGE_TOKENS, LLM_MODEL)
+
+    llm_started = perf_counter()
+    if chunked:
+        response = await select_soundbites_map_reduce(
+            transcript, get_chain("soundbite_candidates"), get_chain("soundbite_ranking"), LLM_CHUNK_SECONDS,
+            LLM_CHUNK_OVERLAP_SECONDS, LLM_MAP_CONCURRENCY, max_retries=LLM_MAX_RETRIES, transcript_encoder=encode,
+            rate_limiter=llm_rate_limiter,
+        )
+    else:
+        encoded_transcript = encode(transcript)
+        report = transcript_token_report(transcript, encoded_transcript, LLM_MODEL)
+        logger.info(f"Transcript prompt: {report['compact_tokens']} tokens "
+                    f"(pydantic repr: {report['repr_tokens']}, {report['reduction']:.0%} smaller)")
+        response = await invoke_with_retries(get_chain("soundbite_selection"), {"transcript": encoded_transcript},
+                                             max_retries=0, rate_limiter=llm_rate_limiter)
+    logger.info(f"LLM selection took {perf_counter() - llm_started:.2f}s")
 
     logger.info(f"LLM response: {response}")
 
@@ -55,33 +145,178 @@ async def retrieve_soundbites_with_llm(transcript: VideoTranscript) -> List[Soun
                 logger.error(f"Unexpected type in response: {type(item)}")
                 raise HTTPException(status_code=500, detail=f"Unexpected response type: {type(item)}")
 
-        return soundbites
     except Exception as e:
         logger.error(f"Error processing LLM response: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to parse LLM response")
 
+    await to_thread(soundbite_cache.put, cache_key, AllSoundbites(soundbites=soundbites))
+    return soundbites
+
 
 ### VIDEO CUTTING ###
 
-def cut_video(input_path: str, start: str, end: str, output_path: str) -> str:
+def plan_smart_cut(keyframes: List[float], start: float, end: float) -> List[Tuple[float, float, bool]]:
+    """
+    Splits [start, end) into (part_start, part_end, stream_copy) parts: the GOP-aligned middle between the first
+    keyframe at/after start and the last keyframe at/before end is stream-copied, the partial GOPs at both ends
+    are re-encoded. Without a usable keyframe inside the window, the whole window is re-encoded.
+    """
+    inside = [keyframe for keyframe in keyframes if start <= keyframe <= end]
+    if len(inside) < 2:
+        return [(start, end, False)]
+
+    first_keyframe, last_keyframe = inside[0], inside[-1]
+    parts = []
+    if first_keyframe > start:
+        parts.append((start, first_keyframe, False))
+    parts.append((first_keyframe, last_keyframe, True))
+    if end > last_keyframe:
+        parts.append((last_keyframe, end, False))
+    return parts
+
+
+async def probe_source_duration(video_path: str) -> Optional[float]:
+    """Duration (seconds) of the source from the metadata cache, None when it cannot be probed."""
+    try:
+        return (await probe_metadata(video_path))["duration"]
+    except (FFmpegError, OSError, ValueError) as e:
+        # the render stages report unreadable sources with their own errors
+        logger.warning(f"Could not probe {video_path}, soundbite ranges are not validated: {str(e)}")
+        return None
+
+
+async def probe_source_has_audio(video_path: str) -> bool:
+    """Whether the source has an audio stream, from the metadata cache (assumed when it cannot be probed)."""
+    try:
+        return (await probe_metadata(video_path))["has_audio"]
+    except (FFmpegError, OSError, ValueError, KeyError):
+        return True
+
+
+def error_detail(message: str, error: Exception):
+    """HTTPException detail: the message, plus the stage, exit status, reason and stderr tail of FFmpeg errors."""
+    if isinstance(error, HTTPException):
+        return error.detail
+    if isinstance(error, FFmpegError):
+        return {"message": message, **error.to_dict()}
+    return f"{message}: {str(error)}"
+
+
+def build_cut_command(input_path: str, start: str, end: str, output_path: str, stream_copy: bool) -> List[str]:
+    """Builds the FFmpeg command that cuts [start, end] out of the input, stream-copied or re-encoded."""
+    codecs = ["-c", "copy", "-avoid_negative_ts", "make_zero"] if stream_copy else \
+        ["-c:v", VIDEO_CODEC, "-c:a", "aac"]
+    # input seeking: with stream copy it lands exactly on the keyframe, so copied GOPs start cleanly
+    return ["ffmpeg", "-y", "-ss", start, "-to", end, "-i", input_path] + codecs + [output_path]
+
+
+def build_concat_command(list_file: str, output_path: str) -> List[str]:
+    """Builds the FFmpeg command that stream-copies the files listed in a concat demuxer list."""
+    return ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_file, "-c", "copy", output_path]
+
+
+def write_concat_list(list_file: str, paths: List[str]):
+    """Writes a concat demuxer list with absolute paths."""
+    with open(list_file, "w") as f:
+        for path in paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+
+
+def build_smart_part_command(input_path: str, start: float, end: float, output_path: str, stream_copy: bool,
+                             params: Dict) -> List[str]:
+    """
+    Builds the FFmpeg command of one video-only part of a smart cut, written as MPEG-TS (Annex B, parameter sets
+    in-band) so copied and re-encoded parts can be stitched even when their encoder settings differ slightly.
+    """
+    if stream_copy:
+        start += KEYFRAME_SEEK_EPSILON
+        codecs = ["-c:v", "copy"]
+    else:
+        # match the source stream, so the decoder sees one consistent H.264 stream across the part boundaries
+        codecs = ["-c:v", VIDEO_CODEC, "-x264-params", "repeat-headers=1"]
+        for option, key in (("-profile:v", "profile"), ("-level:v", "level"), ("-pix_fmt", "pix_fmt")):
+            if params.get(key):
+                codecs += [option, params[key]]
+    return ["ffmpeg", "-y", "-ss", f"{start:.6f}", "-to", f"{end:.6f}", "-i", input_path, "-map", "0:v:0"] + \
+        codecs + ["-an", "-bsf:v", "h264_mp4toannexb", "-f", "mpegts", output_path]
+
+
+def build_smart_stitch_command(list_file: str, input_path: str, start: float, end: float, output_path: str,
+                               params: Dict) -> List[str]:
+    """
+    Builds the FFmpeg command that stream-copies the listed video parts into MP4 (in the source's timescale) and
+    encodes the audio of [start, end] once for the whole clip, so no audio gaps appear at the part boundaries.
+    """
+    timescale = ["-video_track_timescale", str(params["timescale"])] if params.get("timescale") else []
+    return ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_file,
+            "-ss", f"{start:.6f}", "-to", f"{end:.6f}", "-i", input_path,
+            "-map", "0:v:0", "-map", "1:a:0?", "-c:v", "copy", "-c:a", "aac"] + timescale + \
+        ["-avoid_negative_ts", "make_zero", output_path]
+
+
+async def smart_cut(input_path: str, start: float, end: float, output_path: str, params: Dict,
+                    segment: Optional[str] = None):
+    """
+    Frame-accurate cut at close to stream-copy speed: only the partial GOPs at the edges are re-encoded with the
+    source's encoding parameters, then the video parts are stitched together with the audio of the whole clip.
+    """
+    parts = plan_smart_cut(await probe_keyframes(input_path), start, end)
+    part_paths = []
+    list_file = f"{output_path}.{uuid4()}.txt"
+
+    try:
+        for index, (part_start, part_end, stream_copy) in enumerate(parts):
+            part_path = f"{output_path}.part{index}.ts"
+            await run_ffmpeg(build_smart_part_command(input_path, part_start, part_end, part_path, stream_copy,
+                                                      params), "cut", segment)
+            part_paths.append(part_path)
+
+        write_concat_list(list_file, part_paths)
+        await run_ffmpeg(build_smart_stitch_command(list_file, input_path, start, end, output_path, params),
+                         "cut", segment)
+
+    finally:
+        for path in part_paths + [list_file]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+async def cut_video(input_path: str, start: str, end: str, output_path: str, mode: Optional[str] = None) -> str:
     """
     Cuts video based on start and end timestamps.
+    mode "copy" stream-copies (cuts snap to keyframes), "accurate" re-encodes the whole clip and "smart"
+    re-encodes only the partial GOPs at both ends (defaults to CUT_MODE).
     """
+    mode = mode or CUT_MODE
+    if mode not in CUT_MODES:
+        raise ValueError(f"Unknown cut mode: {mode}")
+
     # Format the filename to avoid invalid characters (like colons)
     formatted_start_time = format_timestamp_for_filename(start)
     formatted_end_time = format_timestamp_for_filename(end)
 
-    # Construct the sanitized output file path using the formatted times
+    # Construct the sanitized output file path using the formatted times, next to the requested output
     sanitized_output_path = os.path.join(
-        "uploads", f"segment_{formatted_start_time}_{formatted_end_time}.mp4"
+        os.path.dirname(output_path) or "uploads", f"segment_{formatted_start_time}_{formatted_end_time}.mp4"
     )
+    segment = f"{start}-{end}"
 
-    logger.info(f"Cutting video from {start} to {end}. Input: {input_path}, Output: {sanitized_output_path}")
+    logger.info(f"Cutting video ({mode}) from {start} to {end}. Input: {input_path}, Output: {sanitized_output_path}")
 
     try:
-        # Run the ffmpeg command to cut the video
-        ffmpeg.input(input_path, ss=start, to=end).output(sanitized_output_path, acodec='copy', vcodec='copy').run(
-            overwrite_output=True)
+        params = await probe_encoding_params(input_path) if mode == "smart" else {}
+        if mode == "smart" and params["video_codec"] != "h264":
+            # re-encoded edges are H.264 and can only be stitched to stream-copied H.264
+            logger.warning(f"Smart cut needs an H.264 source, re-encoding the whole clip instead: {input_path}")
+            mode = "accurate"
+
+        if mode == "smart":
+            await smart_cut(input_path, time_to_milliseconds(start) / 1000, time_to_milliseconds(end) / 1000,
+                            sanitized_output_path, params, segment)
+        else:
+            # Run the ffmpeg command to cut the video
+            await run_ffmpeg(build_cut_command(input_path, start, end, sanitized_output_path, mode == "copy"),
+                             "cut", segment)
         logger.info(f"Video successfully cut to {sanitized_output_path}")
         return sanitized_output_path
     except Exception as e:
@@ -91,25 +326,26 @@ def cut_video(input_path: str, start: str, end: str, output_path: str) -> str:
 
 ### MERGING ###
 
-def merge_segments(segment_paths: List[str]) -> str:
+async def merge_segments(segment_paths: List[str], output_dir: str = "uploads", suffix: str = "") -> str:
     """Merges video based on list of cut segments' paths"""
     logger.info("ATTEMPTING TO MERGE VIDEO")
     if not segment_paths:
         raise ValueError("No segments provided for merging.")
 
-    list_file = f"uploads/{uuid4()}.txt"
-    merged_output = f"uploads/merged_video_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"
+    list_file = os.path.join(output_dir, f"{uuid4()}.txt")
+    merged_output = os.path.join(output_dir, f"merged_video_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}.mp4")
 
     try:
-        with open(list_file, "w") as f:
-            for segment in segment_paths:
-                if os.path.exists(segment):
-                    f.write(f"file '{os.path.abspath(segment)}'\n")
-                else:
-                    logger.error(f"Segment does not exist: {segment}")
+        existing_segments = []
+        for segment in segment_paths:
+            if os.path.exists(segment):
+                existing_segments.append(segment)
+            else:
+                logger.error(f"Segment does not exist: {segment}")
+        write_concat_list(list_file, existing_segments)
 
         # merge
-        ffmpeg.input(list_file, format='concat', safe=0).output(merged_output, c='copy').run()
+        await run_ffmpeg(build_concat_command(list_file, merged_output), "merge")
 
         if os.path.exists(merged_output):
             logger.info(f"Videos merged successfully to {merged_output}")
@@ -119,7 +355,7 @@ def merge_segments(segment_paths: List[str]) -> str:
 
     except Exception as e:
         logger.error(f"Error merging segments: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error merging segments: {str(e)}")
+        raise HTTPException(status_code=500, detail=error_detail("Error merging segments", e))
 
     finally:
         if os.path.exists(list_file):
@@ -134,85 +370,502 @@ def merge_segments(segment_paths: List[str]) -> str:
 ### CUTTING + MERGING ###
 
 
-async def process_video_cut_request(video_path: str, transcript: VideoTranscript) -> AllSoundbites:
-    """Processes video cut request by coordinating soundbite retrieval, video cutting, and merging asynchronously."""
-
-    logger.info("PROCESSING CUT MERGE REQUEST")
+@contextmanager
+def timed_stage(stage_timings: Dict[str, float], stage: str, label: str = ""):
+    """Adds the wall time spent inside the block to stage_timings[stage] and traces it as a span."""
+    started = perf_counter()
+    try:
+        with span(stage, segment=label.strip() or None) as stage_span:
+            yield stage_span
+    finally:
+        elapsed = perf_counter() - started
+        stage_timings[stage] = stage_timings.get(stage, 0.0) + elapsed
+        logger.info(f"Stage '{stage}' {label}took {elapsed:.2f}s")
+
+
+@asynccontextmanager
+async def pool_slot(pool: Optional[ResourcePool], stage_timings: Dict[str, float]):
+    """Holds a slot of the resource pool for the block (no limit without a pool); the wait is a stage of its own."""
+    if pool is None:
+        yield
+        return
+    with timed_stage(stage_timings, f"{pool.name}_queue"):
+        await pool.acquire()
+    try:
+        yield
+    finally:
+        await pool.release()
 
-    # Retrieve soundbites using the LLM
-    soundbites = await retrieve_soundbites_with_llm(transcript)
 
-    # Store the paths of processed video segments
-    segment_paths = []
+def render_settings_key(source_hash: str) -> Dict[str, str]:
+    """Cache key parts shared by every artifact of a request: the source video, watermark and encoder settings."""
+    watermark_hash = file_hash(GV_WATERMARK) if os.path.exists(GV_WATERMARK) else GV_WATERMARK
+    return {
+        "source": source_hash,
+        "watermark": watermark_hash,
+        "video_codec": VIDEO_CODEC,
+        "watermark_position": WATERMARK_POSITION,
+    }
 
-    # Parse full transcript to match subtitles with each segment
-    transcript_segments = parse_transcript(TRANSCRIPT_PATH)
 
+def build_soundbite_ass_scripts(soundbites: List[Soundbite], transcript_index: TranscriptIndex) -> List[str]:
+    """
+    Builds the karaoke .ass scripts of all soundbites of a request in one batch, in memory. Words are timed from
+    the transcript segments and every script is timed relative to the start of its soundbite.
+    """
+    items = []
     for soundbite in soundbites:
-        # Use formatted timestamps for the file names (no colons)
-        formatted_start_time = format_timestamp_for_filename(soundbite.start_time)
-        formatted_end_time = format_timestamp_for_filename(soundbite.end_time)
+        start_ms, end_ms = time_to_milliseconds(soundbite.start_time), time_to_milliseconds(soundbite.end_time)
+        items.append((indexed_word_timings(transcript_index, start_ms, end_ms), start_ms))
+    return ass_builder.render_batch(items)
 
-        # Construct the filename with sanitized timestamps
-        segment_filename = f"segment_{formatted_start_time}_{formatted_end_time}.mp4"
-        video_segment_path = os.path.join("uploads", segment_filename)
-        logger.info(f"Attempting to cut video from {soundbite.start_time} to {soundbite.end_time}.")
 
-        try:
-            # Cut video based on the soundbite timestamp
-            await to_thread(cut_video, video_path, soundbite.start_time, soundbite.end_time, video_segment_path)
-            soundbite.file_path = video_segment_path
-            logger.info(f"Successfully cut video segment: {video_segment_path}")
+def write_soundbite_ass_file(soundbite: Soundbite, transcript_index: TranscriptIndex,
+                             directory: str = "uploads", script: Optional[str] = None) -> str:
+    """Writes the karaoke .ass file of a soundbite (its script from the batch, or built now) in one write."""
+    formatted_start_time = format_timestamp_for_filename(soundbite.start_time)
+    formatted_end_time = format_timestamp_for_filename(soundbite.end_time)
+    ass_file_path = os.path.join(directory, f"subtitles_{formatted_start_time}_{formatted_end_time}.ass")
+    if script is None:
+        script = build_soundbite_ass_scripts([soundbite], transcript_index)[0]
+    write_ass_file(ass_file_path, script)
+    return ass_file_path
 
-            # Save cut video as an artifact
-            cut_video_artifact = video_segment_path.replace('.mp4', '_cut.mp4')
-            os.rename(video_segment_path, cut_video_artifact)  # Renaming for clarity
-            logger.info(f"Saved cut video segment for demo: {cut_video_artifact}")
 
-        except Exception as e:
-            logger.error(f"Error cutting video segment: {str(e)}")
-            continue
+async def materialize_all(keys: List[Optional[str]], paths: List[str]) -> bool:
+    """Copies the cached artifact of every key to its path, off the event loop. False if any of them is not cached."""
+    for key, path in zip(keys, paths):
+        if not key or not await to_thread(render_cache.materialize, key, path):
+            return False
+    return True
+
+
+async def gather_or_cancel(*coroutines):
+    """
+    Like asyncio.gather, but when one task fails (or the caller is cancelled) the others are cancelled and
+    awaited before the error propagates, so no FFmpeg process outlives the workspace it writes into.
+    """
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
 
-        # Create .ass file for each segment based on the matched transcript
-        segment_start_time = soundbite.start_time
-        ass_file_path = os.path.join("uploads", f"subtitles_{formatted_start_time}_{formatted_end_time}.ass")
-        transcript_text = match_soundbite_with_transcript(soundbite, transcript_segments)
-        create_ass_file_for_segment(soundbite, transcript_text, ass_file_path, segment_start_time)
 
-        # Add animated subtitles to the video segment using FFmpeg
-        subtitled_segment_path = cut_video_artifact.replace('_cut.mp4', '_subtitled.mp4')
-        await to_thread(add_subtitles_to_segment, cut_video_artifact, ass_file_path, subtitled_segment_path)
-        logger.info(f"Subtitles added to video segment: {subtitled_segment_path}")
+def rendition_suffix(profile: Optional[OutputProfile]) -> str:
+    """File name suffix of a rendition ("" for the default rendition at the source size)."""
+    return f"_{profile.name}" if profile else ""
 
-        # Save subtitled video as an artifact
-        logger.info(f"Saved subtitled video segment for demo: {subtitled_segment_path}")
 
-        # Add watermark to the subtitled video segment
-        watermarked_segment_path = subtitled_segment_path.replace('_subtitled.mp4', '_watermarked.mp4')
-        await to_thread(add_watermark, subtitled_segment_path, watermarked_segment_path, GV_WATERMARK)
-        logger.info(f"Watermark added to video segment: {watermarked_segment_path}")
+def rendition_key(profile: Optional[OutputProfile]) -> Dict:
+    """Cache key parts of a rendition (none for the default rendition at the source size)."""
+    return {"profile": profile.dict()} if profile else {}
 
-        # Save watermarked video as an artifact
-        logger.info(f"Saved watermarked video segment for demo: {watermarked_segment_path}")
 
-        # Store the processed segment path for merging later
-        segment_paths.append(watermarked_segment_path)
+async def process_soundbite(video_path: str, soundbite: Soundbite, transcript_index: TranscriptIndex,
+                            semaphore: asyncio.Semaphore, stage_timings: Dict[str, float],
+                            cache_parts: Optional[Dict[str, str]] = None,
+                            workspace: Optional[Workspace] = None,
+                            profiles: Optional[List[OutputProfile]] = None,
+                            ass_script: Optional[str] = None
+                            ) -> Optional[Tuple[List[str], List[Optional[str]]]]:
+    """
+    Runs the cut -> ASS -> render (subtitles + watermark) chain for one soundbite, writing the intermediates
+    into the workspace (uploads/ without one) and removing the cut and subtitles once they are rendered.
+    With output profiles, every rendition is rendered from one decode of the cut. ass_script is the soundbite's
+    subtitle script from the request's batch (built on the spot when not given).
+    Returns the rendered segment path and render cache key (None when caching is off) of every rendition,
+    or None if the soundbite could not be cut.
+    """
+    # Use formatted timestamps for the file names (no colons)
+    formatted_start_time = format_timestamp_for_filename(soundbite.start_time)
+    formatted_end_time = format_timestamp_for_filename(soundbite.end_time)
+    label = f"[{soundbite.start_time} - {soundbite.end_time}] "
+
+    # Construct the filename with sanitized timestamps
+    segment_filename = f"segment_{formatted_start_time}_{formatted_end_time}.mp4"
+    directory = workspace.path if workspace else "uploads"
+    video_segment_path = os.path.join(directory, segment_filename)
+
+    async with semaphore:
+        logger.info(f"Attempting to cut video from {soundbite.start_time} to {soundbite.end_time}.")
+
+        cut_video_artifact = video_segment_path.replace('.mp4', '_cut.mp4')
+        cut_key = None
+        if cache_parts is not None:
+            cut_key = RenderCache.key(kind="cut", start=soundbite.start_time, end=soundbite.end_time,
+                                      cut_mode=CUT_MODE, **cache_parts)
+
+        try:
+            if cut_key and await to_thread(render_cache.materialize, cut_key, cut_video_artifact):
+                soundbite.file_path = video_segment_path
+            else:
+                # Cut video based on the soundbite timestamp
+                with timed_stage(stage_timings, "cut", label) as stage_span:
+                    stage_span.files(outputs=[video_segment_path])
+                    await cut_video(video_path, soundbite.start_time, soundbite.end_time, video_segment_path)
+                soundbite.file_path = video_segment_path
+                logger.info(f"Successfully cut video segment: {video_segment_path}")
+
+                # Save cut video as an artifact
+                os.rename(video_segment_path, cut_video_artifact)  # Renaming for clarity
+                logger.info(f"Saved cut video segment for demo: {cut_video_artifact}")
+                if cut_key:
+                    await to_thread(render_cache.put, cut_key, cut_video_artifact)
+            if workspace:
+                workspace.check()
+
+        except WorkspaceQuotaExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error cutting video segment: {str(e)}")
+            return None
+
+        # Create .ass file for each segment based on the matched transcript
+        renditions = profiles or [None]
+        rendered_paths = [cut_video_artifact.replace('_cut.mp4', f'_rendered{rendition_suffix(profile)}.mp4')
+                          for profile in renditions]
+        ass_file_path = None
+        try:
+            with timed_stage(stage_timings, "ass", label) as stage_span:
+                if ass_script is None:
+                    ass_script = build_soundbite_ass_scripts([soundbite], transcript_index)[0]
+                ass_file_path = write_soundbite_ass_file(soundbite, transcript_index, directory, ass_script)
+                stage_span.files(outputs=[ass_file_path])
+
+            # Burn the animated subtitles and the watermark in a single FFmpeg pass (for every rendition)
+            render_keys: List[Optional[str]] = [None] * len(renditions)
+            if cut_key:
+                ass_hash = text_hash(ass_script)
+                render_keys = [RenderCache.key(kind="render", cut=cut_key, ass=ass_hash, **rendition_key(profile),
+                                               **cache_parts) for profile in renditions]
+
+            if not await materialize_all(render_keys, rendered_paths):
+                with timed_stage(stage_timings, "render", label) as stage_span:
+                    stage_span.files(inputs=[cut_video_artifact], outputs=rendered_paths)
+                    if profiles:
+                        await render_segment_renditions(cut_video_artifact, list(zip(profiles, rendered_paths)),
+                                                        ass_file_path, GV_WATERMARK, segment=label.strip())
+                    else:
+                        await render_segment(cut_video_artifact, rendered_paths[0], ass_file_path, GV_WATERMARK,
+                                             segment=label.strip())
+                logger.info(f"Subtitles and watermark added to video segment: {', '.join(rendered_paths)}")
+                for key, path in zip(render_keys, rendered_paths):
+                    if key:
+                        await to_thread(render_cache.put, key, path)
+            if workspace:
+                workspace.check()
+        except WorkspaceQuotaExceeded:
+            raise
+        except Exception as e:
+            # like a failed cut, a failed render only drops this soundbite from the reel
+            logger.error(f"Error rendering video segment {label}: {str(e)}")
+            if workspace:
+                workspace.release(cut_video_artifact, ass_file_path, *rendered_paths)
+            return None
+        if workspace:
+            workspace.release(cut_video_artifact, ass_file_path)
+
+    return rendered_paths, render_keys
+
+
+async def render_reel_one_shot(video_path: str, soundbites: List[Soundbite],
+                               transcript_index: TranscriptIndex, stage_timings: Dict[str, float],
+                               cache_parts: Optional[Dict[str, str]] = None,
+                               workspace: Optional[Workspace] = None,
+                               profiles: Optional[List[OutputProfile]] = None) -> List[str]:
+    """
+    Renders the highlight reel with a single FFmpeg process: the source is opened once and no intermediate
+    cut/rendered segment files are written, only the small .ass subtitle files.
+    Returns the reel of every rendition (one per output profile, or one at the source size).
+    """
+    directory = workspace.path if workspace else "uploads"
+    with timed_stage(stage_timings, "ass") as stage_span:
+        ass_scripts = build_soundbite_ass_scripts(soundbites, transcript_index)
+        ass_file_paths = [write_soundbite_ass_file(soundbite, transcript_index, directory, script)
+                          for soundbite, script in zip(soundbites, ass_scripts)]
+        stage_span.files(outputs=ass_file_paths)
+
+    windows = [
+        (time_to_milliseconds(soundbite.start_time) / 1000, time_to_milliseconds(soundbite.end_time) / 1000)
+        for soundbite in soundbites
+    ]
+    renditions = profiles or [None]
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    merged_outputs = [os.path.join(directory, f"merged_video_{timestamp}{rendition_suffix(profile)}.mp4")
+                      for profile in renditions]
+
+    reel_keys: List[Optional[str]] = [None] * len(renditions)
+    if cache_parts is not None:
+        ass_hashes = [text_hash(script) for script in ass_scripts]
+        reel_keys = [RenderCache.key(kind="one_shot_reel", windows=windows, ass=ass_hashes, **rendition_key(profile),
+                                     **cache_parts) for profile in renditions]
+    if await materialize_all(reel_keys, merged_outputs):
+        return merged_outputs
+
+    has_audio = await probe_source_has_audio(video_path)
+    with timed_stage(stage_timings, "render") as stage_span:
+        stage_span.files(outputs=merged_outputs)
+        if profiles:
+            await render_highlight_reel_renditions(video_path, windows, ass_file_paths,
+                                                   list(zip(profiles, merged_outputs)), GV_WATERMARK,
+                                                   has_audio=has_audio)
+        else:
+            await render_highlight_reel(video_path, windows, ass_file_paths, merged_outputs[0], GV_WATERMARK,
+                                        has_audio=has_audio)
+    for key, path in zip(reel_keys, merged_outputs):
+        if key:
+            await to_thread(render_cache.put, key, path)
+
+    if not all(os.path.exists(path) for path in merged_outputs):
+        raise HTTPException(status_code=500, detail="Failed to render highlight reel.")
+    if workspace:
+        workspace.check()
+        workspace.release(*ass_file_paths)
+    return merged_outputs
+
+
+async def render_reel_hls(video_path: str, soundbites: List[Soundbite], transcript_index: TranscriptIndex,
+                          concurrency: Optional[int], stage_timings: Dict[str, float],
+                          cache_parts: Optional[Dict[str, str]], workspace: Workspace,
+                          profiles: Optional[List[OutputProfile]] = None) -> List[str]:
+    """
+    Renders the soundbites like the segments mode, but instead of merging them at the end every rendered clip is
+    segmented into fMP4 and appended to a live HLS playlist (one per rendition) as soon as the clips before it are
+    published, so playback can start after the first clip. Returns the playlist paths.
+    """
+    run_directory = os.path.join(HLS_DIR, re.sub(r"[^A-Za-z0-9_-]", "_", current_run_id.get() or uuid4().hex))
+    playlists = [LivePlaylist(os.path.join(run_directory, profile.name) if profile else run_directory)
+                 for profile in profiles or [None]]
+    semaphore = asyncio.Semaphore(max(1, concurrency or SEGMENT_CONCURRENCY))
+    with timed_stage(stage_timings, "ass"):
+        ass_scripts = build_soundbite_ass_scripts(soundbites, transcript_index)
+
+    async def render_and_publish(index: int, soundbite: Soundbite):
+        try:
+            result = await process_soundbite(video_path, soundbite, transcript_index, semaphore, stage_timings,
+                                             cache_parts, workspace, profiles, ass_scripts[index])
+        except WorkspaceQuotaExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error rendering soundbite {index} for HLS: {str(e)}")
+            result = None
+        if result is None:
+            for playlist in playlists:
+                playlist.skip(index)
+            return
+
+        label = f"[{soundbite.start_time} - {soundbite.end_time}] "
+        for playlist, rendered_path in zip(playlists, result[0]):
+            try:
+                with timed_stage(stage_timings, "hls", label) as stage_span:
+                    stage_span.files(inputs=[rendered_path])
+                    await playlist.add_clip(index, rendered_path, segment=label.strip())
+            except FFmpegError as e:
+                logger.error(f"Error segmenting {rendered_path} for HLS: {str(e)}")
+                playlist.skip(index)
+        workspace.release(*result[0])
 
-    # Merge all watermarked segments into a single video
     try:
-        merged_video_path = await to_thread(merge_segments, segment_paths)
-        logger.info(f"Successfully merged all video segments into: {merged_video_path}")
+        await gather_or_cancel(*(render_and_publish(index, soundbite) for index, soundbite in enumerate(soundbites)))
+    finally:
+        # players stop polling once the playlist is closed, also when the request fails
+        for playlist in playlists:
+            playlist.finish()
+    return [playlist.path for playlist in playlists]
 
-        # Save the merged video as an artifact
-        merged_video_artifact = merged_video_path.replace('.mp4', '_final_highlight_reel.mp4')
-        os.rename(merged_video_path, merged_video_artifact)
-        logger.info(f"Saved final highlight reel for demo: {merged_video_artifact}")
 
-    except Exception as e:
-        logger.error(f"Error during video merging: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to merge video segments.")
+async def render_reel(video_path: str, soundbites: List[Soundbite], transcript_index: TranscriptIndex,
+                      render_mode: str, concurrency: Optional[int], stage_timings: Dict[str, float],
+                      cache_parts: Optional[Dict[str, str]], workspace: Workspace,
+                      profiles: Optional[List[OutputProfile]] = None) -> List[str]:
+    """
+    Renders the highlight reel into the workspace, in one pass or segment by segment.
+    Returns the reel of every rendition (one per output profile, or one at the source size).
+    """
+    if render_mode == "hls":
+        return await render_reel_hls(video_path, soundbites, transcript_index, concurrency, stage_timings,
+                                     cache_parts, workspace, profiles)
+    if render_mode == "one_shot":
+        try:
+            return await render_reel_one_shot(video_path, soundbites, transcript_index, stage_timings, cache_parts,
+                                              workspace, profiles)
+        except WorkspaceQuotaExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error during one-shot rendering: {str(e)}")
+            raise HTTPException(status_code=500, detail=error_detail("Failed to render highlight reel.", e))
+
+    # Fan out the per-soundbite chains; gather keeps the results in soundbite order for merging
+    semaphore = asyncio.Semaphore(max(1, concurrency or SEGMENT_CONCURRENCY))
+    with timed_stage(stage_timings, "ass"):
+        ass_scripts = build_soundbite_ass_scripts(soundbites, transcript_index)
+    results = await gather_or_cancel(*(
+        process_soundbite(video_path, soundbite, transcript_index, semaphore, stage_timings, cache_parts, workspace,
+                          profiles, ass_script)
+        for soundbite, ass_script in zip(soundbites, ass_scripts)
+    ))
+    results = [result for result in results if result is not None]
+
+    # Merge the rendered segments of every rendition into a single video
+    merged_video_paths = []
+    for index, profile in enumerate(profiles or [None]):
+        segment_paths = [paths[index] for paths, _ in results]
+        render_keys = [keys[index] for _, keys in results]
+
+        merged_key = None
+        if cache_parts is not None and None not in render_keys:
+            merged_key = RenderCache.key(kind="reel", segments=render_keys)
 
-    return AllSoundbites(
-        soundbites=soundbites,
-        merged_video_path=merged_video_artifact
-    )
\ No newline at end of file
+        try:
+            merged_video_path = workspace.file(
+                f"merged_video_{datetime.now().strftime('%Y%m%d_%H%M%S')}{rendition_suffix(profile)}.mp4")
+            if merged_key and segment_paths and await to_thread(render_cache.materialize, merged_key,
+                                                                 merged_video_path):
+                workspace.release(*segment_paths)
+            else:
+                with timed_stage(stage_timings, "merge") as stage_span:
+                    stage_span.files(inputs=segment_paths)
+                    merged_video_path = await merge_segments(segment_paths, workspace.path,
+                                                             rendition_suffix(profile))
+                    stage_span.files(outputs=[merged_video_path])
+                if merged_key:
+                    await to_thread(render_cache.put, merged_key, merged_video_path)
+            workspace.check()
+            logger.info(f"Successfully merged all video segments into: {merged_video_path}")
+        except WorkspaceQuotaExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error during video merging: {str(e)}")
+            raise HTTPException(status_code=500, detail=error_detail("Failed to merge video segments.", e))
+        merged_video_paths.append(merged_video_path)
+    return merged_video_paths
+
+
+async def process_video_cut_request(video_path: str, transcript: VideoTranscript,
+                                    concurrency: Optional[int] = None,
+                                    render_mode: Optional[str] = None,
+                                    transcript_index: Optional[TranscriptIndex] = None,
+                                    run_id: Optional[str] = None,
+                                    profiles: Optional[List[OutputProfile]] = None,
+                                    preview: bool = False,
+                                    soundbites: Optional[List[Soundbite]] = None,
+                                    llm_pool: Optional[ResourcePool] = None,
+                                    encode_pool: Optional[ResourcePool] = None) -> VideoCutResponse:
+    """
+    Processes video cut request by coordinating soundbite retrieval, video cutting, and merging asynchronously.
+    Soundbites are processed by at most `concurrency` workers (defaults to SEGMENT_CONCURRENCY).
+    With render_mode "one_shot" the whole reel is rendered by a single FFmpeg process instead.
+    Subtitles are matched against transcript_index, built from the transcript when not given.
+    FFmpeg progress events are tagged with run_id.
+    With output profiles, one reel per profile is rendered from the same decode of every clip.
+    preview renders a downscaled, ultrafast, low-bitrate reel in one pass instead. Pass the soundbites of an earlier
+    (preview) run to render them again without asking the LLM.
+    Batches share llm_pool between the LLM selections and encode_pool between everything after it.
+    """
+
+    logger.info("PROCESSING CUT MERGE REQUEST")
+    current_run_id.set(run_id or uuid4().hex)
+
+    render_mode = render_mode or RENDER_MODE
+    if preview:
+        # one process, no intermediate segments: the fastest way to a watchable reel
+        render_mode, profiles = "one_shot", [PREVIEW_PROFILE]
+    if render_mode not in RENDER_MODES:
+        raise ValueError(f"Unknown render mode: {render_mode}")
+
+    # every stage is traced as a child span of the request; with TRACE_DIR set the run gets a trace file
+    try:
+        with span("request", render_mode=render_mode, preview=preview or None):
+            stage_timings: Dict[str, float] = {}
+            request_started = perf_counter()
+
+            # Probe the source (once per file, cached) while the LLM selects soundbites
+            duration_task = asyncio.create_task(probe_source_duration(video_path))
+
+            # Retrieve soundbites using the LLM, unless an earlier selection is rendered again
+            selected_by_llm = soundbites is None
+            try:
+                if selected_by_llm:
+                    async with pool_slot(llm_pool, stage_timings):
+                        with timed_stage(stage_timings, "llm") as stage_span:
+                            soundbites = await retrieve_soundbites_with_llm(transcript)
+                            stage_span.set(soundbites=len(soundbites))
+            except BaseException:
+                duration_task.cancel()
+                raise
+
+            # Timestamps past the end of the video are fixed here instead of failing inside FFmpeg
+            with timed_stage(stage_timings, "metadata"):
+                duration = await duration_task
+            if duration:
+                soundbites = clamp_soundbites(soundbites, duration)
+                if not soundbites:
+                    raise HTTPException(status_code=422, detail=f"No soundbite lies within the video "
+                                                                f"({duration:.3f}s long)")
+
+            # Snapping, hashing and rendering are CPU-bound: batches bound them with the encode pool
+            async with pool_slot(encode_pool, stage_timings):
+                # Move the LLM's cuts to the nearest pauses so no word is cut in half
+                if selected_by_llm and BOUNDARY_TOLERANCE_SECONDS > 0:
+                    with timed_stage(stage_timings, "boundaries"):
+                        soundbites = await snap_soundbites(video_path, soundbites, concurrency or SEGMENT_CONCURRENCY)
+
+                # Index the already parsed transcript once to match subtitles with each segment
+                if transcript_index is None:
+                    with timed_stage(stage_timings, "transcript"):
+                        transcript_index = TranscriptIndex.from_segments(transcript.segments)
+
+                # Hash the source once so unchanged artifacts can be reused from the render cache
+                cache_parts = None
+                if render_cache.enabled:
+                    with timed_stage(stage_timings, "hash"):
+                        cache_parts = render_settings_key(await to_thread(file_hash, video_path))
+
+                # Intermediates go into a private workspace that is removed when the request ends, even on failure
+                workspace = Workspace()
+                try:
+                    merged_video_paths = await render_reel(video_path, soundbites, transcript_index, render_mode,
+                                                           concurrency, stage_timings, cache_parts, workspace, profiles)
+
+                    # Save the merged videos as artifacts; HLS playlists are published in place while rendering
+                    if render_mode == "hls":
+                        merged_video_artifacts = merged_video_paths
+                    else:
+                        merged_video_artifacts = []
+                        for merged_video_path in merged_video_paths:
+                            merged_video_artifact = os.path.join(
+                                "uploads",
+                                os.path.basename(merged_video_path).replace('.mp4', '_final_highlight_reel.mp4'),
+                            )
+                            if os.path.isfile(merged_video_artifact):  # another run finished in the same second
+                                merged_video_artifact = merged_video_artifact.replace(
+                                    ".mp4", f"_{current_run_id.get()[:8]}.mp4")
+                            shutil.move(merged_video_path, merged_video_artifact)
+                            merged_video_artifacts.append(merged_video_artifact)
+                            logger.info(f"Saved final highlight reel for demo: {merged_video_artifact}")
+                except WorkspaceQuotaExceeded as e:
+                    logger.error(f"Request ran out of workspace: {str(e)}")
+                    raise HTTPException(status_code=507, detail=str(e))
+                finally:
+                    workspace.cleanup()
+
+            stage_timings["total"] = perf_counter() - request_started
+            logger.info(f"Stage wall times (summed over segments): {stage_timings}")
+
+            renditions = None
+            if profiles:
+                renditions = {profile.name: path for profile, path in zip(profiles, merged_video_artifacts)}
+
+            return VideoCutResponse(
+                soundbites=soundbites,
+                merged_video_path=merged_video_artifacts[0],
+                stage_timings=stage_timings,
+                workspace_peak_bytes=workspace.peak_bytes,
+                renditions=renditions,
+            )
+    finally:
+        tracer.export(current_run_id.get())
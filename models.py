@@ -1,7 +1,6 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-from langchain_core.prompts import SystemMessagePromptTemplate, HumanMessagePromptTemplate
-from pydantic.v1 import BaseModel, Field
+from pydantic.v1 import BaseModel, Field, validator
 
 
 GV_WATERMARK = "/Users/dtaibeau/Documents/Gigaverse/ffmpeg_testing/GV_Watermark.png"
@@ -32,6 +31,53 @@ class Soundbite(BaseModel):
     reasoning: Optional[str] = None  # llm reasoning for selecting particular soundbite
 
 
+class OutputProfile(BaseModel):
+    """Data model for one rendition of the highlight reel (frame size, fit, bitrates, overlay placement)"""
+    name: str = Field(..., regex=r'^[A-Za-z0-9_-]+$')
+    width: int = Field(..., gt=0)
+    height: int = Field(..., gt=0)
+    fit: str = Field("crop", regex=r'^(crop|pad)$')  # crop fills the frame, pad letterboxes the source
+    video_bitrate: Optional[str] = None  # e.g. "6M", None keeps the encoder's default quality
+    audio_bitrate: str = "128k"
+    preset: Optional[str] = None  # x264 preset, e.g. "ultrafast", None keeps the encoder's default
+    watermark_position: Optional[str] = None  # overlay x:y expression, None uses WATERMARK_POSITION
+    subtitle_margin_v: Optional[int] = None  # ASS MarginV override, None keeps the subtitle style's margin
+
+
+# Presets that can be requested by name
+OUTPUT_PROFILES = {
+    "landscape": OutputProfile(name="landscape", width=1920, height=1080, video_bitrate="8M",
+                               watermark_position="W-w-100:H-h-700"),
+    "vertical": OutputProfile(name="vertical", width=1080, height=1920, video_bitrate="6M",
+                              watermark_position="(W-w)/2:200", subtitle_margin_v=120),
+    "square": OutputProfile(name="square", width=1080, height=1080, video_bitrate="5M",
+                            watermark_position="W-w-60:60", subtitle_margin_v=60),
+}
+
+# Downscaled, fast and small rendition for reviewing a selection before the full-quality render
+PREVIEW_PROFILE = OutputProfile(name="preview", width=640, height=360, fit="pad", video_bitrate="600k",
+                                audio_bitrate="64k", preset="ultrafast")
+
+
+class BatchItem(BaseModel):
+    """Data model for one episode of a batch: video and transcript file names in the upload directory"""
+    video: str
+    transcript: str
+    run_id: Optional[str] = Field(None, regex=r'^[A-Za-z0-9_-]+$')
+
+
+class BatchManifest(BaseModel):
+    """Data model for a batch of episodes rendered with the same output profiles"""
+    items: List[BatchItem] = Field(..., min_items=1)
+
+    @validator("items")
+    def run_ids_are_unique(cls, items):
+        run_ids = [item.run_id for item in items if item.run_id]
+        if len(set(run_ids)) != len(run_ids):
+            raise ValueError("run_id must be unique within a batch")
+        return items
+
+
 class AllSoundbites(BaseModel):
     """Data model for all soundbites"""
     soundbites: List[Soundbite]
@@ -39,10 +85,17 @@ class AllSoundbites(BaseModel):
     merged_video_path: Optional[str] = None
 
 
+class VideoCutResponse(AllSoundbites):
+    """Data model for the result of a video cut request (not part of the LLM output schema)"""
+    stage_timings: Optional[Dict[str, float]] = None  # seconds of wall time per pipeline stage
+    workspace_peak_bytes: Optional[int] = None  # peak disk usage of the request's intermediates
+    renditions: Optional[Dict[str, str]] = None  # output profile name -> reel path, when profiles were requested
+
+
 ### PROMPT SCHEMA ###
 
-SYSTEM_PROMPT = SystemMessagePromptTemplate.from_template(
-    """The assistant is a video clip editor, the task is to identify the 10 most meaningful soundbites based on the 
+# Plain template strings: main turns them into LangChain prompts on first use, so importing models stays cheap
+SYSTEM_PROMPT = """The assistant is a video clip editor, the task is to identify the 10 most meaningful soundbites based on the 
     context of the conversation and for each find a window of approximately 30 seconds to 60 seconds that contains that 
     soundbite and will also serve as a great clip that discusses the topic in a meaningful way that's fit for a short 
     clip. For each soundbite, you must provide the start and end times, the corresponding text, and reasoning for why 
@@ -79,8 +132,32 @@ SYSTEM_PROMPT = SystemMessagePromptTemplate.from_template(
     
     - Ensure all 10 soundbites are distinct and meaningful in the context of the conversation.
     - Use the CORRECT timestamps from the transcript below!"""
-)
 
-USER_PROMPT = HumanMessagePromptTemplate.from_template(
-    """Here is the transcript: {transcript}. """
-)
+USER_PROMPT = """Here is the transcript, one line per segment as start_time|text:
+{transcript}"""
+
+
+MAP_SYSTEM_PROMPT = """The assistant is a video clip editor. The transcript below is one excerpt of a longer conversation.
+    Identify up to {candidate_count} candidate soundbites in this excerpt that would make great 30 to 60 second 
+    clips: each one should cover one or more complete ideas, start where the speaker begins talking about the 
+    subject in an interesting way and end with some sort of concluding statement. Do not cut off mid-sentence.
+
+    For each candidate provide:
+       - Start time (hh:mm:ss.mmm) from the transcript
+       - End time (hh:mm:ss.mmm) from the transcript
+       - The soundbite text verbatim but [edited for clarity]
+       - A brief explanation of why it is meaningful.
+
+    - Only use timestamps that appear in this excerpt!"""
+
+REDUCE_SYSTEM_PROMPT = """The assistant is a video clip editor. Below are candidate soundbites that were pre-selected from different 
+    parts of a long conversation, one per line as: start|end|text|reasoning.
+
+    Rank them and select exactly {final_count} distinct soundbites (or all of them if there are fewer) that best 
+    represent the key ideas of the whole conversation and would resonate with an audience. Prefer candidates that 
+    do not repeat the same idea.
+
+    Return the selected soundbites with their start time, end time, text and reasoning exactly as given."""
+
+REDUCE_USER_PROMPT = """Here are the candidates:
+{candidates}"""
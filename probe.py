@@ -0,0 +1,276 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from asyncio import to_thread
+from collections import OrderedDict
+from contextlib import closing
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from ffmpeg_runner import run_ffprobe
+
+# ffprobe results are kept per source file in memory and in SQLite, so restarts and workers probe each source once
+MEDIA_METADATA_PATH = os.getenv("MEDIA_METADATA_PATH", "media_metadata.sqlite3")  # "" keeps them in memory only
+MEDIA_METADATA_TTL_SECONDS = int(os.getenv("MEDIA_METADATA_TTL_SECONDS", str(30 * 24 * 3600)))
+MEDIA_METADATA_MEMORY_ENTRIES = int(os.getenv("MEDIA_METADATA_MEMORY_ENTRIES", "256"))
+
+SourceKey = Tuple[str, int, float]
+
+
+def source_key(path: str) -> SourceKey:
+    """Identifies a source file by its path, size and modification time, so edited files are probed again."""
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime
+
+
+### METADATA STORE ###
+
+class MediaMetadataStore:
+    """
+    Probed facts about source files (media info, keyframe index), keyed by source_key.
+    The most recently used sources are kept in an in-process LRU in front of a SQLite table; rows of sources
+    that were not probed again for ttl_seconds are dropped.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int = MEDIA_METADATA_TTL_SECONDS,
+                 max_memory_entries: int = MEDIA_METADATA_MEMORY_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self._memory: "OrderedDict[SourceKey, Dict[str, Any]]" = OrderedDict()
+        self._lock = Lock()
+        self._initialized = False
+
+    @staticmethod
+    def _row_key(key: SourceKey) -> str:
+        return json.dumps(list(key))
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS media_metadata ("
+                "source TEXT NOT NULL, field TEXT NOT NULL, value TEXT NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (source, field))"
+            )
+            connection.commit()
+            self._initialized = True
+        return connection
+
+    def _remember(self, key: SourceKey, field: str, value: Any):
+        # caller holds self._lock
+        self._memory.setdefault(key, {})[field] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def cached(self, key: SourceKey, field: str) -> Optional[Any]:
+        """Returns a field from the in-process LRU, or None."""
+        with self._lock:
+            fields = self._memory.get(key)
+            if fields is None or field not in fields:
+                return None
+            self._memory.move_to_end(key)
+            return fields[field]
+
+    def load(self, key: SourceKey, field: str) -> Optional[Any]:
+        """Returns a field from memory or, failing that, from disk (and keeps it in memory). None when unknown."""
+        value = self.cached(key, field)
+        if value is not None or not self.path or not os.path.exists(self.path):
+            return value
+        with self._lock, closing(self._connect()) as connection:
+            row = connection.execute("SELECT value, created_at FROM media_metadata WHERE source = ? AND field = ?",
+                                     (self._row_key(key), field)).fetchone()
+            if row is None or time.time() - row[1] > self.ttl_seconds:
+                return None
+            value = json.loads(row[0])
+            self._remember(key, field, value)
+        return value
+
+    def put(self, key: SourceKey, field: str, value: Any):
+        """Stores a probed field in memory and on disk, dropping expired rows."""
+        with self._lock:
+            self._remember(key, field, value)
+            if not self.path:
+                return
+            now = time.time()
+            with closing(self._connect()) as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO media_metadata (source, field, value, created_at) VALUES (?, ?, ?, ?)",
+                    (self._row_key(key), field, json.dumps(value), now),
+                )
+                connection.execute("DELETE FROM media_metadata WHERE created_at < ?", (now - self.ttl_seconds,))
+                connection.commit()
+
+
+metadata_store = MediaMetadataStore(MEDIA_METADATA_PATH)
+
+# (source key, field) -> running probe, so concurrent callers share one ffprobe process
+_pending: Dict[Tuple[SourceKey, str], "asyncio.Task"] = {}
+_pending_lock = Lock()
+
+
+async def cached_probe(path: str, field: str, probe: Callable[[str], Awaitable[Any]]) -> Any:
+    """Returns metadata_store's `field` of path, running probe(path) only when no earlier result is known."""
+    key = source_key(path)
+    value = metadata_store.cached(key, field)
+    if value is None:
+        value = await to_thread(metadata_store.load, key, field)
+    if value is not None:
+        return value
+
+    async def probe_and_store():
+        result = await probe(path)
+        await to_thread(metadata_store.put, key, field, result)
+        return result
+
+    loop = asyncio.get_running_loop()
+    with _pending_lock:
+        task = _pending.get((key, field))
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = loop.create_task(probe_and_store())
+            _pending[(key, field)] = task
+            task.add_done_callback(lambda done: _forget_pending((key, field), done))
+    # a cancelled caller must not cancel the probe the other callers are waiting for
+    return await asyncio.shield(task)
+
+
+def _forget_pending(pending_key: Tuple[SourceKey, str], task: "asyncio.Task"):
+    with _pending_lock:
+        if _pending.get(pending_key) is task:
+            del _pending[pending_key]
+
+
+### KEYFRAME INDEX ###
+
+def parse_keyframe_packets(output: str) -> List[float]:
+    """Parses `ffprobe -show_entries packet=pts_time,flags -of csv=p=0` output into sorted keyframe times."""
+    keyframes = []
+    for line in output.splitlines():
+        fields = line.strip().split(",")
+        if len(fields) < 2 or "K" not in fields[1]:
+            continue
+        try:
+            keyframes.append(float(fields[0]))
+        except ValueError:
+            continue  # packets without a timestamp report "N/A"
+    return sorted(keyframes)
+
+
+async def scan_keyframes(path: str) -> List[float]:
+    logger.info(f"Probing keyframe index of {path}")
+    output = await run_ffprobe(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=pts_time,flags",
+         "-of", "csv=p=0", path],
+        stage="probe_keyframes",
+    )
+    keyframes = parse_keyframe_packets(output)
+    logger.info(f"Found {len(keyframes)} keyframes in {path}")
+    return keyframes
+
+
+async def probe_keyframes(path: str) -> List[float]:
+    """
+    Returns the keyframe timestamps (seconds) of the first video stream.
+    Only packet headers are read (nothing is decoded) and the result is cached per source file.
+    """
+    return await cached_probe(path, "keyframes", scan_keyframes)
+
+
+### MEDIA INFO ###
+
+def parse_frame_rate(rate: Optional[str]) -> Optional[float]:
+    """Parses an ffprobe frame rate such as "30000/1001"; "0/0" and missing rates give None."""
+    try:
+        numerator, _, denominator = (rate or "").partition("/")
+        fps = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return round(fps, 3) if fps > 0 else None
+
+
+def parse_media_info(output: str) -> Dict:
+    """Parses `ffprobe -show_format -show_streams -of json` output into the duration and main stream details."""
+    probed = json.loads(output or "{}")
+    streams = probed.get("streams", [])
+    video = next((stream for stream in streams if stream.get("codec_type") == "video"), None)
+    duration = probed.get("format", {}).get("duration")
+    return {
+        "duration": float(duration) if duration not in (None, "N/A") else None,
+        "video_codec": video.get("codec_name") if video else None,
+        "width": video.get("width") if video else None,
+        "height": video.get("height") if video else None,
+        "fps": parse_frame_rate(video.get("avg_frame_rate")) if video else None,
+        "has_audio": any(stream.get("codec_type") == "audio" for stream in streams),
+    }
+
+
+async def probe_media_info(path: str) -> Dict:
+    """
+    Returns the duration, video codec, frame size, frame rate and audio presence of a media file.
+    Not cached: uploads are probed while they are still being written.
+    """
+    output = await run_ffprobe(
+        ["ffprobe", "-v", "error", "-show_entries",
+         "format=duration:stream=codec_type,codec_name,width,height,avg_frame_rate", "-of", "json", path],
+        stage="probe_media",
+    )
+    return parse_media_info(output)
+
+
+async def probe_metadata(path: str) -> Dict:
+    """probe_media_info of a complete source file, probed once per source and cached."""
+    return await cached_probe(path, "media_info", probe_media_info)
+
+
+# ffprobe H.264 profile names -> libx264 -profile:v values
+X264_PROFILES = {"constrained baseline": "baseline", "baseline": "baseline", "main": "main", "high": "high",
+                 "high 10": "high10", "high 4:2:2": "high422", "high 4:4:4 predictive": "high444"}
+
+
+def parse_encoding_params(output: str) -> Dict:
+    """
+    Parses `ffprobe -show_entries stream=codec_type,codec_name,profile,level,pix_fmt,time_base -of json` output into
+    what an encoder needs to produce frames that can be stitched to stream-copied ones of the first video stream.
+    """
+    streams = json.loads(output or "{}").get("streams", [])
+    video = next((stream for stream in streams if stream.get("codec_type") == "video"), {})
+    level = video.get("level")
+    numerator, _, denominator = (video.get("time_base") or "").partition("/")
+    return {
+        "video_codec": video.get("codec_name"),
+        "profile": X264_PROFILES.get((video.get("profile") or "").lower()),
+        # ffprobe reports H.264 levels times ten (40 = 4.0); -99 and 0 mean unknown
+        "level": f"{level / 10:.1f}" if isinstance(level, int) and level > 0 else None,
+        "pix_fmt": video.get("pix_fmt"),
+        "timescale": int(denominator) if numerator == "1" and denominator.isdigit() else None,
+    }
+
+
+async def scan_encoding_params(path: str) -> Dict:
+    output = await run_ffprobe(
+        ["ffprobe", "-v", "error", "-show_entries", "stream=codec_type,codec_name,profile,level,pix_fmt,time_base",
+         "-of", "json", path],
+        stage="probe_encoding",
+    )
+    return parse_encoding_params(output)
+
+
+async def probe_encoding_params(path: str) -> Dict:
+    """
+    Returns the codec, profile, level, pixel format and timescale of the first video stream, probed once per source
+    and cached.
+    """
+    return await cached_probe(path, "encoding", scan_encoding_params)
+
+
+async def probe_video_codec(path: str) -> str:
+    """Returns the codec name of the first video stream."""
+    codec = (await probe_metadata(path))["video_codec"]
+    if codec is None:
+        raise ValueError(f"No video stream found in {path}")
+    return codec
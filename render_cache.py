@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from loguru import logger
+
+from probe import source_key
+
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", ".render_cache")
+# 0 disables the cache
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(20 * 1024 ** 3)))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# source files whose hash is remembered (least recently used are forgotten)
+FILE_HASH_MEMORY_ENTRIES = 256
+
+
+### CONTENT HASHING ###
+
+# (absolute path, size, mtime) -> sha256 hex digest
+_file_hashes: "OrderedDict[Tuple[str, int, float], str]" = OrderedDict()
+_file_hash_lock = Lock()
+
+
+def file_hash(path: str) -> str:
+    """Returns the sha256 of a file, memoized per (path, size, mtime) so large sources are hashed once."""
+    key = source_key(path)
+    with _file_hash_lock:
+        if key in _file_hashes:
+            _file_hashes.move_to_end(key)
+            return _file_hashes[key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    _remember(key, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def remember_file_hash(path: str, digest: str):
+    """Records a hash computed elsewhere (e.g. while the file was uploaded) so it is not hashed again."""
+    _remember(source_key(path), digest)
+
+
+def _remember(key: Tuple[str, int, float], digest: str):
+    with _file_hash_lock:
+        _file_hashes[key] = digest
+        _file_hashes.move_to_end(key)
+        while len(_file_hashes) > FILE_HASH_MEMORY_ENTRIES:
+            _file_hashes.popitem(last=False)
+
+
+def text_hash(text: str) -> str:
+    """Returns the sha256 of a string."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+### RENDER CACHE ###
+
+class RenderCache:
+    """
+    Content-addressed store for rendered artifacts (cuts, rendered segments, merged reels) on local disk.
+    Entries are keyed by a hash of everything that determines the output and evicted least-recently-used
+    first once the cache grows past max_bytes.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(**parts) -> str:
+        """Builds a cache key from the parts that determine an artifact (hashes, timestamps, settings)."""
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached artifact path for key, or None on a miss. A hit marks the entry as recently used."""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        with self._lock:
+            if not os.path.exists(path):
+                return None
+            os.utime(path)
+        return path
+
+    def materialize(self, key: str, destination: str) -> bool:
+        """Copies the cached artifact for key to destination. Returns False on a miss."""
+        cached_path = self.get(key)
+        if cached_path is None:
+            return False
+        try:
+            shutil.copyfile(cached_path, destination)
+        except FileNotFoundError:
+            return False  # evicted between the lookup and the copy
+        logger.info(f"Render cache hit {key[:12]} -> {destination}")
+        return True
+
+    def put(self, key: str, source_path: str):
+        """Stores a copy of source_path under key, then evicts old entries if the cache is over budget."""
+        if not self.enabled:
+            return
+        if not os.path.exists(source_path):
+            logger.warning(f"Not caching missing artifact: {source_path}")
+            return
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # copy next to the final path first so readers never see a partial file
+        temp_path = f"{path}.{uuid4()}.tmp"
+        shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, path)
+        logger.info(f"Render cache stored {key[:12]} from {source_path}")
+        self.evict()
+
+    def entries(self) -> List[Dict]:
+        """Lists cached artifacts, least recently used first."""
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                stat = os.stat(os.path.join(directory, filename))
+                entries.append({"key": filename, "size_bytes": stat.st_size, "last_used": stat.st_mtime})
+        return sorted(entries, key=lambda entry: entry["last_used"])
+
+    def stats(self) -> Dict:
+        """Returns the number of entries and the bytes used against the budget."""
+        entries = self.entries()
+        return {
+            "root": self.root,
+            "entries": len(entries),
+            "total_bytes": sum(entry["size_bytes"] for entry in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+    def evict(self) -> int:
+        """Removes least recently used entries until the cache fits max_bytes. Returns the number removed."""
+        with self._lock:
+            entries = self.entries()
+            total_bytes = sum(entry["size_bytes"] for entry in entries)
+            removed = 0
+            for entry in entries:
+                if total_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self._path(entry["key"]))
+                except FileNotFoundError:
+                    pass
+                total_bytes -= entry["size_bytes"]
+                removed += 1
+        if removed:
+            logger.info(f"Render cache evicted {removed} entries")
+        return removed
+
+    def purge(self, key: Optional[str] = None) -> int:
+        """Removes one entry, or every entry when no key is given. Returns the number removed."""
+        if key and not re.fullmatch(r"[0-9a-f]{64}", key):
+            return 0
+        with self._lock:
+            keys = [key] if key else [entry["key"] for entry in self.entries()]
+            removed = 0
+            for entry_key in keys:
+                try:
+                    os.remove(self._path(entry_key))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        logger.info(f"Render cache purged {removed} entries")
+        return removed
+
+
+render_cache = RenderCache(RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES)
@@ -0,0 +1,70 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from threading import Lock
+from typing import List, Optional, Tuple
+from uuid import uuid4
+
+from loguru import logger
+
+from models import Soundbite, VideoTranscript
+
+SELECTION_DB_PATH = os.getenv("SELECTION_DB_PATH", "selections.sqlite3")
+SELECTION_TTL_SECONDS = int(os.getenv("SELECTION_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+class SelectionStore:
+    """
+    Soundbite selections of preview renders, kept in SQLite so a later finalize call renders exactly the
+    reviewed soundbites at full quality without asking the LLM again. Selections expire after ttl_seconds.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int = SELECTION_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS selections ("
+                "id TEXT PRIMARY KEY, video_path TEXT NOT NULL, transcript TEXT NOT NULL, soundbites TEXT NOT NULL, "
+                "created_at REAL NOT NULL)"
+            )
+            connection.commit()
+            self._initialized = True
+        return connection
+
+    def save(self, video_path: str, transcript: VideoTranscript, soundbites: List[Soundbite]) -> str:
+        """Stores a selection and returns its id, dropping expired selections."""
+        selection_id = uuid4().hex
+        now = time.time()
+        with self._lock, closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT INTO selections (id, video_path, transcript, soundbites, created_at) VALUES (?, ?, ?, ?, ?)",
+                (selection_id, video_path, transcript.json(),
+                 json.dumps([soundbite.dict(exclude={"file_path"}) for soundbite in soundbites]), now),
+            )
+            connection.execute("DELETE FROM selections WHERE created_at < ?", (now - self.ttl_seconds,))
+            connection.commit()
+        logger.info(f"Saved selection {selection_id} of {len(soundbites)} soundbites")
+        return selection_id
+
+    def load(self, selection_id: str) -> Optional[Tuple[str, VideoTranscript, List[Soundbite]]]:
+        """Returns (video path, transcript, soundbites) of a selection, or None when missing or expired."""
+        with self._lock, closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT video_path, transcript, soundbites, created_at FROM selections WHERE id = ?", (selection_id,)
+            ).fetchone()
+        if row is None or time.time() - row[3] > self.ttl_seconds:
+            return None
+        video_path, transcript, soundbites, _ = row
+        return video_path, VideoTranscript.parse_raw(transcript), [Soundbite.parse_obj(item)
+                                                                   for item in json.loads(soundbites)]
+
+
+selection_store = SelectionStore(SELECTION_DB_PATH)
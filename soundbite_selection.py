@@ -0,0 +1,133 @@
+import asyncio
+from typing import Any, Callable, List, Optional
+
+from loguru import logger
+
+from models import AllSoundbites, Soundbite, VideoTranscript
+from subtitles import time_to_milliseconds
+from transcript_format import encode_transcript_compact
+
+
+### TRANSCRIPT CHUNKING ###
+
+def transcript_span_seconds(transcript: VideoTranscript) -> float:
+    """Returns the start time of the last transcript segment, in seconds."""
+    if not transcript.segments:
+        return 0.0
+    return time_to_milliseconds(transcript.segments[-1].start_time) / 1000
+
+
+def split_transcript(transcript: VideoTranscript, window_seconds: float,
+                     overlap_seconds: float) -> List[VideoTranscript]:
+    """
+    Splits the transcript into time windows of window_seconds that overlap by overlap_seconds,
+    so an idea that straddles a window boundary is fully contained in at least one chunk.
+    """
+    if overlap_seconds >= window_seconds:
+        raise ValueError("The overlap must be shorter than the window.")
+
+    starts_ms = [time_to_milliseconds(segment.start_time) for segment in transcript.segments]
+    window_ms = int(window_seconds * 1000)
+    step_ms = int((window_seconds - overlap_seconds) * 1000)
+
+    chunks = []
+    window_start = starts_ms[0] if starts_ms else 0
+    last_start = starts_ms[-1] if starts_ms else 0
+    while True:
+        window_end = window_start + window_ms
+        segments = [
+            segment for segment, start_ms in zip(transcript.segments, starts_ms)
+            if window_start <= start_ms < window_end
+        ]
+        if segments:
+            chunks.append(VideoTranscript(segments=segments))
+        if window_end > last_start:
+            break
+        window_start += step_ms
+    return chunks
+
+
+### MAP-REDUCE SELECTION ###
+
+async def invoke_with_retries(chain: Any, inputs: dict, max_retries: int, backoff_seconds: float = 2.0,
+                              rate_limiter: Optional[Any] = None) -> Any:
+    """
+    Invokes the chain, retrying failures with exponential backoff. Every attempt first waits for the rate
+    limiter (batch.RateLimiter), so the limit counts LLM requests rather than selections.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            if rate_limiter:
+                await rate_limiter.wait()
+            return await chain.ainvoke(inputs)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_seconds * 2 ** attempt
+            logger.warning(f"LLM call failed ({str(e)}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+def overlap_ratio(first: Soundbite, second: Soundbite) -> float:
+    """Fraction of the shorter soundbite covered by the other one."""
+    first_start, first_end = time_to_milliseconds(first.start_time), time_to_milliseconds(first.end_time)
+    second_start, second_end = time_to_milliseconds(second.start_time), time_to_milliseconds(second.end_time)
+    shortest = min(first_end - first_start, second_end - second_start)
+    if shortest <= 0:
+        return 0.0
+    return max(0, min(first_end, second_end) - max(first_start, second_start)) / shortest
+
+
+def dedupe_candidates(candidates: List[Soundbite], max_overlap: float = 0.5) -> List[Soundbite]:
+    """
+    Sorts candidates by start time and drops the ones mostly covered by an earlier candidate
+    (overlapping chunks often propose the same soundbite twice).
+    """
+    kept = []
+    for candidate in sorted(candidates, key=lambda soundbite: time_to_milliseconds(soundbite.start_time)):
+        if all(overlap_ratio(candidate, other) <= max_overlap for other in kept):
+            kept.append(candidate)
+    return kept
+
+
+def format_candidates(candidates: List[Soundbite]) -> str:
+    """One candidate per line as start|end|text|reasoning, which is all the reduce step needs."""
+    return "\n".join(
+        f"{candidate.start_time}|{candidate.end_time}|{candidate.text}|{candidate.reasoning or ''}"
+        for candidate in candidates
+    )
+
+
+async def select_soundbites_map_reduce(transcript: VideoTranscript, map_chain: Any, reduce_chain: Any,
+                                       window_seconds: float, overlap_seconds: float, concurrency: int,
+                                       max_retries: int = 3, backoff_seconds: float = 2.0,
+                                       candidates_per_chunk: int = 5, final_count: int = 10,
+                                       transcript_encoder: Callable[[VideoTranscript], str] = encode_transcript_compact,
+                                       rate_limiter: Optional[Any] = None) -> AllSoundbites:
+    """
+    Selects soundbites from a long transcript: candidates are requested for every overlapping chunk
+    concurrently (map), then a single small call ranks the deduplicated candidates and picks the final ones (reduce).
+    """
+    chunks = split_transcript(transcript, window_seconds, overlap_seconds)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    logger.info(f"Selecting soundbites from {len(chunks)} transcript chunks")
+
+    async def map_chunk(chunk: VideoTranscript) -> List[Soundbite]:
+        async with semaphore:
+            response = await invoke_with_retries(
+                map_chain, {"transcript": transcript_encoder(chunk), "candidate_count": candidates_per_chunk},
+                max_retries, backoff_seconds, rate_limiter,
+            )
+        return list(response.soundbites)
+
+    chunk_candidates = await asyncio.gather(*(map_chunk(chunk) for chunk in chunks))
+    candidates = dedupe_candidates([candidate for batch in chunk_candidates for candidate in batch])
+    logger.info(f"Map step produced {len(candidates)} distinct candidates")
+
+    if len(candidates) <= final_count:
+        return AllSoundbites(soundbites=candidates)
+
+    return await invoke_with_retries(
+        reduce_chain, {"candidates": format_candidates(candidates), "final_count": final_count},
+        max_retries, backoff_seconds, rate_limiter,
+    )
@@ -1,14 +1,14 @@
-import re
-import subprocess
-from typing import List
-import os
+from typing import List, Optional, Tuple, Union
 from loguru import logger
 import textwrap
 
-from main import Soundbite
-from models import GV_WATERMARK, MERGED_VIDEO_WITH_ST, MERGED_VIDEO_WITH_WATERMARK, TranscriptSegment
-
-logger.info(os.path.exists("uploads/sample.mp4"))
+from ass_script import ASS_MARGIN_V, AssScriptBuilder, ass_builder, milliseconds_to_ass_time, \
+    proportional_word_timings, write_ass_file
+from ffmpeg_runner import FFmpegError, run_ffmpeg
+from models import GV_WATERMARK, MERGED_VIDEO_WITH_ST, MERGED_VIDEO_WITH_WATERMARK, OutputProfile, Soundbite, \
+    TranscriptSegment
+from transcript_index import TranscriptIndex, parse_timestamp_ms
+from transcript_ingest import iter_transcript_segments
 
 
 def wrap_text(text: str, width: int = 60) -> List[str]:
@@ -25,155 +25,388 @@ def parse_transcript(transcript_path: str) -> List[TranscriptSegment]:
     """
     Parses the full transcript and returns a list of segments with start times and text.
     """
-    transcript_segments = []
     with open(transcript_path, "r") as file:
-        lines = file.readlines()
-        for line in lines:
-            match = re.match(r"(\d{2}:\d{2}:\d{2}\.\d{3}) (.+)", line.strip())
-            if match:
-                start_time = match.group(1)
-                text = match.group(2)
-                transcript_segments.append(TranscriptSegment(start_time=start_time, text=text))
-    return transcript_segments
+        return list(iter_transcript_segments(file))
 
 
-def match_soundbite_with_transcript(soundbite: Soundbite, transcript_segments: List[TranscriptSegment]) -> str:
+def match_soundbite_with_transcript(soundbite: Soundbite,
+                                    transcript: Union[TranscriptIndex, List[TranscriptSegment]]) -> str:
     """
     Match the soundbite timestamps with the corresponding transcript text.
+    Pass a TranscriptIndex built once per transcript; a plain segment list is indexed on every call.
     """
-    relevant_text = ""
-    for segment in transcript_segments:
-        if soundbite.start_time <= segment.start_time <= soundbite.end_time:
-            relevant_text += segment.text + " "
-    return relevant_text.strip()
+    if not isinstance(transcript, TranscriptIndex):
+        transcript = TranscriptIndex.from_segments(transcript)
+    return transcript.text_between(time_to_milliseconds(soundbite.start_time),
+                                   time_to_milliseconds(soundbite.end_time))
 
 
-def time_to_milliseconds(time_str: str):
-    """Convert 'hh:mm:ss.sss' to total milliseconds."""
-    hours, minutes, seconds = map(float, time_str.split(':'))
-    return int(hours * 3600000 + minutes * 60000 + seconds * 1000)
+def time_to_milliseconds(time_str: str) -> int:
+    """Convert 'hh:mm:ss.sss' (milliseconds optional) to total milliseconds."""
+    return parse_timestamp_ms(time_str)
 
 
 def create_ass_file_for_segment(soundbite: Soundbite, transcript_text: str, ass_file_path: str, segment_start_time: str, margin_v: int = 50):
     """
-    Creates an .ass file for the video segment with line-by-line karaoke-style subtitles using {\\k}.
-    The start and end times of the subtitles are offset to match the start of the video segment.
-    The karaoke effect applies to the entire line instead of word-by-word, with the specified color settings.
+    Creates an .ass file for the video segment with karaoke-style subtitles using {\\k}.
+    Without word timings from the transcript, the words are spread over the soundbite in proportion to their
+    length; times are offset to match the start of the video segment.
     """
-    segment_start_ms = time_to_milliseconds(segment_start_time)
     soundbite_start_ms = time_to_milliseconds(soundbite.start_time)
     soundbite_end_ms = time_to_milliseconds(soundbite.end_time)
+    builder = ass_builder if margin_v == ASS_MARGIN_V else AssScriptBuilder(margin_v=margin_v)
+    words = proportional_word_timings(transcript_text, soundbite_start_ms, soundbite_end_ms)
+    write_ass_file(ass_file_path, builder.render(words, time_to_milliseconds(segment_start_time)))
+
+
+# def format_time(time_str: str) -> str:
+#     """
+#     Convert time in 'hh:mm:ss.sss' format to ASS-compatible 'h:mm:ss.cs' format.
+#     """
+#     match = re.match(r"(\d+):(\d+):(\d+)\.(\d+)", time_str)
+#     if not match:
+#         return time_str  # Return original if format is incorrect
+#
+#     hours, minutes, seconds, milliseconds = match.groups()
+#     centiseconds = round(int(milliseconds) / 10)
+#
+#     # Return formatted time without leading zeros for hours
+#     return f"{int(hours)}:{minutes}:{seconds}.{centiseconds:02d}"
 
-    # Calculate the total duration of the soundbite in milliseconds
-    total_duration_ms = soundbite_end_ms - soundbite_start_ms
 
-    # Wrap the transcript into lines (you can adjust the width for line breaks)
-    lines = wrap_text(transcript_text, width=60)
+WATERMARK_POSITION = "W-w-100:H-h-700"
+VIDEO_CODEC = "libx264"
+# A single decode of the source runs from 0 to the end of the last window; below this share of soundbite time in
+# that span (e.g. a preview of a long episode), per-window seeked inputs decode less
+REEL_SINGLE_DECODE_MIN_COVERAGE = 0.5
 
-    with open(ass_file_path, "w") as ass_file:
-        ass_file.write("[Script Info]\n")
-        ass_file.write(f"Title: Soundbite Subtitle\n")
-        ass_file.write("ScriptType: v4.00+\nPlayDepth: 0\n")
-        ass_file.write("\n[V4+ Styles]\n")
-        ass_file.write("Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
-                       "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, "
-                       "Shadow, Alignment, MarginL, MarginR, MarginV, Encoding\n")
-        ass_file.write(
-            f"Style: Default,Red Hat Display,24,&H00FFFFFF,&H00602DE9,&H00602DE9,&H00000000,0,0,0,0,100,100,0,"
-            f"0,1,1.5,0,2,10,10,{margin_v},1\n")  # Default style with requested color settings
 
-        ass_file.write("\n[Events]\n")
-        ass_file.write("Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n")
+def escape_filter_path(path: str) -> str:
+    """Escapes a file path so it can be used as a quoted option value inside an FFmpeg filter graph."""
+    return path.replace("\\", "/").replace("'", r"'\''").replace(":", r"\:")
 
-        # Ensure the last line covers the entire duration of the soundbite
-        remaining_duration_ms = total_duration_ms  # Initialize remaining duration for each line
 
-        # Generate karaoke subtitles with dynamic timing for each line
-        for i, line in enumerate(lines):
-            words = line.split()
-            total_chars = sum(len(word) for word in words)  # Calculate total characters in the line
+def fit_filter(profile: OutputProfile) -> str:
+    """Scales the video into the profile's frame, cropping the overflow or padding (letterboxing) the rest."""
+    size = f"{profile.width}:{profile.height}"
+    if profile.fit == "pad":
+        return f"scale={size}:force_original_aspect_ratio=decrease,pad={size}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+    return f"scale={size}:force_original_aspect_ratio=increase,crop={size},setsar=1"
 
-            # Calculate the duration per character
-            duration_per_char = (total_duration_ms / total_chars) * 0.4 if total_chars > 0 else 0
 
-            karaoke_text = ""
-            for word in words:
-                word_duration_ms = len(word) * duration_per_char  # Word duration based on character count
-                word_duration_cs = int(word_duration_ms / 10)  # Convert to centiseconds
-                karaoke_text += f"{{\\k{word_duration_cs}}}{word} "
+def subtitle_filter(ass_file_path: str, profile: Optional[OutputProfile] = None) -> str:
+    """Burns an .ass file, with the profile's subtitle margin when it overrides the style's."""
+    if profile is not None and profile.subtitle_margin_v is not None:
+        return f"subtitles='{escape_filter_path(ass_file_path)}':force_style='MarginV={profile.subtitle_margin_v}'"
+    return f"ass='{escape_filter_path(ass_file_path)}'"
 
-            # Format the start and end times
-            formatted_start_time = milliseconds_to_ass_time(soundbite_start_ms - segment_start_ms)
-            soundbite_start_ms += int(len(line) * duration_per_char)  # Adjust time for the next line
-            formatted_end_time = milliseconds_to_ass_time(soundbite_start_ms - segment_start_ms)
 
-            # Subtract the used time from the remaining duration
-            remaining_duration_ms -= (len(line) * duration_per_char)
+def rendition_output_options(profile: OutputProfile) -> List[str]:
+    """Encoder options of one rendition."""
+    options = ["-c:v", VIDEO_CODEC]
+    if profile.preset:
+        options += ["-preset", profile.preset]
+    if profile.video_bitrate:
+        options += ["-b:v", profile.video_bitrate, "-maxrate", profile.video_bitrate,
+                    "-bufsize", profile.video_bitrate]
+    return options + ["-c:a", "aac", "-b:a", profile.audio_bitrate]
 
-            # Write the dialogue line with karaoke effect
-            dialogue = f"Dialogue: 0,{formatted_start_time},{formatted_end_time},Default,,0,0,0,,{karaoke_text.strip()}\n"
-            ass_file.write(dialogue)
 
-        # Ensure the last subtitle covers the full duration
-        if remaining_duration_ms > 0:
-            formatted_end_time = milliseconds_to_ass_time(soundbite_end_ms - segment_start_ms)
-            dialogue = f"Dialogue: 0,{formatted_end_time},{formatted_end_time},Default,,0,0,{margin_v},, \n"
-            ass_file.write(dialogue)
+def split_filter(label: str, count: int, prefix: str, audio: bool = False) -> Tuple[List[str], List[str]]:
+    """Returns ([split filter], output labels) to fan one stream out to count branches (no filter for one)."""
+    if count == 1:
+        return [], [label]
+    labels = [f"[{prefix}{i}]" for i in range(count)]
+    return [f"{label}{'asplit' if audio else 'split'}={count}{''.join(labels)}"], labels
 
 
-def milliseconds_to_ass_time(ms: int) -> str:
+def build_render_command(video_segment_path: str, output_path: str, ass_file_path: Optional[str] = None,
+                         watermark_path: Optional[str] = None,
+                         watermark_position: str = WATERMARK_POSITION) -> List[str]:
+    """
+    Builds a single FFmpeg command that burns the subtitles and overlays the watermark in one filter graph,
+    so the segment is decoded and encoded exactly once.
+    """
+    if not ass_file_path and not watermark_path:
+        raise ValueError("Nothing to render: provide subtitles, a watermark, or both.")
+
+    command = ["ffmpeg", "-y", "-fflags", "+genpts", "-i", video_segment_path]
+    if watermark_path:
+        command += ["-i", watermark_path]
+
+    filters = []
+    video_label = "[0:v]"
+    if ass_file_path:
+        filters.append(f"{video_label}{subtitle_filter(ass_file_path)}[sub]")
+        video_label = "[sub]"
+    if watermark_path:
+        filters.append(f"{video_label}[1:v]overlay={watermark_position}[wm]")
+        video_label = "[wm]"
+
+    command += [
+        "-filter_complex", ";".join(filters),
+        "-map", video_label, "-map", "0:a?",
+        "-c:v", VIDEO_CODEC, "-c:a", "copy",
+        output_path,
+    ]
+    return command
+
+
+def build_renditions_command(video_segment_path: str, renditions: List[Tuple[OutputProfile, str]],
+                             ass_file_path: Optional[str] = None, watermark_path: Optional[str] = None) -> List[str]:
     """
-    Convert milliseconds to ASS time format: h:mm:ss.cs
+    Builds one FFmpeg command that renders every (profile, output path) rendition of a segment from a single
+    decode: the video is split, then each branch is scaled/cropped, subtitled and watermarked for its profile.
     """
-    hours = ms // 3600000
-    minutes = (ms % 3600000) // 60000
-    seconds = (ms % 60000) // 1000
-    centiseconds = (ms % 1000) // 10
+    if not renditions:
+        raise ValueError("No output profiles provided.")
+
+    command = ["ffmpeg", "-y", "-fflags", "+genpts", "-i", video_segment_path]
+    filters, sources = split_filter("[0:v]", len(renditions), "src_v")
+    if watermark_path:
+        command += ["-i", watermark_path]
+        watermark_filters, watermarks = split_filter("[1:v]", len(renditions), "wm_in")
+        filters += watermark_filters
+
+    outputs = []
+    for i, (profile, output_path) in enumerate(renditions):
+        chain = [fit_filter(profile)]
+        if ass_file_path:
+            chain.append(subtitle_filter(ass_file_path, profile))
+        filters.append(f"{sources[i]}{','.join(chain)}[fit{i}]")
+        video_label = f"[fit{i}]"
+        if watermark_path:
+            filters.append(f"{video_label}{watermarks[i]}overlay={profile.watermark_position or WATERMARK_POSITION}"
+                           f"[out{i}]")
+            video_label = f"[out{i}]"
+        outputs += ["-map", video_label, "-map", "0:a?"] + rendition_output_options(profile) + [output_path]
+
+    return command + ["-filter_complex", ";".join(filters)] + outputs
+
+
+async def render_segment(video_segment_path: str, output_path: str, ass_file_path: Optional[str] = None,
+                         watermark_path: Optional[str] = None, watermark_position: str = WATERMARK_POSITION,
+                         segment: Optional[str] = None) -> str:
+    """
+    Burns .ass subtitles and/or a PNG watermark into the video segment in one FFmpeg pass.
+    Progress is published under the "render" stage for the given segment label.
+    """
+    command = build_render_command(video_segment_path, output_path, ass_file_path, watermark_path,
+                                   watermark_position)
 
-    return f"{hours}:{minutes:02}:{seconds:02}.{centiseconds:02}"
+    try:
+        await run_ffmpeg(command, "render", segment)
+    except FFmpegError as e:
+        logger.error(f"Error rendering segment {video_segment_path}: {str(e)}")
+        raise
 
+    logger.info(f"Segment rendered successfully to {output_path}")
+    return output_path
 
-# def format_time(time_str: str) -> str:
-#     """
-#     Convert time in 'hh:mm:ss.sss' format to ASS-compatible 'h:mm:ss.cs' format.
-#     """
-#     match = re.match(r"(\d+):(\d+):(\d+)\.(\d+)", time_str)
-#     if not match:
-#         return time_str  # Return original if format is incorrect
-#
-#     hours, minutes, seconds, milliseconds = match.groups()
-#     centiseconds = round(int(milliseconds) / 10)
-#
-#     # Return formatted time without leading zeros for hours
-#     return f"{int(hours)}:{minutes}:{seconds}.{centiseconds:02d}"
 
+async def render_segment_renditions(video_segment_path: str, renditions: List[Tuple[OutputProfile, str]],
+                                    ass_file_path: Optional[str] = None, watermark_path: Optional[str] = None,
+                                    segment: Optional[str] = None) -> List[str]:
+    """Renders every (profile, output path) rendition of the segment with one FFmpeg process (one decode)."""
+    command = build_renditions_command(video_segment_path, renditions, ass_file_path, watermark_path)
 
-def add_subtitles_to_segment(video_segment_path: str, ass_file_path: str, output_path: str):
+    try:
+        await run_ffmpeg(command, "render", segment)
+    except FFmpegError as e:
+        logger.error(f"Error rendering renditions of {video_segment_path}: {str(e)}")
+        raise
+
+    logger.info(f"Segment rendered to {len(renditions)} renditions: {', '.join(p.name for p, _ in renditions)}")
+    return [output_path for _, output_path in renditions]
+
+
+def is_chronological(windows: List[Tuple[float, float]]) -> bool:
+    """Returns True if the (start, end) windows are sorted and do not overlap."""
+    return all(previous[1] <= current[0] for previous, current in zip(windows, windows[1:]))
+
+
+def is_dense(windows: List[Tuple[float, float]]) -> bool:
+    """Returns True if the windows cover enough of the source up to their end to be trimmed from a single decode."""
+    span = max(end for _, end in windows)
+    return span <= 0 or sum(end - start for start, end in windows) / span >= REEL_SINGLE_DECODE_MIN_COVERAGE
+
+
+def silent_audio_filter(start: float, end: float, label: str) -> str:
+    """Filter that generates silence as long as the window, for sources without an audio stream."""
+    return f"anullsrc=r=48000:cl=stereo,atrim=duration={end - start:.3f}{label}"
+
+
+def build_reel_sources(video_path: str, windows: List[Tuple[float, float]],
+                       has_audio: bool = True) -> Tuple[List[str], List[str], int]:
     """
-    Adds the .ass subtitles to the video segment using the FFmpeg command with the 'fflags +genpts' option.
+    Returns the inputs and filters that cut every (start, end) window in seconds out of the source into
+    [trim_v{i}]/[a{i}], and the input index that comes next (for the watermark).
+
+    Chronological, non-overlapping windows that cover most of the source up to their end are cut with trim/atrim
+    from a single decode of the source. Otherwise each window gets its own seeked input, so the filter graph never
+    has to buffer frames for a later clip and sparse windows do not decode everything between them.
+    Sources without audio get silence, so the clips can still be concatenated with an audio track.
+    """
+    command = ["ffmpeg", "-y"]
+    filters = []
+
+    if is_chronological(windows) and is_dense(windows):
+        command += ["-i", video_path]
+        count = len(windows)
+        video_filters, video_sources = split_filter("[0:v]", count, "src_v")
+        filters += video_filters
+        if has_audio:
+            audio_filters, audio_sources = split_filter("[0:a]", count, "src_a", audio=True)
+            filters += audio_filters
+        for i, (start, end) in enumerate(windows):
+            filters.append(f"{video_sources[i]}trim=start={start:.3f}:end={end:.3f},setpts=PTS-STARTPTS[trim_v{i}]")
+            filters.append(f"{audio_sources[i]}atrim=start={start:.3f}:end={end:.3f},asetpts=PTS-STARTPTS[a{i}]"
+                           if has_audio else silent_audio_filter(start, end, f"[a{i}]"))
+        return command, filters, 1
+
+    for start, end in windows:
+        command += ["-ss", f"{start:.3f}", "-to", f"{end:.3f}", "-i", video_path]
+    for i, (start, end) in enumerate(windows):
+        filters.append(f"[{i}:v]setpts=PTS-STARTPTS[trim_v{i}]")
+        filters.append(f"[{i}:a]asetpts=PTS-STARTPTS[a{i}]" if has_audio
+                       else silent_audio_filter(start, end, f"[a{i}]"))
+    return command, filters, len(windows)
+
+
+def check_reel_windows(windows: List[Tuple[float, float]], ass_file_paths: List[Optional[str]]):
+    if not windows:
+        raise ValueError("No soundbites provided for the highlight reel.")
+    if len(windows) != len(ass_file_paths):
+        raise ValueError("Every soundbite window needs a subtitle entry (use None for no subtitles).")
+
+
+def build_reel_command(video_path: str, windows: List[Tuple[float, float]], ass_file_paths: List[Optional[str]],
+                       output_path: str, watermark_path: Optional[str] = None,
+                       watermark_position: str = WATERMARK_POSITION, has_audio: bool = True) -> List[str]:
+    """
+    Builds one FFmpeg command that trims every (start, end) window in seconds out of the source, burns each window's
+    subtitles, concatenates the clips in the given order and overlays the watermark, all inside one filter graph.
+    """
+    check_reel_windows(windows, ass_file_paths)
+    command, filters, watermark_input = build_reel_sources(video_path, windows, has_audio)
+
+    for i, ass_file_path in enumerate(ass_file_paths):
+        if ass_file_path:
+            filters.append(f"[trim_v{i}]{subtitle_filter(ass_file_path)}[v{i}]")
+        else:
+            filters.append(f"[trim_v{i}]null[v{i}]")
+
+    concat_inputs = "".join(f"[v{i}][a{i}]" for i in range(len(windows)))
+    filters.append(f"{concat_inputs}concat=n={len(windows)}:v=1:a=1[reel_v][reel_a]")
+
+    video_label = "[reel_v]"
+    if watermark_path:
+        command += ["-i", watermark_path]
+        filters.append(f"[reel_v][{watermark_input}:v]overlay={watermark_position}[wm]")
+        video_label = "[wm]"
+
+    command += [
+        "-filter_complex", ";".join(filters),
+        "-map", video_label, "-map", "[reel_a]",
+        "-c:v", VIDEO_CODEC, "-c:a", "aac",
+        output_path,
+    ]
+    return command
+
+
+def build_reel_renditions_command(video_path: str, windows: List[Tuple[float, float]],
+                                  ass_file_paths: List[Optional[str]], renditions: List[Tuple[OutputProfile, str]],
+                                  watermark_path: Optional[str] = None, has_audio: bool = True) -> List[str]:
+    """
+    Like build_reel_command, but renders every (profile, output path) rendition from the same decode: each
+    trimmed clip is split per profile, scaled/cropped and subtitled for it, then concatenated and watermarked
+    per profile. The audio is concatenated once and shared by all renditions.
+    """
+    check_reel_windows(windows, ass_file_paths)
+    if not renditions:
+        raise ValueError("No output profiles provided.")
+    command, filters, watermark_input = build_reel_sources(video_path, windows, has_audio)
+    count = len(renditions)
+
+    for i, ass_file_path in enumerate(ass_file_paths):
+        split_filters, branches = split_filter(f"[trim_v{i}]", count, f"clip{i}_")
+        filters += split_filters
+        for p, (profile, _) in enumerate(renditions):
+            chain = [fit_filter(profile)] + ([subtitle_filter(ass_file_path, profile)] if ass_file_path else [])
+            filters.append(f"{branches[p]}{','.join(chain)}[v{i}_{p}]")
+
+    audio_inputs = "".join(f"[a{i}]" for i in range(len(windows)))
+    filters.append(f"{audio_inputs}concat=n={len(windows)}:v=0:a=1[reel_a]")
+    audio_filters, audios = split_filter("[reel_a]", count, "reel_a", audio=True)
+    filters += audio_filters
+
+    if watermark_path:
+        command += ["-i", watermark_path]
+        watermark_filters, watermarks = split_filter(f"[{watermark_input}:v]", count, "wm_in")
+        filters += watermark_filters
+
+    outputs = []
+    for p, (profile, output_path) in enumerate(renditions):
+        video_inputs = "".join(f"[v{i}_{p}]" for i in range(len(windows)))
+        filters.append(f"{video_inputs}concat=n={len(windows)}:v=1:a=0[reel_v{p}]")
+        video_label = f"[reel_v{p}]"
+        if watermark_path:
+            filters.append(f"{video_label}{watermarks[p]}overlay={profile.watermark_position or WATERMARK_POSITION}"
+                           f"[wm{p}]")
+            video_label = f"[wm{p}]"
+        outputs += ["-map", video_label, "-map", audios[p]] + rendition_output_options(profile) + [output_path]
+
+    return command + ["-filter_complex", ";".join(filters)] + outputs
+
+
+async def render_highlight_reel(video_path: str, windows: List[Tuple[float, float]],
+                                ass_file_paths: List[Optional[str]], output_path: str,
+                                watermark_path: Optional[str] = None, has_audio: bool = True) -> str:
+    """
+    Renders the whole highlight reel (trim, subtitles, concat, watermark) in a single FFmpeg process
+    without writing any intermediate video files.
     """
-    command = f"ffmpeg -fflags +genpts -i {video_segment_path} -vf 'ass={ass_file_path}' -c:v libx264 -c:a copy {output_path}"
-    os.system(command)
+    command = build_reel_command(video_path, windows, ass_file_paths, output_path, watermark_path,
+                                 has_audio=has_audio)
+    logger.info(f"Rendering highlight reel with {len(windows)} soundbites in one pass to {output_path}")
 
+    try:
+        await run_ffmpeg(command, "reel")
+    except FFmpegError as e:
+        logger.error(f"Error rendering highlight reel: {str(e)}")
+        raise
 
-def add_watermark(video_path: str, output_path: str, watermark_path: str):
-    """
-    Adds a PNG watermark to the video using FFmpeg"""
-    logger.info("Starting to add watermark to video...")
+    logger.info(f"Highlight reel rendered successfully to {output_path}")
+    return output_path
+
+
+async def render_highlight_reel_renditions(video_path: str, windows: List[Tuple[float, float]],
+                                           ass_file_paths: List[Optional[str]],
+                                           renditions: List[Tuple[OutputProfile, str]],
+                                           watermark_path: Optional[str] = None, has_audio: bool = True) -> List[str]:
+    """Renders every (profile, output path) rendition of the highlight reel in a single FFmpeg process."""
+    command = build_reel_renditions_command(video_path, windows, ass_file_paths, renditions, watermark_path,
+                                            has_audio)
+    logger.info(f"Rendering highlight reel with {len(windows)} soundbites to {len(renditions)} renditions in one pass")
 
     try:
-        command = (
-            f"ffmpeg -i {video_path} "
-            f"-i {watermark_path} "
-            f'-filter_complex "overlay=W-w-100:H-h-700" '
-            f"-c:v libx264 -c:a copy {output_path}"
-        )
-
-        logger.info(f"Running command: {command}")
-        os.system(command)
-        logger.info(f"Watermark added successfully to {output_path}")
-
-    except Exception as e:
-        logger.error(f"Error adding watermark: {str(e)}")
+        await run_ffmpeg(command, "reel")
+    except FFmpegError as e:
+        logger.error(f"Error rendering highlight reel renditions: {str(e)}")
         raise
 
+    return [output_path for _, output_path in renditions]
+
+
+async def add_subtitles_to_segment(video_segment_path: str, ass_file_path: str, output_path: str):
+    """
+    Adds the .ass subtitles to the video segment using the FFmpeg command with the 'fflags +genpts' option.
+    """
+    return await render_segment(video_segment_path, output_path, ass_file_path=ass_file_path)
+
+
+async def add_watermark(video_path: str, output_path: str, watermark_path: str):
+    """
+    Adds a PNG watermark to the video using FFmpeg"""
+    logger.info("Starting to add watermark to video...")
+    return await render_segment(video_path, output_path, watermark_path=watermark_path)
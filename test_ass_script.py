@@ -0,0 +1,69 @@
+import re
+
+from ass_script import AssScriptBuilder, indexed_word_timings, proportional_word_timings, \
+    transcript_word_timings, wrap_words
+from models import Soundbite, TranscriptSegment
+from subtitles import create_ass_file_for_segment
+from transcript_index import TranscriptIndex
+
+
+def test_proportional_timings_fill_the_window():
+    words = proportional_word_timings("a bbb ccc", 1000, 2000)
+
+    assert [text for _, _, text in words] == ["a", "bbb", "ccc"]
+    assert words[0][0] == 1000 and words[-1][1] == 2000
+    assert all(current[0] == previous[1] for previous, current in zip(words, words[1:]))
+    assert words[1][1] - words[1][0] == 400  # 4 of the 10 characters (spaces included)
+
+
+def test_transcript_timings_follow_segments_and_are_clamped():
+    segments = [(10_000, "hello world"), (12_000, "again")]
+
+    words = transcript_word_timings(segments, 10_000, 13_000, next_start_ms=20_000)
+
+    assert words == [(10_000, 11_000, "hello"), (11_000, 12_000, "world"), (12_000, 13_000, "again")]
+
+
+def test_indexed_timings_end_at_the_next_segment():
+    index = TranscriptIndex.from_segments([TranscriptSegment(start_time="00:00:01.000", text="one"),
+                                           TranscriptSegment(start_time="00:00:03.000", text="two"),
+                                           TranscriptSegment(start_time="00:00:09.000", text="three")])
+
+    words = indexed_word_timings(index, 0, 5000)
+
+    assert words == [(1000, 3000, "one"), (3000, 5000, "two")]
+
+
+def test_wrap_words():
+    words = [(0, 1, text) for text in ["aaaa", "bbb", "cc", "dddddddddd"]]
+
+    assert [[text for _, _, text in line] for line in wrap_words(words, 8)] == [["aaaa", "bbb"], ["cc"],
+                                                                               ["dddddddddd"]]
+
+
+def test_karaoke_durations_add_up_to_each_line():
+    words = proportional_word_timings("the quick brown fox jumps over the lazy dog " * 3, 61_000, 70_000)
+
+    script = AssScriptBuilder(wrap_width=40).render(words, offset_ms=60_000)
+
+    assert script.count("[Script Info]") == 1
+    dialogues = [line for line in script.splitlines() if line.startswith("Dialogue:")]
+    assert len(dialogues) == 4
+    assert dialogues[0].startswith("Dialogue: 0,0:00:01.00,")
+    assert dialogues[-1].split(",")[2] == "0:00:10.00"
+    for dialogue in dialogues:
+        start, end = (sum(float(part) * 60 ** i for i, part in enumerate(reversed(time.split(":"))))
+                      for time in dialogue.split(",")[1:3])
+        karaoke_cs = sum(int(k) for k in re.findall(r"\\k(\d+)", dialogue))
+        assert karaoke_cs == round((end - start) * 100)
+
+
+def test_create_ass_file_for_segment(tmp_path):
+    path = tmp_path / "subs.ass"
+    soundbite = Soundbite(start_time="00:00:05.000", end_time="00:00:07.000", text="")
+
+    create_ass_file_for_segment(soundbite, "two words", str(path), soundbite.start_time, margin_v=120)
+
+    script = path.read_text()
+    assert ",10,10,120,1" in script
+    assert "Dialogue: 0,0:00:00.00,0:00:02.00,Default,,0,0,0,,{\\k80}two {\\k120}words" in script
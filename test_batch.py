@@ -0,0 +1,195 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import app as app_module
+import batch
+import main
+from batch import ResourcePool
+from jobs import JobStore, batch_status
+from models import Soundbite, TranscriptSegment, VideoTranscript
+from render_cache import RenderCache
+from worker import work
+
+TRANSCRIPT = b"# tactiq.io free youtube transcript\n00:00:01.000 hello there\n00:00:04.500 general kenobi\n"
+
+
+def test_pool_bounds_concurrency():
+    pool = ResourcePool("encode", 2)
+    running = {"now": 0, "peak": 0}
+
+    async def hold():
+        await pool.acquire()
+        try:
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+            await asyncio.sleep(0.01)
+            running["now"] -= 1
+        finally:
+            pool.release()
+
+    async def run():
+        await asyncio.gather(*(hold() for _ in range(6)))
+
+    asyncio.run(run())
+
+    assert running["peak"] == 2
+    assert pool.stats() == {"slots": 2, "in_use": 0, "waiting": 0}
+
+
+def test_pool_rate_limits_acquisitions():
+    pool = ResourcePool("llm", 10, requests_per_minute=1200)  # one every 50ms
+    started = []
+
+    async def call():
+        await pool.acquire()
+        started.append(time.monotonic())
+        pool.release()
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(3)))
+
+    asyncio.run(run())
+
+    assert started[2] - started[0] >= 0.09
+
+
+def make_episode(name):
+    transcript = VideoTranscript(segments=[TranscriptSegment(start_time="00:00:00.000", text=name)])
+    return {"video": f"{name}.mp4", "video_path": f"{name}.mp4", "transcript": transcript.json()}
+
+
+def run_worker(store, job_ids, concurrency):
+    """Runs a worker until every job has finished."""
+    async def run():
+        worker = asyncio.create_task(work(store, "w1", poll_seconds=0.01, concurrency=concurrency))
+        while any(store.get(job_id)["status"] in ("queued", "running") for job_id in job_ids):
+            await asyncio.sleep(0.01)
+        worker.cancel()
+
+    asyncio.run(run())
+
+
+def test_llm_selection_of_the_next_episode_overlaps_with_rendering(tmp_path):
+    events = []
+    rendering = {"now": 0, "peak": 0}
+
+    async def fake_llm(transcript):
+        events.append(("llm_start", transcript.segments[0].text))
+        await asyncio.sleep(0.02)
+        events.append(("llm_end", transcript.segments[0].text))
+        return [Soundbite(start_time="00:00:00.000", end_time="00:00:10.000", text="hello")]
+
+    async def fake_render_reel(video_path, *args, **kwargs):
+        rendering["now"] += 1
+        rendering["peak"] = max(rendering["peak"], rendering["now"])
+        events.append(("render_start", video_path))
+        await asyncio.sleep(0.05)
+        events.append(("render_end", video_path))
+        rendering["now"] -= 1
+        return [video_path.replace(".mp4", "_merged.mp4")]
+
+    async def keep(video_path, soundbites, concurrency):
+        return soundbites
+
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_ids = store.enqueue_many([make_episode(f"ep{i}") for i in range(3)], batch_id="b1")
+
+    with patch.object(main, "retrieve_soundbites_with_llm", fake_llm), \
+            patch.object(main, "render_reel", fake_render_reel), \
+            patch.object(main, "snap_soundbites", keep), \
+            patch.object(main.shutil, "move"), \
+            patch.object(main, "render_cache", RenderCache("unused", max_bytes=0)), \
+            patch.object(batch, "llm_pool", ResourcePool("llm", 1)), \
+            patch.object(batch, "encode_pool", ResourcePool("encode", 1)):
+        run_worker(store, job_ids, concurrency=3)
+
+    jobs = store.get_batch("b1")
+    assert [job["status"] for job in jobs] == ["succeeded"] * 3
+    assert [job["result"]["merged_output"] for job in jobs] == [
+        f"uploads/ep{i}_merged_final_highlight_reel.mp4" for i in range(3)]
+    assert rendering["peak"] == 1  # the encode budget holds one episode at a time
+    # the second episode is selected while the first one renders
+    assert events.index(("llm_start", "ep1")) < events.index(("render_end", "ep0.mp4"))
+    assert {"llm_queue", "encode_queue"} <= set(jobs[2]["result"]["stage_timings"])
+
+
+def test_failed_episode_does_not_stop_the_batch(tmp_path):
+    async def fake_llm(transcript):
+        if transcript.segments[0].text == "bad":
+            raise RuntimeError("LLM unavailable")
+        return [Soundbite(start_time="00:00:00.000", end_time="00:00:10.000", text="hello")]
+
+    async def fake_render_reel(video_path, *args, **kwargs):
+        return [f"{video_path}_merged.mp4"]
+
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_ids = store.enqueue_many([make_episode(name) for name in ("bad", "good")], batch_id="b1")
+
+    with patch.object(main, "retrieve_soundbites_with_llm", fake_llm), \
+            patch.object(main, "render_reel", fake_render_reel), \
+            patch.object(main, "BOUNDARY_TOLERANCE_SECONDS", 0), \
+            patch.object(main.shutil, "move"), \
+            patch.object(main, "render_cache", RenderCache("unused", max_bytes=0)), \
+            patch.object(batch, "llm_pool", ResourcePool("llm", 1)), \
+            patch.object(batch, "encode_pool", ResourcePool("encode", 1)):
+        run_worker(store, job_ids, concurrency=2)
+
+    jobs = store.get_batch("b1")
+    assert batch_status([job["status"] for job in jobs]) == "partially_failed"
+    assert [job["status"] for job in jobs] == ["failed", "succeeded"]
+    assert "LLM unavailable" in jobs[0]["error"]
+
+
+def test_batch_endpoint_validates_the_manifest_before_queueing(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(app_module, "job_store", JobStore(str(tmp_path / "jobs.sqlite3")))
+    (tmp_path / "ep1.mp4").write_bytes(b"video")
+    (tmp_path / "ep1.txt").write_bytes(TRANSCRIPT)
+
+    client = TestClient(app_module.app)
+    assert client.post("/batches/cut-video/", json={"items": []}).status_code == 422
+    assert client.post("/batches/cut-video/",
+                       json={"items": [{"video": "../secret.mp4", "transcript": "ep1.txt"}]}).status_code == 422
+    duplicate = {"video": "ep1.mp4", "transcript": "ep1.txt", "run_id": "a"}
+    assert client.post("/batches/cut-video/", json={"items": [duplicate, duplicate]}).status_code == 422
+    assert client.post("/batches/cut-video/",
+                       json={"items": [{"video": "ep1.mp4", "transcript": "ep1.txt"},
+                                       {"video": "ep2.mp4", "transcript": "ep1.txt"}]}).status_code == 404
+    assert app_module.job_store.claim("w1") is None  # nothing is queued unless every episode is valid
+
+    response = client.post("/batches/cut-video/", json={"items": [{"video": "ep1.mp4", "transcript": "ep1.txt",
+                                                                   "run_id": "ep1-run"}]})
+
+    assert response.status_code == 202
+    batch_id = response.json()["batch_id"]
+    assert response.json()["items"][0]["run_id"] == "ep1-run"
+    _, payload = app_module.job_store.claim("w1")
+    assert payload["video_path"] == str(tmp_path / "ep1.mp4")
+    assert [segment.text for segment in VideoTranscript.parse_raw(payload["transcript"]).segments] == [
+        "hello there", "general kenobi"]
+    assert client.get(f"/batches/{batch_id}").json()["status"] == "running"
+    assert client.get("/batches/unknown").status_code == 404
+
+
+def test_batch_survives_a_restart_and_can_be_cancelled(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "UPLOAD_DIR", str(tmp_path))
+    (tmp_path / "ep1.mp4").write_bytes(b"video")
+    (tmp_path / "ep1.txt").write_bytes(TRANSCRIPT)
+    path = str(tmp_path / "jobs.sqlite3")
+    monkeypatch.setattr(app_module, "job_store", JobStore(path))
+    client = TestClient(app_module.app)
+    batch_id = client.post("/batches/cut-video/", json={"items": [{"video": "ep1.mp4", "transcript": "ep1.txt"}] * 2}
+                           ).json()["batch_id"]
+    JobStore(path).claim("w1")
+
+    # a new API process sees the same batch
+    monkeypatch.setattr(app_module, "job_store", JobStore(path))
+    response = client.delete(f"/batches/{batch_id}")
+
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json()["items"]] == ["running", "cancelled"]
+    assert response.json()["items"][0]["cancel_requested"]  # the worker stops it on its next heartbeat
+    assert client.delete("/batches/unknown").status_code == 404
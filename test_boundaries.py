@@ -0,0 +1,89 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import boundaries
+from boundaries import build_pcm_command, clamp_soundbites, short_time_rms, snap_soundbite
+from ffmpeg_runner import FFmpegError
+from models import Soundbite
+
+RATE = boundaries.BOUNDARY_SAMPLE_RATE
+
+
+def fake_decoder(gaps):
+    """Returns a run_process stand-in that decodes loud noise with silent (start, end) gaps, in seconds."""
+    calls = []
+
+    async def run_process(command, stage, timeout=None, on_stdout_line=None, capture_stdout=False):
+        start, duration = float(command[command.index("-ss") + 1]), float(command[command.index("-t") + 1])
+        calls.append((start, duration))
+        times = start + np.arange(int(duration * RATE)) / RATE
+        samples = np.random.default_rng(0).uniform(-0.5, 0.5, len(times))
+        for gap_start, gap_end in gaps:
+            samples[(times >= gap_start) & (times < gap_end)] = 0.0
+        return (samples * 32767).astype("<i2").tobytes()
+
+    return run_process, calls
+
+
+def test_pcm_command_decodes_only_the_window():
+    command = build_pcm_command("in.mp4", 8.0, 4.0)
+
+    assert command[command.index("-ss") + 1] == "8.000" and command[command.index("-t") + 1] == "4.000"
+    assert command.index("-ss") < command.index("-i")  # input seeking, nothing before the window is decoded
+    assert command[-3:] == ["-f", "s16le", "pipe:1"]
+
+
+def test_short_time_rms():
+    samples = np.concatenate([np.full(320, 0.5, dtype=np.float32), np.zeros(320, dtype=np.float32)])
+
+    rms = short_time_rms(samples, frame=320, hop=160)
+
+    assert rms == pytest.approx([0.5, np.sqrt(0.125), 0.0])
+
+
+def test_cuts_snap_to_the_nearest_pauses(monkeypatch):
+    run_process, calls = fake_decoder([(9.5, 9.8), (20.2, 20.5), (21.5, 22.0)])
+    monkeypatch.setattr(boundaries, "run_process", run_process)
+    soundbite = Soundbite(start_time="00:00:10.000", end_time="00:00:20.000", text="idea")
+
+    snapped = asyncio.run(snap_soundbite("in.mp4", soundbite, tolerance=2.0))
+
+    assert "00:00:09.750" <= snapped.start_time <= "00:00:09.800"
+    assert "00:00:20.200" <= snapped.end_time <= "00:00:20.250"
+    assert sorted(calls) == [(8.0, 4.0), (18.0, 4.0)]  # only +-2 s around each cut is decoded
+
+
+def test_cuts_without_a_pause_nearby_are_kept(monkeypatch):
+    run_process, _ = fake_decoder([(5.0, 5.5)])
+    monkeypatch.setattr(boundaries, "run_process", run_process)
+    soundbite = Soundbite(start_time="00:00:10.000", end_time="00:00:20.000", text="idea")
+
+    assert asyncio.run(snap_soundbite("in.mp4", soundbite, tolerance=1.0)) is soundbite
+
+
+def test_decode_failures_keep_the_soundbite(monkeypatch):
+    async def failing(*args, **kwargs):
+        raise FFmpegError("boundary", 1, ["in.mp4: No such file or directory"])
+
+    monkeypatch.setattr(boundaries, "run_process", failing)
+    soundbite = Soundbite(start_time="00:00:10.000", end_time="00:00:20.000", text="idea")
+
+    assert asyncio.run(snap_soundbite("in.mp4", soundbite)) is soundbite
+
+
+def test_soundbites_are_clamped_to_the_video_duration():
+    soundbites = [
+        Soundbite(start_time="00:00:10.000", end_time="00:00:20.000", text="inside"),
+        Soundbite(start_time="00:00:55.000", end_time="00:01:05.000", text="runs past the end"),
+        Soundbite(start_time="00:00:59.500", end_time="00:01:10.000", text="starts too late"),
+        Soundbite(start_time="00:01:30.000", end_time="00:01:40.000", text="after the end"),
+        Soundbite(start_time="00:00:30.000", end_time="00:00:25.000", text="reversed"),
+    ]
+
+    clamped = clamp_soundbites(soundbites, 60.0)
+
+    assert [soundbite.text for soundbite in clamped] == ["inside", "runs past the end"]
+    assert clamped[0] is soundbites[0]
+    assert (clamped[1].start_time, clamped[1].end_time) == ("00:00:55.000", "00:01:00.000")
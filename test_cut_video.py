@@ -15,10 +15,8 @@ def test_video_file(tmp_path):
     return video_file
 
 
-@patch("main.ffmpeg.input")  # Mock ffmpeg input to avoid actual file processing
+@patch("main.run_ffmpeg")  # Mock ffmpeg to avoid actual file processing
 def test_successful_cut_and_merge(mock_ffmpeg_input, test_video_file):
-    mock_ffmpeg_input.return_value.output.return_value.run.return_value = None
-
     # Test the endpoint
     with open(test_video_file, "rb") as video:
         response = client.post(
@@ -44,7 +42,7 @@ def test_cut_video_file_not_found():
     assert response.json() == {"detail": "There was an error parsing the body"}  # Update to match actual error
 
 
-@patch("main.ffmpeg.input")
+@patch("main.run_ffmpeg")
 def test_cut_video_with_corrupted_file(mock_ffmpeg_input, test_video_file):
     mock_ffmpeg_input.side_effect = Exception("FFmpeg error: Corrupted file")
 
@@ -59,7 +57,7 @@ def test_cut_video_with_corrupted_file(mock_ffmpeg_input, test_video_file):
     assert "FFmpeg error: Corrupted file" in response.json()["detail"]
 
 
-@patch("main.ffmpeg.input")
+@patch("main.run_ffmpeg")
 def test_cut_video_empty_file(mock_ffmpeg_input, tmp_path):
     # Create an empty file for testing
     empty_video_file = tmp_path / "empty_video.mp4"
@@ -88,3 +86,66 @@ def test_cut_video_invalid_timestamps(test_video_file):
     # Update based on FastAPI validation error handling
     assert response.status_code == 422
     assert "detail" in response.json()
+
+
+def test_smart_cut_plan_copies_gop_aligned_middle():
+    from main import plan_smart_cut
+
+    parts = plan_smart_cut([0.0, 2.0, 4.0, 6.0, 8.0], 1.5, 7.0)
+
+    assert parts == [(1.5, 2.0, False), (2.0, 6.0, True), (6.0, 7.0, False)]
+
+
+def test_smart_cut_plan_on_keyframe_boundaries():
+    from main import plan_smart_cut
+
+    assert plan_smart_cut([0.0, 2.0, 4.0], 2.0, 4.0) == [(2.0, 4.0, True)]
+
+
+def test_smart_cut_plan_reencodes_without_inner_gop():
+    from main import plan_smart_cut
+
+    assert plan_smart_cut([0.0, 10.0], 3.0, 9.0) == [(3.0, 9.0, False)]
+    assert plan_smart_cut([0.0, 5.0, 10.0], 3.0, 9.0) == [(3.0, 9.0, False)]
+
+
+def test_smart_cut_parts_match_the_source_and_stitch_through_mpegts():
+    from main import build_smart_part_command, build_smart_stitch_command
+
+    params = {"video_codec": "h264", "profile": "main", "level": "4.0", "pix_fmt": "yuv420p", "timescale": 15360}
+    edge = build_smart_part_command("in.mp4", 1.5, 2.0, "part0.ts", False, params)
+    copied = build_smart_part_command("in.mp4", 2.0, 6.0, "part1.ts", True, params)
+    stitch = build_smart_stitch_command("parts.txt", "in.mp4", 1.5, 7.0, "out.mp4", params)
+
+    assert edge[edge.index("-profile:v") + 1] == "main"
+    assert edge[edge.index("-level:v") + 1] == "4.0"
+    assert edge[edge.index("-pix_fmt") + 1] == "yuv420p"
+    assert "repeat-headers=1" in edge
+    for command in (edge, copied):
+        assert command[-3:] == ["-f", "mpegts", command[-1]] and "-an" in command
+    # the copied middle seeks just past its keyframe instead of rounding down onto the GOP before it
+    assert copied[copied.index("-ss") + 1] == "2.001000"
+    assert copied[copied.index("-c:v") + 1] == "copy"
+    # the audio of the whole clip is encoded once, and sources without audio still work
+    assert stitch[stitch.index("-ss") + 1] == "1.500000" and "1:a:0?" in stitch
+    assert stitch[stitch.index("-c:a") + 1] == "aac"
+    assert stitch[stitch.index("-video_track_timescale") + 1] == "15360"
+
+
+def test_smart_cut_stitches_every_part(tmp_path):
+    import asyncio
+    import main
+
+    commands = []
+
+    async def fake_run(command, stage, segment=None):
+        commands.append(command)
+
+    with patch.object(main, "run_ffmpeg", fake_run), \
+            patch.object(main, "probe_keyframes", return_value=[0.0, 2.0, 4.0, 6.0, 8.0]):
+        asyncio.run(main.smart_cut("in.mp4", 1.5, 7.0, str(tmp_path / "out.mp4"), {"pix_fmt": "yuv420p"}))
+
+    assert [command[-1].rsplit(".", 2)[-2:] for command in commands[:3]] == [["part0", "ts"], ["part1", "ts"],
+                                                                             ["part2", "ts"]]
+    assert commands[3][-1] == str(tmp_path / "out.mp4")
+    assert os.listdir(tmp_path) == []  # parts and the concat list are removed
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import stat
+
+import pytest
+
+import ffmpeg_runner
+from ffmpeg_runner import FFmpegError, FFmpegTimeout, ProgressBroker, classify_stderr, current_run_id, \
+    parse_cpu_list, parse_progress_block, run_ffmpeg
+
+FAKE_FFMPEG = """#!/bin/sh
+printf 'frame=10\\nfps=25.0\\nout_time_us=400000\\nspeed=2.5x\\nprogress=continue\\n'
+[ -n "$FAKE_SLEEP" ] && exec sleep "$FAKE_SLEEP"
+printf 'frame=20\\nfps=24.0\\nout_time_us=800000\\nspeed=2.4x\\nprogress=end\\n'
+echo "$FAKE_STDERR" >&2
+exit "${FAKE_STATUS:-0}"
+"""
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """Puts a shell script named ffmpeg that prints -progress output first on the PATH."""
+    script = tmp_path / "ffmpeg"
+    script.write_text(FAKE_FFMPEG)
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+
+
+def test_parse_progress_block():
+    event = parse_progress_block({"out_time_us": "1500000", "fps": "N/A", "speed": "1.75x", "progress": "end"})
+
+    assert event == {"out_time": 1.5, "fps": None, "speed": 1.75, "frame": 0, "done": True}
+
+
+def test_progress_events_are_published(fake_ffmpeg):
+    broker = ProgressBroker()
+    events = []
+    broker.add_sink(events.append)
+
+    async def run():
+        current_run_id.set("run-1")
+        await run_ffmpeg(["ffmpeg", "-i", "in.mp4", "out.mp4"], "render", "clip-1", broker=broker)
+
+    asyncio.run(run())
+
+    assert [(event["out_time"], event["speed"], event["done"]) for event in events] == [(0.4, 2.5, False),
+                                                                                      (0.8, 2.4, True)]
+    assert {(event["run_id"], event["stage"], event["segment"]) for event in events} == {("run-1", "render", "clip-1")}
+    assert broker.latest == {}  # finished stages leave the snapshot
+
+
+def test_cancelled_stages_leave_the_snapshot(fake_ffmpeg, monkeypatch):
+    monkeypatch.setenv("FAKE_SLEEP", "10")
+    broker = ProgressBroker()
+    events = []
+    broker.add_sink(events.append)
+
+    async def run():
+        current_run_id.set("run-1")
+        task = asyncio.create_task(run_ffmpeg(["ffmpeg", "-i", "in.mp4", "out.mp4"], "render", "clip-1",
+                                              broker=broker))
+        while not broker.latest:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+
+    assert broker.latest == {}
+    assert events[-1]["done"] and events[-1]["cancelled"]
+
+
+def test_failures_raise_with_stderr(fake_ffmpeg, monkeypatch):
+    monkeypatch.setenv("FAKE_STATUS", "1")
+    monkeypatch.setenv("FAKE_STDERR", "in.mp4: No such file or directory")
+
+    with pytest.raises(FFmpegError) as error:
+        asyncio.run(run_ffmpeg(["ffmpeg", "-i", "in.mp4", "out.mp4"], "render", broker=ProgressBroker()))
+
+    assert error.value.returncode == 1
+    assert "No such file or directory" in str(error.value)
+    assert error.value.reason == "missing_input"
+
+
+def test_subscribers_filter_by_run_id():
+    broker = ProgressBroker()
+
+    async def run():
+        subscription = broker.subscribe("wanted")
+        first = asyncio.ensure_future(subscription.__anext__())
+        await asyncio.sleep(0)
+        broker.publish({"run_id": "other", "stage": "render"})
+        broker.publish({"run_id": "wanted", "stage": "render", "speed": 3.0})
+        event = await first
+        await subscription.aclose()
+        return event
+
+    assert asyncio.run(run())["speed"] == 3.0
+
+
+def test_timeout_kills_the_process(tmp_path, monkeypatch):
+    script = tmp_path / "ffmpeg"
+    script.write_text("#!/bin/sh\nexec sleep 5\n")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+
+    with pytest.raises(FFmpegTimeout) as error:
+        asyncio.run(run_ffmpeg(["ffmpeg", "-i", "in.mp4", "out.mp4"], "cut", broker=ProgressBroker(), timeout=0.2))
+
+    assert error.value.reason == "timeout"
+    assert error.value.to_dict()["stage"] == "cut"
+
+
+def test_threads_are_set_right_before_the_output(monkeypatch):
+    commands = []
+
+    async def fake_run_process(command, stage, timeout=None, on_stdout_line=None, capture_stdout=False):
+        commands.append(command)
+        return b""
+
+    monkeypatch.setattr(ffmpeg_runner, "run_process", fake_run_process)
+    asyncio.run(run_ffmpeg(["ffmpeg", "-i", "in.mp4", "out.mp4"], "cut", broker=ProgressBroker(), threads=2))
+
+    assert commands[0][-3:] == ["-threads", "2", "out.mp4"]
+
+
+def test_stderr_is_classified():
+    assert classify_stderr(["frame=1", "out.mp4: No space left on device", "Conversion failed!"]) == "conversion_failed"
+    assert classify_stderr(["in.mp4: Invalid data found when processing input"]) == "invalid_input"
+    assert classify_stderr(["something else"]) == "unknown"
+    assert parse_cpu_list("0-2, 8") == {0, 1, 2, 8}
+
+
+def test_ffmpeg_processes_are_traced(fake_ffmpeg):
+    from tracing import metrics
+
+    asyncio.run(run_ffmpeg(["ffmpeg", "-i", "in.mp4", "out.mp4"], "merge", broker=ProgressBroker()))
+
+    assert 'video_recap_ffmpeg_speed_count{stage="ffmpeg.merge"}' in metrics.render()
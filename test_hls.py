@@ -0,0 +1,64 @@
+import asyncio
+import os
+from unittest.mock import patch
+
+import hls
+from hls import LivePlaylist, build_hls_remux_command, parse_media_playlist
+
+CLIP_PLAYLIST = """#EXTM3U
+#EXT-X-VERSION:7
+#EXT-X-TARGETDURATION:5
+#EXT-X-PLAYLIST-TYPE:VOD
+#EXT-X-MAP:URI="{prefix}_init.mp4"
+#EXTINF:4.004000,
+{prefix}_000.m4s
+#EXTINF:2.502000,
+{prefix}_001.m4s
+#EXT-X-ENDLIST
+"""
+
+
+async def fake_remux(args, stage, segment=None):
+    """Writes the clip playlist the FFmpeg HLS muxer would write."""
+    playlist_path = args[-1]
+    prefix = os.path.basename(playlist_path)[:-len(".m3u8")]
+    with open(playlist_path, "w") as f:
+        f.write(CLIP_PLAYLIST.format(prefix=prefix))
+
+
+def test_parse_media_playlist():
+    init_uri, segments = parse_media_playlist(CLIP_PLAYLIST.format(prefix="clip000"))
+
+    assert init_uri == "clip000_init.mp4"
+    assert segments == [(4.004, "clip000_000.m4s"), (2.502, "clip000_001.m4s")]
+
+
+def test_remux_command_stream_copies_into_fmp4():
+    command = build_hls_remux_command("clip_rendered.mp4", "out", "clip002", segment_seconds=4)
+
+    assert command[command.index("-c") + 1] == "copy"
+    assert command[command.index("-hls_segment_type") + 1] == "fmp4"
+    assert command[-1] == os.path.join("out", "clip002.m3u8")
+
+
+def test_clips_are_published_in_order(tmp_path):
+    playlist = LivePlaylist(str(tmp_path))
+    with open(playlist.path) as f:
+        assert "#EXTINF" not in f.read()  # players can start polling right away
+
+    async def run():
+        with patch.object(hls, "run_ffmpeg", fake_remux):
+            await playlist.add_clip(2, "c.mp4")
+            assert "clip002" not in playlist.render()  # held back until clips 0 and 1 are done
+            await playlist.add_clip(0, "a.mp4")
+            playlist.skip(1)
+
+    asyncio.run(run())
+    playlist.finish()
+
+    with open(playlist.path) as f:
+        text = f.read()
+    assert text.index("clip000_000.m4s") < text.index("#EXT-X-DISCONTINUITY") < text.index("clip002_000.m4s")
+    assert '#EXT-X-MAP:URI="clip002_init.mp4"' in text
+    assert text.rstrip().endswith("#EXT-X-ENDLIST")
+    assert not os.path.exists(tmp_path / "clip000.m3u8")
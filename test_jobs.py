@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import main
+from jobs import JobStore
+from models import TranscriptSegment, VideoCutResponse, VideoTranscript
+from worker import progress_sink, run_job
+
+
+def make_payload():
+    transcript = VideoTranscript(segments=[TranscriptSegment(start_time="00:00:01.000", text="hello")])
+    return {"video_path": "uploads/sample.mp4", "transcript": transcript.json()}
+
+
+def test_jobs_are_claimed_once_in_order(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    first, second = store.enqueue({"n": 1}), store.enqueue({"n": 2})
+
+    assert store.claim("w1") == (first, {"n": 1})
+    assert store.claim("w2") == (second, {"n": 2})
+    assert store.claim("w3") is None
+    assert store.get(first)["status"] == "running"
+
+
+def test_queue_survives_restart_and_reclaims_abandoned_jobs(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    job_id = JobStore(path).enqueue({"n": 1})
+    JobStore(path).claim("crashed-worker")
+
+    restarted = JobStore(path, stale_seconds=30)
+    assert restarted.claim("w2") is None  # the heartbeat is still fresh
+    with patch("jobs.time.time", return_value=time.time() + 60):
+        assert restarted.claim("w2") == (job_id, {"n": 1})
+    assert restarted.get(job_id)["attempts"] == 2
+
+
+def test_cancel_queued_and_running_jobs(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    running, queued = store.enqueue({}), store.enqueue({})
+    store.claim("w1")
+
+    assert store.cancel(queued) == "cancelled"
+    assert store.cancel(running) == "running"  # the worker stops it on its next heartbeat
+    assert store.get(running)["cancel_requested"]
+    assert store.claim("w2") is None
+    assert store.cancel("missing") is None
+
+
+def test_run_job_stores_the_result(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.enqueue(make_payload())
+    _, payload = store.claim("w1")
+
+    async def fake_process(video_path, transcript, **kwargs):
+        return VideoCutResponse(soundbites=[], merged_video_path="uploads/reel.mp4", stage_timings={"total": 1.0})
+
+    with patch.object(main, "process_video_cut_request", fake_process):
+        asyncio.run(run_job(store, job_id, payload))
+
+    job = store.get(job_id)
+    assert job["status"] == "succeeded"
+    assert job["result"]["merged_output"] == "uploads/reel.mp4"
+
+
+def test_run_job_stops_when_cancelled(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.enqueue(make_payload())
+    _, payload = store.claim("w1")
+    store.cancel(job_id)
+
+    async def slow_process(video_path, transcript, **kwargs):
+        await asyncio.sleep(10)
+
+    with patch.object(main, "process_video_cut_request", slow_process):
+        asyncio.run(run_job(store, job_id, payload, heartbeat_seconds=0.01))
+
+    assert store.get(job_id)["status"] == "cancelled"
+
+
+def test_stale_jobs_are_not_reclaimed_when_cancelled_or_out_of_attempts(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), stale_seconds=30, max_attempts=2)
+    cancelled, exhausted, retried = store.enqueue({}), store.enqueue({}), store.enqueue({})
+    for worker in ("w1", "w2", "w3"):
+        store.claim(worker)
+    store.cancel(cancelled)
+
+    with patch("jobs.time.time", return_value=time.time() + 60):
+        assert store.claim("w4") == (exhausted, {})  # and then its second worker dies too
+    with patch("jobs.time.time", return_value=time.time() + 120):
+        assert store.claim("w5") == (retried, {})
+
+    assert store.get(cancelled)["status"] == "cancelled"
+    assert store.get(exhausted)["status"] == "failed"
+    assert store.get(exhausted)["attempts"] == 2
+    assert store.get(retried)["attempts"] == 2
+
+
+def test_progress_is_written_off_the_event_loop(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.enqueue(make_payload())
+    writer = ThreadPoolExecutor(max_workers=1)
+    threads = []
+    update_progress = store.update_progress
+
+    def record_thread(*args):
+        threads.append(threading.current_thread())
+        update_progress(*args)
+
+    sink = progress_sink(store, min_interval_seconds=0, writer=writer)
+    with patch.object(store, "update_progress", record_thread):
+        sink({"run_id": job_id, "stage": "cut", "segment": "a", "out_time": 1.0})
+        sink({"run_id": job_id, "stage": "cut", "segment": "a", "out_time": 2.0, "done": True})
+        writer.shutdown(wait=True)
+
+    assert threading.main_thread() not in threads
+    assert store.get_progress(job_id)["cut:a"]["done"]
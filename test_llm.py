@@ -1,3 +1,7 @@
+import os
+import subprocess
+import sys
+
 import pytest
 from pydantic.v1 import ValidationError
 from main import AllSoundbites, Soundbite
@@ -82,3 +86,25 @@ def test_llm_response_invalid_timestamp():
     # Expecting validation error due to invalid timestamp format
     with pytest.raises(ValidationError):
         AllSoundbites(**invalid_response)
+
+
+def test_importing_main_defers_langchain():
+    code = "import sys, main; print(any(name.startswith(('langchain', 'openai')) for name in sys.modules))"
+    env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+    completed = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                               env=env, capture_output=True, text=True)
+
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.strip() == "False"
+
+
+def test_chains_are_built_once_on_first_use(monkeypatch):
+    import main
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    main.get_chain.cache_clear()
+    chain = main.get_chain("soundbite_selection")
+
+    assert main.get_chain("soundbite_selection") is chain
+    assert chain.first.input_variables == ["transcript"]
+    assert chain.last.config["run_name"] == "soundbite_selection"
@@ -0,0 +1,64 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import main
+from llm_cache import SoundbiteCache
+from models import AllSoundbites, Soundbite, TranscriptSegment, VideoTranscript
+
+
+class StubChain:
+    """Stands in for the LangChain chain and counts the LLM calls."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, inputs):
+        self.calls += 1
+        return AllSoundbites(soundbites=[
+            Soundbite(start_time="00:00:01.000", end_time="00:00:31.000", text="hello world", reasoning="stub")
+        ])
+
+
+def make_transcript(text="hello world"):
+    return VideoTranscript(segments=[TranscriptSegment(start_time="00:00:01.000", text=text)])
+
+
+def test_identical_transcripts_hit_the_cache(tmp_path):
+    chain = StubChain()
+    cache = SoundbiteCache(str(tmp_path / "llm.sqlite3"), ttl_seconds=60, max_entries=10)
+
+    with patch.object(main, "get_chain", lambda run_name: chain), patch.object(main, "soundbite_cache", cache):
+        first = asyncio.run(main.retrieve_soundbites_with_llm(make_transcript()))
+        # whitespace differences normalize to the same key
+        second = asyncio.run(main.retrieve_soundbites_with_llm(make_transcript("hello   world ")))
+        asyncio.run(main.retrieve_soundbites_with_llm(make_transcript("something else")))
+
+    assert chain.calls == 2
+    assert [soundbite.dict() for soundbite in first] == [soundbite.dict() for soundbite in second]
+
+
+def test_key_depends_on_prompt_and_model():
+    transcript = make_transcript()
+
+    assert SoundbiteCache.key(transcript, "prompt", "gpt-4o") != SoundbiteCache.key(transcript, "prompt v2", "gpt-4o")
+    assert SoundbiteCache.key(transcript, "prompt", "gpt-4o") != SoundbiteCache.key(transcript, "prompt", "gpt-4o-mini")
+
+
+def test_entries_expire(tmp_path):
+    cache = SoundbiteCache(str(tmp_path / "llm.sqlite3"), ttl_seconds=60, max_entries=10)
+    cache.put("key", AllSoundbites(soundbites=[]))
+
+    assert cache.get("key") is not None
+    with patch("llm_cache.time.time", return_value=time.time() + 120):
+        assert cache.get("key") is None
+
+
+def test_least_recently_used_entries_are_dropped(tmp_path):
+    cache = SoundbiteCache(str(tmp_path / "llm.sqlite3"), ttl_seconds=60, max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, AllSoundbites(soundbites=[]))
+        time.sleep(0.01)
+
+    assert cache.get("a") is None
+    assert cache.get("b") is not None and cache.get("c") is not None
@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 import os
 from unittest.mock import patch
@@ -7,13 +8,14 @@ from main import merge_segments
 # Test merging with empty segment paths
 def test_merge_empty_segments():
     with pytest.raises(ValueError):
-        merge_segments([])
+        asyncio.run(merge_segments([]))
 
 
 # Test successful segment merging with mocked ffmpeg to speed up tests
-@patch("main.ffmpeg.input")
-def test_successful_merge(mock_ffmpeg_input, tmp_path_factory):
+@patch("main.run_ffmpeg")
+def test_successful_merge(mock_run_ffmpeg, tmp_path_factory, monkeypatch):
     upload_dir = tmp_path_factory.mktemp("uploads")
+    monkeypatch.chdir(upload_dir)
     segment_paths = [
         os.path.join(upload_dir, "segment_0.mp4"),
         os.path.join(upload_dir, "segment_1.mp4"),
@@ -24,14 +26,16 @@ def test_successful_merge(mock_ffmpeg_input, tmp_path_factory):
         with open(segment, "wb") as f:
             f.write(b"Test content")
 
-    # Mock the ffmpeg operations to prevent actual file processing
-    mock_ffmpeg_input.return_value.output.return_value.run.return_value = None
+    # Mock the ffmpeg operations to prevent actual file processing, simulating the merged output file
+    async def fake_run_ffmpeg(args, stage, segment=None):
+        with open(args[-1], "wb") as f:
+            f.write(b"Merged content")
 
-    merged_output = merge_segments(segment_paths)
+    mock_run_ffmpeg.side_effect = fake_run_ffmpeg
+    os.makedirs("uploads", exist_ok=True)
 
-    # Simulate the existence of the merged output file
-    with open(merged_output, "wb") as f:
-        f.write(b"Merged content")
+    merged_output = asyncio.run(merge_segments(segment_paths))
+    assert mock_run_ffmpeg.call_args.args[1] == "merge"
 
     # Assertions
     assert os.path.exists(merged_output)
@@ -40,16 +44,16 @@ def test_successful_merge(mock_ffmpeg_input, tmp_path_factory):
 
 
 # Test file cleanup after merge failure
-@patch("main.ffmpeg.input")
-def test_merge_with_invalid_segments(mock_ffmpeg_input, tmp_path_factory):
+@patch("main.run_ffmpeg")
+def test_merge_with_invalid_segments(mock_run_ffmpeg, tmp_path_factory):
     upload_dir = tmp_path_factory.mktemp("uploads")
     segment_paths = [os.path.join(upload_dir, "nonexistent_segment.mp4")]
 
     # Mock ffmpeg to simulate failure
-    mock_ffmpeg_input.side_effect = Exception("FFmpeg merge failed")
+    mock_run_ffmpeg.side_effect = Exception("FFmpeg merge failed")
 
     with pytest.raises(Exception):
-        merge_segments(segment_paths)
+        asyncio.run(merge_segments(segment_paths))
 
     # Assert no leftover temp files
     assert not os.path.exists(segment_paths[0])
@@ -0,0 +1,98 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import probe
+from probe import parse_keyframe_packets, probe_keyframes
+
+
+def test_parse_keyframe_packets():
+    output = "0.000000,K__\n0.033367,___\nN/A,K__\n2.002000,K_\n1.001000,K__\n"
+
+    assert parse_keyframe_packets(output) == [0.0, 1.001, 2.002]
+
+
+def test_keyframe_index_is_cached_per_source(tmp_path):
+    source = tmp_path / "source.mp4"
+    source.write_bytes(b"fake video")
+
+    with patch.object(probe, "run_ffprobe", AsyncMock(return_value="0.0,K__\n2.0,K__\n")) as mock_run, \
+            patch.object(probe, "metadata_store", probe.MediaMetadataStore(str(tmp_path / "metadata.sqlite3"))):
+        assert asyncio.run(probe_keyframes(str(source))) == [0.0, 2.0]
+        assert asyncio.run(probe_keyframes(str(source))) == [0.0, 2.0]
+        assert mock_run.call_count == 1
+
+        # a modified source is probed again
+        source.write_bytes(b"another fake video")
+        asyncio.run(probe_keyframes(str(source)))
+        assert mock_run.call_count == 2
+
+
+def test_probe_video_codec_reads_first_video_stream(tmp_path):
+    source = tmp_path / "source.mp4"
+    source.write_bytes(b"fake video")
+    output = '{"streams": [{"codec_type": "audio", "codec_name": "aac"}, {"codec_type": "video", "codec_name": "hevc"}]}'
+
+    with patch.object(probe, "run_ffprobe", AsyncMock(return_value=output)) as mock_run, \
+            patch.object(probe, "metadata_store", probe.MediaMetadataStore("")):
+        assert asyncio.run(probe.probe_video_codec(str(source))) == "hevc"
+        assert mock_run.call_args.args[0][-1] == str(source)
+
+
+def test_parse_media_info():
+    output = ('{"streams": [{"codec_type": "audio", "codec_name": "aac"}, '
+              '{"codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080}], '
+              '"format": {"duration": "61.500000"}}')
+
+    assert probe.parse_media_info(output) == {"duration": 61.5, "video_codec": "h264", "width": 1920,
+                                              "height": 1080, "fps": None, "has_audio": True}
+
+
+def test_parse_encoding_params():
+    output = ('{"streams": [{"codec_type": "video", "codec_name": "h264", "profile": "Constrained Baseline", '
+              '"level": 31, "pix_fmt": "yuv420p", "time_base": "1/15360"}, '
+              '{"codec_type": "audio", "codec_name": "aac", "time_base": "1/48000"}]}')
+
+    assert probe.parse_encoding_params(output) == {"video_codec": "h264", "profile": "baseline", "level": "3.1",
+                                                   "pix_fmt": "yuv420p", "timescale": 15360}
+    assert probe.parse_encoding_params('{"streams": []}')["profile"] is None
+
+
+def test_parse_frame_rate():
+    assert probe.parse_frame_rate("30000/1001") == 29.97
+    assert probe.parse_frame_rate("25/1") == 25.0
+    assert probe.parse_frame_rate("0/0") is None
+    assert probe.parse_frame_rate(None) is None
+
+
+def test_metadata_is_probed_once_and_persisted(tmp_path):
+    source = tmp_path / "source.mp4"
+    source.write_bytes(b"fake video")
+    db_path = str(tmp_path / "metadata.sqlite3")
+    output = ('{"streams": [{"codec_type": "video", "codec_name": "h264", "avg_frame_rate": "25/1"}], '
+              '"format": {"duration": "12.5"}}')
+
+    async def probe_concurrently():
+        return await asyncio.gather(*(probe.probe_metadata(str(source)) for _ in range(4)))
+
+    with patch.object(probe, "run_ffprobe", AsyncMock(return_value=output)) as mock_run:
+        with patch.object(probe, "metadata_store", probe.MediaMetadataStore(db_path)):
+            results = asyncio.run(probe_concurrently())
+            assert mock_run.call_count == 1  # concurrent callers share one ffprobe process
+            assert all(result["duration"] == 12.5 and result["fps"] == 25.0 for result in results)
+
+        # a new process (empty in-memory LRU) reads the stored result from disk
+        with patch.object(probe, "metadata_store", probe.MediaMetadataStore(db_path)):
+            assert asyncio.run(probe.probe_metadata(str(source)))["video_codec"] == "h264"
+            assert mock_run.call_count == 1
+
+
+def test_metadata_store_evicts_least_recently_used():
+    store = probe.MediaMetadataStore("", max_memory_entries=2)
+    for name in ("a", "b", "c"):
+        store.put((name, 1, 0.0), "media_info", {"duration": 1.0})
+    store.cached(("b", 1, 0.0), "media_info")
+    store.put(("d", 1, 0.0), "media_info", {"duration": 1.0})
+
+    assert store.cached(("a", 1, 0.0), "media_info") is None
+    assert store.cached(("c", 1, 0.0), "media_info") is None
+    assert store.cached(("b", 1, 0.0), "media_info") == {"duration": 1.0}
@@ -0,0 +1,402 @@
+import asyncio
+import os
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from main import Soundbite, process_video_cut_request
+from models import OUTPUT_PROFILES, PREVIEW_PROFILE, TranscriptSegment, VideoTranscript
+from render_cache import RenderCache
+from workspace import Workspace
+
+
+def make_soundbites():
+    return [
+        Soundbite(start_time="00:00:30.000", end_time="00:00:40.000", text="third"),
+        Soundbite(start_time="00:00:00.000", end_time="00:00:10.000", text="first"),
+        Soundbite(start_time="00:00:15.000", end_time="00:00:25.000", text="second"),
+    ]
+
+
+def run_pipeline(soundbites, cut_side_effect, concurrency=2, render_mode="segments", render_side_effect=None):
+    """Runs process_video_cut_request with every ffmpeg stage stubbed out, returns (response, merged input)."""
+    merged = {}
+    running = {"now": 0, "peak": 0}
+
+    async def fake_llm(transcript):
+        return soundbites
+
+    async def fake_cut(input_path, start, end, output_path):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        try:
+            # the side effect returns how long the cut takes, or raises to fail it
+            await asyncio.sleep(cut_side_effect(start, end) or 0)
+        finally:
+            running["now"] -= 1
+
+    async def fake_merge(segment_paths, output_dir="uploads", suffix=""):
+        merged["paths"] = list(segment_paths)
+        return "uploads/merged_video_test.mp4"
+
+    transcript = VideoTranscript(segments=[TranscriptSegment(start_time="00:00:00.000", text="hello")])
+
+    with patch.object(main, "retrieve_soundbites_with_llm", fake_llm), \
+            patch.object(main, "cut_video", fake_cut), \
+            patch.object(main, "write_ass_file"), \
+            patch.object(main, "render_segment", AsyncMock(side_effect=render_side_effect)), \
+            patch.object(main, "merge_segments", fake_merge), \
+            patch.object(main.os, "rename"), \
+            patch.object(main.shutil, "move"), \
+            patch.object(main, "render_cache", RenderCache("unused", max_bytes=0)):
+        response = asyncio.run(process_video_cut_request("uploads/sample.mp4", transcript, concurrency=concurrency,
+                                                         render_mode=render_mode))
+
+    return response, merged.get("paths"), running["peak"]
+
+
+def test_segments_keep_soundbite_order():
+    def slow_for_early_clips(start, end):
+        # earlier soundbites finish last, order must still follow the soundbite list
+        return 0.05 if start == "00:00:30.000" else 0.0
+
+    response, merged_paths, _ = run_pipeline(make_soundbites(), slow_for_early_clips, concurrency=3)
+
+    expected = [f"segment_{sb.start_time.replace(':', '_')}_{sb.end_time.replace(':', '_')}_rendered.mp4"
+                for sb in make_soundbites()]
+    assert [os.path.basename(path) for path in merged_paths] == expected
+    assert len({os.path.dirname(path) for path in merged_paths}) == 1  # all in the request's workspace
+    assert response.merged_video_path == "uploads/merged_video_test_final_highlight_reel.mp4"
+    assert {"llm", "cut", "ass", "render", "merge", "total"} <= set(response.stage_timings)
+
+
+def test_failed_cut_is_skipped():
+    def fail_second(start, end):
+        if start == "00:00:00.000":
+            raise RuntimeError("ffmpeg failed")
+
+    _, merged_paths, _ = run_pipeline(make_soundbites(), fail_second)
+
+    assert len(merged_paths) == 2
+    assert not any("00_00_00.000" in path for path in merged_paths)
+
+
+def test_failed_render_is_left_out_of_the_ordered_merge():
+    async def fail_first_clip(input_path, output_path, *args, **kwargs):
+        if "00_00_00.000" in input_path:
+            raise main.FFmpegError("render", 1, ["Conversion failed!"])
+
+    response, merged_paths, _ = run_pipeline(make_soundbites(), lambda start, end: 0,
+                                             render_side_effect=fail_first_clip)
+
+    expected = [f"segment_{sb.start_time.replace(':', '_')}_{sb.end_time.replace(':', '_')}_rendered.mp4"
+                for sb in make_soundbites() if sb.start_time != "00:00:00.000"]
+    assert [os.path.basename(path) for path in merged_paths] == expected
+    assert response.merged_video_path == "uploads/merged_video_test_final_highlight_reel.mp4"
+
+
+def test_failing_task_cancels_its_siblings_before_the_error_propagates():
+    finished = []
+
+    async def encode(seconds):
+        await asyncio.sleep(seconds)
+        finished.append(seconds)
+
+    async def fail():
+        raise RuntimeError("out of space")
+
+    async def run():
+        tasks_before = asyncio.all_tasks()
+        with pytest.raises(RuntimeError):
+            await main.gather_or_cancel(encode(0.05), fail(), encode(0.05))
+        # nothing is left running once the error reaches the caller
+        assert asyncio.all_tasks() == tasks_before
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+
+    assert finished == []
+
+
+def test_concurrency_is_bounded():
+    def slow(start, end):
+        return 0.02
+
+    _, _, peak = run_pipeline(make_soundbites() * 2, slow, concurrency=2)
+
+    assert peak <= 2
+
+
+def test_one_shot_mode_renders_reel_in_one_call():
+    rendered = {}
+
+    async def fake_render(video_path, windows, ass_file_paths, output_path, watermark_path, has_audio=True):
+        rendered.update(windows=windows, ass=ass_file_paths, output=output_path)
+
+    with patch.object(main, "render_highlight_reel", fake_render), patch.object(main.os.path, "exists",
+                                                                                 return_value=True):
+        response, merged_paths, peak = run_pipeline(make_soundbites(), lambda start, end: None,
+                                                    render_mode="one_shot")
+
+    assert merged_paths is None and peak == 0  # nothing cut or merged separately
+    assert rendered["windows"] == [(30.0, 40.0), (0.0, 10.0), (15.0, 25.0)]
+    assert len(rendered["ass"]) == 3
+    assert response.merged_video_path == os.path.join(
+        "uploads", os.path.basename(rendered["output"]).replace(".mp4", "_final_highlight_reel.mp4"))
+
+
+def test_render_cache_reuses_unchanged_segments(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("uploads")
+    with open("uploads/sample.mp4", "wb") as f:
+        f.write(b"source video")
+    calls = {"cut": 0, "render": 0, "merge": 0}
+
+    async def fake_cut(input_path, start, end, output_path):
+        calls["cut"] += 1
+        with open(output_path, "wb") as f:
+            f.write(f"cut {start}".encode())
+
+    async def fake_render(video_path, output_path, ass_file_path, watermark_path, segment=None):
+        calls["render"] += 1
+        with open(output_path, "wb") as f:
+            f.write(b"rendered")
+
+    async def fake_merge(segment_paths, output_dir="uploads", suffix=""):
+        calls["merge"] += 1
+        merged = os.path.join(output_dir, f"merged_video_{calls['merge']}.mp4")
+        with open(merged, "wb") as f:
+            f.write(b"reel")
+        for segment in segment_paths:
+            os.remove(segment)
+        return merged
+
+    def make_transcript(third_text="third"):
+        return VideoTranscript(segments=[TranscriptSegment(start_time="00:00:01.000", text="first"),
+                                         TranscriptSegment(start_time="00:00:16.000", text="second"),
+                                         TranscriptSegment(start_time="00:00:31.000", text=third_text)])
+
+    async def run(transcript):
+        async def fake_llm(transcript):
+            return make_soundbites()
+
+        with patch.object(main, "retrieve_soundbites_with_llm", fake_llm), \
+                patch.object(main, "cut_video", fake_cut), \
+                patch.object(main, "render_segment", fake_render), \
+                patch.object(main, "merge_segments", fake_merge), \
+                patch.object(main, "render_cache", RenderCache(str(tmp_path / "cache"), max_bytes=10 ** 6)):
+            return await process_video_cut_request("uploads/sample.mp4", transcript, render_mode="segments")
+
+    response = asyncio.run(run(make_transcript()))
+    assert calls == {"cut": 3, "render": 3, "merge": 1}
+    assert response.workspace_peak_bytes > 0
+    assert os.listdir(os.path.join("uploads", "workspaces")) == []  # intermediates are gone
+
+    # only the subtitles of one soundbite change: the other two are reused, the reel is merged again
+    changed = make_transcript(third_text="edited third")
+    asyncio.run(run(changed))
+    assert calls == {"cut": 3, "render": 4, "merge": 2}
+
+    # nothing changes: the merged reel itself is reused
+    asyncio.run(run(changed))
+    assert calls == {"cut": 3, "render": 4, "merge": 2}
+
+
+def test_workspace_quota_fails_the_request(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("uploads")
+
+    async def big_cut(input_path, start, end, output_path):
+        with open(output_path, "wb") as f:
+            f.write(b"x" * 2000)
+
+    async def fake_llm(transcript):
+        return make_soundbites()
+
+    with patch.object(main, "retrieve_soundbites_with_llm", fake_llm), \
+            patch.object(main, "cut_video", big_cut), \
+            patch.object(main, "Workspace", lambda: Workspace(quota_bytes=1000)), \
+            patch.object(main, "render_cache", RenderCache("unused", max_bytes=0)):
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(process_video_cut_request("uploads/sample.mp4", VideoTranscript(segments=[])))
+
+    assert error.value.status_code == 507
+    assert os.listdir(os.path.join("uploads", "workspaces")) == []
+
+
+def test_workspace_quota_cancels_the_other_cuts_before_cleanup(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("uploads")
+    running = {"now": 0, "at_cleanup": None, "cancelled": 0}
+
+    class TrackedWorkspace(Workspace):
+        def cleanup(self):
+            running["at_cleanup"] = running["now"]
+            super().cleanup()
+
+    async def cut(input_path, start, end, output_path):
+        running["now"] += 1
+        try:
+            if start == "00:00:30.000":
+                with open(output_path, "wb") as f:
+                    f.write(b"x" * 2000)
+            else:
+                await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            running["cancelled"] += 1
+            raise
+        finally:
+            running["now"] -= 1
+
+    async def fake_llm(transcript):
+        return make_soundbites()
+
+    with patch.object(main, "retrieve_soundbites_with_llm", fake_llm), \
+            patch.object(main, "cut_video", cut), \
+            patch.object(main, "Workspace", lambda: TrackedWorkspace(quota_bytes=1000)), \
+            patch.object(main, "render_cache", RenderCache("unused", max_bytes=0)):
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(process_video_cut_request("uploads/sample.mp4", VideoTranscript(segments=[]), concurrency=3))
+
+    assert error.value.status_code == 507
+    assert running["cancelled"] == 2
+    assert running["at_cleanup"] == 0  # no cut was still writing into the workspace
+
+
+def test_profiles_render_every_rendition_from_one_pass():
+    profiles = [OUTPUT_PROFILES["landscape"], OUTPUT_PROFILES["vertical"]]
+    merged = []
+    render = AsyncMock()
+
+    async def fake_llm(transcript):
+        return make_soundbites()
+
+    async def fake_cut(input_path, start, end, output_path):
+        pass
+
+    async def fake_merge(segment_paths, output_dir="uploads", suffix=""):
+        merged.append((suffix, [os.path.basename(path) for path in segment_paths]))
+        return os.path.join(output_dir, f"merged_video_test{suffix}.mp4")
+
+    with patch.object(main, "retrieve_soundbites_with_llm", fake_llm), \
+            patch.object(main, "cut_video", fake_cut), \
+            patch.object(main, "write_ass_file"), \
+            patch.object(main, "render_segment_renditions", render), \
+            patch.object(main, "merge_segments", fake_merge), \
+            patch.object(main.os, "rename"), \
+            patch.object(main.shutil, "move"), \
+            patch.object(main, "render_cache", RenderCache("unused", max_bytes=0)):
+        response = asyncio.run(process_video_cut_request("uploads/sample.mp4", VideoTranscript(segments=[]),
+                                                         profiles=profiles))
+
+    assert render.call_count == 3  # one FFmpeg pass per soundbite for both renditions
+    assert [profile for profile, _ in render.call_args.args[1]] == profiles
+    assert [suffix for suffix, _ in merged] == ["_landscape", "_vertical"]
+    assert all(path.endswith("_rendered_vertical.mp4") for path in merged[1][1])
+    assert response.renditions == {
+        "landscape": os.path.join("uploads", "merged_video_test_landscape_final_highlight_reel.mp4"),
+        "vertical": os.path.join("uploads", "merged_video_test_vertical_final_highlight_reel.mp4"),
+    }
+    assert response.merged_video_path == response.renditions["landscape"]
+
+
+def test_preview_renders_one_small_pass_and_finalize_skips_the_llm():
+    rendered = {}
+    llm = AsyncMock(return_value=make_soundbites())
+
+    async def fake_render(video_path, windows, ass_file_paths, renditions, watermark_path, has_audio=True):
+        rendered["profiles"] = [profile for profile, _ in renditions]
+        return [path for _, path in renditions]
+
+    with patch.object(main, "retrieve_soundbites_with_llm", llm), \
+            patch.object(main, "write_ass_file"), \
+            patch.object(main, "render_highlight_reel_renditions", fake_render), \
+            patch.object(main, "render_highlight_reel", AsyncMock()) as full_render, \
+            patch.object(main.os.path, "exists", return_value=True), \
+            patch.object(main.shutil, "move"), \
+            patch.object(main, "render_cache", RenderCache("unused", max_bytes=0)):
+        preview = asyncio.run(process_video_cut_request("uploads/sample.mp4", VideoTranscript(segments=[]),
+                                                        preview=True))
+        asyncio.run(process_video_cut_request("uploads/sample.mp4", VideoTranscript(segments=[]),
+                                              render_mode="one_shot", soundbites=preview.soundbites))
+
+    assert rendered["profiles"] == [PREVIEW_PROFILE]
+    assert list(preview.renditions) == ["preview"]
+    assert llm.call_count == 1
+    assert full_render.call_count == 1
+
+
+def test_hls_mode_publishes_clips_without_merging(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "HLS_DIR", str(tmp_path))
+    added = []
+
+    async def fake_add_clip(self, index, rendered_path, segment=None):
+        added.append(index)
+
+    with patch.object(main.LivePlaylist, "add_clip", fake_add_clip):
+        response, merged_paths, _ = run_pipeline(make_soundbites(), lambda start, end: None, render_mode="hls")
+
+    assert merged_paths is None  # nothing is concatenated
+    assert sorted(added) == [0, 1, 2]
+    assert response.merged_video_path.startswith(str(tmp_path)) and response.merged_video_path.endswith("index.m3u8")
+    with open(response.merged_video_path) as f:
+        assert f.read().rstrip().endswith("#EXT-X-ENDLIST")
+
+
+def test_hls_mode_skips_a_clip_whose_render_raises(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "HLS_DIR", str(tmp_path))
+    added = []
+    process_soundbite = main.process_soundbite
+
+    async def fake_add_clip(self, index, rendered_path, segment=None):
+        added.append(index)
+
+    async def fail_second(video_path, soundbite, *args, **kwargs):
+        if soundbite.text == "first":
+            raise RuntimeError("encoder crashed")
+        return await process_soundbite(video_path, soundbite, *args, **kwargs)
+
+    with patch.object(main.LivePlaylist, "add_clip", fake_add_clip), \
+            patch.object(main, "process_soundbite", fail_second):
+        response, _, _ = run_pipeline(make_soundbites(), lambda start, end: None, render_mode="hls")
+
+    assert sorted(added) == [0, 2]
+    with open(response.merged_video_path) as f:
+        assert f.read().rstrip().endswith("#EXT-X-ENDLIST")
+
+
+def test_llm_cuts_are_snapped_to_pauses_before_cutting():
+    cuts = []
+
+    async def fake_snap(video_path, soundbites, concurrency):
+        return [soundbite.copy(update={"start_time": soundbite.start_time.replace(".000", ".250")})
+                for soundbite in soundbites]
+
+    with patch.object(main, "snap_soundbites", fake_snap):
+        response, _, _ = run_pipeline(make_soundbites(), lambda start, end: cuts.append(start))
+
+    assert sorted(cuts) == ["00:00:00.250", "00:00:15.250", "00:00:30.250"]
+    assert response.soundbites[0].start_time == "00:00:30.250"
+
+
+def test_soundbites_past_the_end_of_the_video_are_clamped_before_cutting():
+    cuts = []
+    soundbites = make_soundbites() + [Soundbite(start_time="00:01:00.000", end_time="00:01:10.000", text="late")]
+
+    with patch.object(main, "probe_metadata", AsyncMock(return_value={"duration": 35.0})):
+        response, _, _ = run_pipeline(soundbites, lambda start, end: cuts.append((start, end)))
+
+    assert sorted(cuts) == [("00:00:00.000", "00:00:10.000"), ("00:00:15.000", "00:00:25.000"),
+                            ("00:00:30.000", "00:00:35.000")]
+    assert [soundbite.text for soundbite in response.soundbites] == ["third", "first", "second"]
+    assert "metadata" in response.stage_timings
+
+
+def test_no_soundbite_within_the_video_is_rejected():
+    with patch.object(main, "probe_metadata", AsyncMock(return_value={"duration": 5.0})), \
+            pytest.raises(HTTPException) as error:
+        run_pipeline(make_soundbites()[:1], lambda start, end: None)
+
+    assert error.value.status_code == 422
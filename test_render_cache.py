@@ -0,0 +1,77 @@
+import os
+from collections import OrderedDict
+
+import render_cache
+from render_cache import RenderCache, file_hash
+
+
+def make_artifact(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_put_and_materialize(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), max_bytes=1000)
+    key = RenderCache.key(kind="cut", source="abc", start="00:00:01.000", end="00:00:05.000")
+
+    assert not cache.materialize(key, str(tmp_path / "out.mp4"))
+    cache.put(key, make_artifact(tmp_path, "cut.mp4", 10))
+
+    assert cache.materialize(key, str(tmp_path / "out.mp4"))
+    assert (tmp_path / "out.mp4").read_bytes() == b"x" * 10
+
+
+def test_keys_depend_on_every_part():
+    assert RenderCache.key(source="a", start="1") == RenderCache.key(start="1", source="a")
+    assert RenderCache.key(source="a", start="1") != RenderCache.key(source="a", start="2")
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), max_bytes=250)
+    keys = [RenderCache.key(index=index) for index in range(3)]
+
+    for index, key in enumerate(keys[:2]):
+        cache.put(key, make_artifact(tmp_path, f"{index}.mp4", 100))
+        os.utime(cache.get(key), (index, index))
+    # touching the oldest entry makes the second one the eviction candidate
+    assert cache.get(keys[0])
+    cache.put(keys[2], make_artifact(tmp_path, "2.mp4", 100))
+
+    assert cache.get(keys[0]) and cache.get(keys[2])
+    assert cache.get(keys[1]) is None
+    assert cache.stats()["total_bytes"] == 200
+
+
+def test_purge(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), max_bytes=1000)
+    keys = [RenderCache.key(index=index) for index in range(3)]
+    for key in keys:
+        cache.put(key, make_artifact(tmp_path, "a.mp4", 1))
+
+    assert cache.purge(keys[0]) == 1
+    assert cache.purge("../../etc/passwd") == 0
+    assert cache.purge() == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_disabled_cache_is_a_no_op(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), max_bytes=0)
+    cache.put("k", make_artifact(tmp_path, "a.mp4", 1))
+
+    assert cache.get("k") is None
+    assert not os.path.exists(tmp_path / "cache")
+
+
+def test_file_hash_is_content_based(tmp_path):
+    assert file_hash(make_artifact(tmp_path, "a.mp4", 5)) == file_hash(make_artifact(tmp_path, "b.mp4", 5))
+
+
+def test_file_hash_memory_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(render_cache, "FILE_HASH_MEMORY_ENTRIES", 2)
+    monkeypatch.setattr(render_cache, "_file_hashes", OrderedDict())
+    paths = [make_artifact(tmp_path, f"{index}.mp4", 1) for index in range(3)]
+    for path in paths:
+        file_hash(path)
+
+    assert [key[0] for key in render_cache._file_hashes] == [os.path.abspath(path) for path in paths[1:]]
@@ -0,0 +1,48 @@
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+import app as app_module
+from models import Soundbite, TranscriptSegment, VideoCutResponse, VideoTranscript
+from selections import SelectionStore
+
+TRANSCRIPT = VideoTranscript(segments=[TranscriptSegment(start_time="00:00:01.000", text="hello there")])
+SOUNDBITES = [Soundbite(start_time="00:00:01.000", end_time="00:00:04.000", text="hello there",
+                        file_path="uploads/segment.mp4", reasoning="greeting")]
+
+
+def test_selections_round_trip(tmp_path):
+    store = SelectionStore(str(tmp_path / "selections.sqlite3"))
+    selection_id = store.save("uploads/talk.mp4", TRANSCRIPT, SOUNDBITES)
+
+    video_path, transcript, soundbites = store.load(selection_id)
+    assert video_path == "uploads/talk.mp4"
+    assert transcript == TRANSCRIPT
+    assert soundbites[0].reasoning == "greeting"
+    assert soundbites[0].file_path is None  # paths of the preview's intermediates are not kept
+    assert store.load("missing") is None
+
+
+def test_selections_expire(tmp_path):
+    store = SelectionStore(str(tmp_path / "selections.sqlite3"), ttl_seconds=-1)
+
+    assert store.load(store.save("uploads/talk.mp4", TRANSCRIPT, SOUNDBITES)) is None
+
+
+def test_finalize_renders_the_previewed_soundbites(tmp_path, monkeypatch):
+    video = tmp_path / "talk.mp4"
+    video.write_bytes(b"video")
+    store = SelectionStore(str(tmp_path / "selections.sqlite3"))
+    selection_id = store.save(str(video), TRANSCRIPT, SOUNDBITES)
+    process = AsyncMock(return_value=VideoCutResponse(soundbites=SOUNDBITES, merged_video_path="reel.mp4"))
+
+    with patch.object(app_module, "selection_store", store), \
+            patch.object(app_module, "process_video_cut_request", process):
+        response = TestClient(app_module.app).post(f"/cut-video/finalize/{selection_id}?profiles=vertical")
+        missing = TestClient(app_module.app).post("/cut-video/finalize/unknown")
+
+    assert response.status_code == 200
+    assert process.call_args.kwargs["soundbites"][0].text == "hello there"
+    assert process.call_args.kwargs["preview"] is False
+    assert [profile.name for profile in process.call_args.kwargs["profiles"]] == ["vertical"]
+    assert missing.status_code == 404
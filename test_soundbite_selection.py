@@ -0,0 +1,110 @@
+import asyncio
+from unittest.mock import patch
+
+import main
+from llm_cache import SoundbiteCache
+from models import AllSoundbites, Soundbite, TranscriptSegment, VideoTranscript
+from soundbite_selection import dedupe_candidates, select_soundbites_map_reduce, split_transcript
+
+
+def timestamp(seconds):
+    return f"{seconds // 3600:02}:{seconds % 3600 // 60:02}:{seconds % 60:02}.000"
+
+
+def make_transcript(minutes):
+    return VideoTranscript(segments=[
+        TranscriptSegment(start_time=timestamp(second), text=f"line {second}") for second in range(0, minutes * 60, 10)
+    ])
+
+
+class FakeMapLLM:
+    """Proposes one 30s candidate at the start of every chunk; fails the first `failures` calls."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = 0
+        self.running = 0
+        self.peak = 0
+
+    async def ainvoke(self, inputs):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("rate limited")
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        first_time, first_text = inputs["transcript"].splitlines()[0].split("|")
+        start = int(first_time[:2]) * 3600 + int(first_time[3:5]) * 60 + int(first_time[6:8])
+        return AllSoundbites(soundbites=[
+            Soundbite(start_time=timestamp(start), end_time=timestamp(start + 30), text=first_text)
+        ])
+
+
+class FakeReduceLLM:
+    """Keeps the first `final_count` candidates."""
+
+    def __init__(self):
+        self.inputs = None
+
+    async def ainvoke(self, inputs):
+        self.inputs = inputs
+        lines = inputs["candidates"].splitlines()[:inputs["final_count"]]
+        return AllSoundbites(soundbites=[
+            Soundbite(start_time=line.split("|")[0], end_time=line.split("|")[1], text=line.split("|")[2])
+            for line in lines
+        ])
+
+
+def test_split_transcript_windows_overlap():
+    chunks = split_transcript(make_transcript(10), window_seconds=300, overlap_seconds=60)
+
+    assert [chunk.segments[0].start_time for chunk in chunks] == ["00:00:00.000", "00:04:00.000", "00:08:00.000"]
+    assert chunks[0].segments[-1].start_time == "00:04:50.000"
+    assert chunks[1].segments[0].start_time == "00:04:00.000"  # the last minute of chunk 0 is repeated
+
+
+def test_dedupe_drops_overlapping_candidates():
+    candidates = [
+        Soundbite(start_time="00:01:00.000", end_time="00:01:30.000", text="b"),
+        Soundbite(start_time="00:00:00.000", end_time="00:00:30.000", text="a"),
+        Soundbite(start_time="00:00:05.000", end_time="00:00:35.000", text="a again"),
+    ]
+
+    assert [candidate.text for candidate in dedupe_candidates(candidates)] == ["a", "b"]
+
+
+def test_map_reduce_end_to_end_with_fake_llm():
+    map_llm, reduce_llm = FakeMapLLM(failures=1), FakeReduceLLM()
+
+    result = asyncio.run(select_soundbites_map_reduce(
+        make_transcript(120), map_llm, reduce_llm, window_seconds=600, overlap_seconds=60, concurrency=3,
+        backoff_seconds=0, final_count=10,
+    ))
+
+    assert len(result.soundbites) == 10
+    assert map_llm.peak <= 3
+    assert map_llm.calls == len(split_transcript(make_transcript(120), 600, 60)) + 1  # one retried call
+    assert len(reduce_llm.inputs["candidates"].splitlines()) > 10
+
+
+def test_long_transcripts_use_map_reduce():
+    map_llm, reduce_llm = FakeMapLLM(), FakeReduceLLM()
+    disabled_cache = SoundbiteCache("unused.sqlite3", ttl_seconds=0, max_entries=0)
+
+    chains = {"soundbite_candidates": map_llm, "soundbite_ranking": reduce_llm}
+
+    with patch.object(main, "get_chain", chains.__getitem__), \
+            patch.object(main, "soundbite_cache", disabled_cache), \
+            patch.object(main, "LLM_CHUNK_SECONDS", 600):
+        soundbites = asyncio.run(main.retrieve_soundbites_with_llm(make_transcript(120)))
+
+    assert len(soundbites) == 10
+    assert map_llm.calls > 1
+
+
+def test_llm_output_schema_has_no_response_fields():
+    fields = set(AllSoundbites.schema()["properties"])
+
+    assert fields == {"soundbites", "merged_video_path"}
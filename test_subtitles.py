@@ -0,0 +1,131 @@
+import pytest
+
+from models import OUTPUT_PROFILES, OutputProfile
+from subtitles import build_reel_command, build_reel_renditions_command, build_render_command, \
+    build_renditions_command, escape_filter_path
+
+
+def test_render_command_chains_subtitles_and_watermark():
+    command = build_render_command("in_cut.mp4", "out.mp4", ass_file_path="subs.ass", watermark_path="wm.png")
+
+    assert command.count("-i") == 2
+    graph = command[command.index("-filter_complex") + 1]
+    assert graph == "[0:v]ass='subs.ass'[sub];[sub][1:v]overlay=W-w-100:H-h-700[wm]"
+    assert command[command.index("-map") + 1] == "[wm]"
+    assert command.count("libx264") == 1
+    assert command[-1] == "out.mp4"
+
+
+def test_render_command_subtitles_only():
+    command = build_render_command("in_cut.mp4", "out.mp4", ass_file_path="subs.ass")
+
+    assert command.count("-i") == 1
+    assert command[command.index("-filter_complex") + 1] == "[0:v]ass='subs.ass'[sub]"
+
+
+def test_render_command_watermark_only():
+    command = build_render_command("in_cut.mp4", "out.mp4", watermark_path="wm.png")
+
+    assert command[command.index("-filter_complex") + 1] == "[0:v][1:v]overlay=W-w-100:H-h-700[wm]"
+
+
+def test_render_command_requires_a_filter():
+    with pytest.raises(ValueError):
+        build_render_command("in_cut.mp4", "out.mp4")
+
+
+def test_escape_filter_path():
+    assert escape_filter_path("C:\\clips\\it's.ass") == "C\\:/clips/it'\\''s.ass"
+
+
+def test_reel_command_single_decode_for_chronological_windows():
+    command = build_reel_command("src.mp4", [(1.0, 5.5), (10.0, 12.25)], ["a.ass", None], "reel.mp4",
+                                 watermark_path="wm.png")
+
+    assert command.count("-i") == 2  # the source once, the watermark once
+    graph = command[command.index("-filter_complex") + 1]
+    assert "[0:v]split=2[src_v0][src_v1]" in graph
+    assert "[src_v1]trim=start=10.000:end=12.250,setpts=PTS-STARTPTS[trim_v1]" in graph
+    assert "[trim_v0]ass='a.ass'[v0]" in graph
+    assert "[trim_v1]null[v1]" in graph
+    assert "[v0][a0][v1][a1]concat=n=2:v=1:a=1[reel_v][reel_a]" in graph
+    assert "[reel_v][1:v]overlay=W-w-100:H-h-700[wm]" in graph
+    assert command.count("libx264") == 1
+
+
+def test_reel_command_seeks_each_input_when_out_of_order():
+    command = build_reel_command("src.mp4", [(10.0, 12.0), (1.0, 5.0)], [None, None], "reel.mp4",
+                                 watermark_path="wm.png")
+
+    assert command.count("-i") == 3
+    assert command[1:9] == ["-y", "-ss", "10.000", "-to", "12.000", "-i", "src.mp4", "-ss"]
+    graph = command[command.index("-filter_complex") + 1]
+    assert "split" not in graph
+    assert "[reel_v][2:v]overlay" in graph
+
+
+def test_reel_command_seeks_each_input_when_windows_are_sparse():
+    # a preview of a long episode: decoding from 0 to 3000 s for 20 s of clips would dominate the render
+    command = build_reel_command("src.mp4", [(100.0, 110.0), (2990.0, 3000.0)], [None, None], "reel.mp4")
+
+    assert command[1:8] == ["-y", "-ss", "100.000", "-to", "110.000", "-i", "src.mp4"]
+    assert command.count("-i") == 2
+    assert "split" not in command[command.index("-filter_complex") + 1]
+
+
+def test_reel_command_generates_silence_for_sources_without_audio():
+    # single decode and seeked inputs
+    for windows in ([(1.0, 5.5), (6.0, 12.25)], [(100.0, 110.0), (2990.0, 2996.25)]):
+        command = build_reel_command("src.mp4", windows, [None, None], "reel.mp4", has_audio=False)
+
+        graph = command[command.index("-filter_complex") + 1]
+        assert ":a]" not in graph
+        assert "anullsrc=r=48000:cl=stereo,atrim=duration=6.250[a1]" in graph
+        assert "[v0][a0][v1][a1]concat=n=2:v=1:a=1[reel_v][reel_a]" in graph
+
+
+def test_reel_command_rejects_mismatched_subtitles():
+    with pytest.raises(ValueError):
+        build_reel_command("src.mp4", [(0.0, 1.0)], [], "reel.mp4")
+
+
+def test_renditions_command_decodes_the_segment_once():
+    renditions = [(OUTPUT_PROFILES["landscape"], "out_landscape.mp4"),
+                  (OUTPUT_PROFILES["vertical"], "out_vertical.mp4")]
+    command = build_renditions_command("in_cut.mp4", renditions, ass_file_path="subs.ass", watermark_path="wm.png")
+
+    assert command.count("-i") == 2
+    graph = command[command.index("-filter_complex") + 1]
+    assert "[0:v]split=2[src_v0][src_v1]" in graph
+    assert "[1:v]split=2[wm_in0][wm_in1]" in graph
+    assert ("[src_v1]scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920,setsar=1,"
+            "subtitles='subs.ass':force_style='MarginV=120'[fit1]") in graph
+    assert "[fit0][wm_in0]overlay=W-w-100:H-h-700[out0]" in graph
+    assert "[fit1][wm_in1]overlay=(W-w)/2:200[out1]" in graph
+    assert command[-1] == "out_vertical.mp4"
+    assert command.count("-b:v") == 2 and "6M" in command
+
+
+def test_pad_profile_letterboxes():
+    profile = OutputProfile(name="wide", width=1280, height=720, fit="pad")
+    command = build_renditions_command("in_cut.mp4", [(profile, "out.mp4")])
+
+    graph = command[command.index("-filter_complex") + 1]
+    assert graph == "[0:v]scale=1280:720:force_original_aspect_ratio=decrease,pad=1280:720:(ow-iw)/2:(oh-ih)/2," \
+                    "setsar=1[fit0]"
+    assert "-b:v" not in command
+
+
+def test_reel_renditions_share_the_decode_and_the_audio():
+    renditions = [(OUTPUT_PROFILES["square"], "square.mp4"), (OUTPUT_PROFILES["vertical"], "vertical.mp4")]
+    command = build_reel_renditions_command("src.mp4", [(1.0, 5.5), (10.0, 12.25)], ["a.ass", None], renditions,
+                                            watermark_path="wm.png")
+
+    assert command.count("-i") == 2
+    graph = command[command.index("-filter_complex") + 1]
+    assert "[trim_v0]split=2[clip0_0][clip0_1]" in graph
+    assert "[a0][a1]concat=n=2:v=0:a=1[reel_a]" in graph
+    assert "[reel_a]asplit=2[reel_a0][reel_a1]" in graph
+    assert "[v0_1][v1_1]concat=n=2:v=1:a=0[reel_v1]" in graph
+    assert "[reel_v0][wm_in0]overlay=W-w-60:60[wm0]" in graph
+    assert command[-1] == "vertical.mp4"
@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from tracing import Metrics, Tracer, current_run_id
+
+
+def test_spans_nest_and_feed_the_metrics():
+    metrics = Metrics()
+    tracer = Tracer(metrics, trace_dir="")
+
+    with tracer.span("cut", segment="[00:00:01 - 00:00:05]") as parent:
+        with tracer.span("ffmpeg.cut") as child:
+            child.set(speed=3.0, out_time=None)
+            assert tracer.current() is child
+    with pytest.raises(RuntimeError):
+        with tracer.span("merge"):
+            raise RuntimeError("boom")
+
+    assert child.parent_id == parent.span_id and parent.parent_id is None
+    assert "out_time" not in child.attributes
+    text = metrics.render()
+    assert 'video_recap_stage_duration_seconds_count{stage="cut",status="ok"} 1' in text
+    assert 'video_recap_stage_duration_seconds_count{stage="merge",status="error"} 1' in text
+    assert 'video_recap_stage_duration_seconds_bucket{stage="cut",status="ok",le="+Inf"} 1' in text
+    assert 'video_recap_ffmpeg_speed_bucket{stage="ffmpeg.cut",le="2"} 0' in text
+    assert 'video_recap_ffmpeg_speed_bucket{stage="ffmpeg.cut",le="4"} 1' in text
+
+
+def test_span_counts_file_bytes(tmp_path):
+    source, output = tmp_path / "in.mp4", tmp_path / "out.mp4"
+    source.write_bytes(b"x" * 100)
+    metrics = Metrics()
+
+    with Tracer(metrics, trace_dir="").span("render") as span:
+        span.files(inputs=[str(source)], outputs=[str(output)])
+        output.write_bytes(b"x" * 40)  # outputs are measured when the span ends
+
+    assert (span.attributes["bytes_in"], span.attributes["bytes_out"]) == (100, 40)
+    assert 'video_recap_stage_bytes_out_total{stage="render"} 40' in metrics.render()
+
+
+def test_run_trace_is_exported(tmp_path):
+    tracer = Tracer(Metrics(), trace_dir=str(tmp_path))
+
+    async def run():
+        current_run_id.set("job/1")
+        with tracer.span("request"):
+            await asyncio.gather(*(segment(i) for i in range(2)))
+
+    async def segment(index):
+        with tracer.span("render", segment=str(index)):
+            await asyncio.sleep(0)
+
+    asyncio.run(run())
+    path = tracer.export("job/1")
+
+    assert path == str(tmp_path / "job_1.json")
+    with open(path) as f:
+        events = json.load(f)["traceEvents"]
+    assert [event["name"] for event in events] == ["request", "render", "render"]
+    assert {event["args"]["parent_id"] for event in events[1:]} == {events[0]["args"]["span_id"]}
+    assert len({event["tid"] for event in events}) == 3  # concurrent segments get rows of their own
+    assert tracer.export("job/1") is None
+
+
+def test_metrics_endpoint():
+    import app as app_module
+
+    response = TestClient(app_module.app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE video_recap_stage_duration_seconds histogram" in response.text
@@ -0,0 +1,37 @@
+from unittest.mock import patch
+
+import transcript_format
+from models import TranscriptSegment, VideoTranscript
+from transcript_format import encode_transcript_compact, transcript_token_report
+
+
+def make_transcript():
+    return VideoTranscript(segments=[
+        TranscriptSegment(start_time="00:00:01.000", text="Hello   there"),
+        TranscriptSegment(start_time="00:00:03.500", text="how are you"),
+        TranscriptSegment(start_time="00:00:06.000", text="doing today, my friend?"),
+    ])
+
+
+def test_compact_encoding_one_line_per_segment():
+    assert encode_transcript_compact(make_transcript()) == (
+        "00:00:01.000|Hello there\n"
+        "00:00:03.500|how are you\n"
+        "00:00:06.000|doing today, my friend?"
+    )
+
+
+def test_adjacent_segments_merge_within_token_budget():
+    with patch.object(transcript_format, "count_tokens", side_effect=lambda text, model: len(text.split())):
+        encoded = encode_transcript_compact(make_transcript(), merge_tokens=5)
+
+    assert encoded == "00:00:01.000|Hello there how are you\n00:00:06.000|doing today, my friend?"
+
+
+def test_compact_encoding_is_much_smaller_than_repr():
+    transcript = VideoTranscript(segments=make_transcript().segments * 100)
+
+    report = transcript_token_report(transcript, encode_transcript_compact(transcript))
+
+    assert report["compact_tokens"] < report["repr_tokens"]
+    assert report["reduction"] > 0.3
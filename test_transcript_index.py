@@ -0,0 +1,46 @@
+import pytest
+
+from models import Soundbite, TranscriptSegment
+from subtitles import match_soundbite_with_transcript
+from transcript_index import TranscriptIndex, parse_timestamp_ms
+
+
+def make_index():
+    return TranscriptIndex.from_segments([
+        TranscriptSegment(start_time="00:00:05.000", text="one"),
+        TranscriptSegment(start_time="00:00:10.000", text="two"),
+        TranscriptSegment(start_time="00:00:15.500", text="three"),
+        TranscriptSegment(start_time="00:01:00.000", text="four"),
+    ])
+
+
+def test_parse_timestamp_ms():
+    assert parse_timestamp_ms("00:00:01.001") == 1001
+    assert parse_timestamp_ms("01:02:03.4") == 3723400
+    assert parse_timestamp_ms("00:00:10") == 10000
+    assert parse_timestamp_ms("02:30") == 150000
+    with pytest.raises(ValueError):
+        parse_timestamp_ms("ten seconds")
+
+
+def test_range_query_is_inclusive():
+    assert make_index().text_between(10000, 15500) == "two three"
+    assert make_index().segments_between(0, 9999) == [(5000, "one")]
+    assert make_index().text_between(70000, 80000) == ""
+
+
+def test_timestamps_without_milliseconds_match():
+    # "00:00:10" sorts after "00:00:10.000" as a string, so the old scan dropped the segment
+    soundbite = Soundbite(start_time="00:00:10", end_time="00:00:20", text="")
+
+    assert match_soundbite_with_transcript(soundbite, make_index()) == "two three"
+
+
+def test_out_of_order_segments_are_sorted():
+    index = TranscriptIndex.from_segments([
+        TranscriptSegment(start_time="00:00:10.000", text="b"),
+        TranscriptSegment(start_time="00:00:05.000", text="a"),
+    ])
+
+    assert list(index.starts_ms) == [5000, 10000]
+    assert index.text_between(0, 10000) == "a b"
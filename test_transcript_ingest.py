@@ -0,0 +1,38 @@
+import io
+
+from transcript_ingest import ingest_transcript, iter_file_lines
+
+TACTIQ_TRANSCRIPT = """# tactiq.io free youtube transcript
+# Example video
+# https://www.youtube.com/watch/M-ZH3psUbfU
+
+00:00:01.000 Hello and welcome
+00:00:04.250 to the show
+
+00:00:09.000   today we talk about video
+"""
+
+
+def test_ingest_builds_model_and_index_in_one_pass():
+    transcript, index = ingest_transcript(TACTIQ_TRANSCRIPT.splitlines())
+
+    assert [segment.start_time for segment in transcript.segments] == ["00:00:01.000", "00:00:04.250", "00:00:09.000"]
+    assert transcript.segments[2].text == "today we talk about video"
+    assert list(index.starts_ms) == [1000, 4250, 9000]
+    assert index.text_between(0, 5000) == "Hello and welcome to the show"
+
+
+def test_ingest_streams_binary_files_and_leaves_them_open():
+    upload = io.BytesIO(TACTIQ_TRANSCRIPT.replace("\n", "\r\n").encode("utf-8"))
+
+    transcript, _ = ingest_transcript(iter_file_lines(upload))
+
+    assert len(transcript.segments) == 3
+    assert transcript.segments[0].text == "Hello and welcome"
+    assert not upload.closed
+
+
+def test_out_of_order_lines_still_index_correctly():
+    _, index = ingest_transcript(["00:00:05.000 b", "00:00:01.000 a"])
+
+    assert index.text_between(0, 10000) == "a b"
@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+import os
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+import app as app_module
+import upload_stream
+from models import VideoCutResponse
+from upload_stream import receive_multipart, store_upload
+
+TRANSCRIPT = b"# tactiq.io free youtube transcript\n00:00:01.000 hello there\n00:00:04.500 general kenobi\n"
+BOUNDARY = "test-boundary"
+
+
+def multipart_body(files):
+    """Encodes {field: (filename, content)} as a multipart/form-data body."""
+    body = b""
+    for name, (filename, content) in files.items():
+        body += (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"{filename}\"\r\n"
+                 f"Content-Type: application/octet-stream\r\n\r\n").encode() + content + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def test_parts_are_streamed_hashed_and_probed_early(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_stream, "UPLOAD_CHUNK_SIZE", 1000)
+    monkeypatch.setattr(upload_stream, "PROBE_HEADER_BYTES", 5000)
+    video = os.urandom(50_000)
+    probed = {}
+
+    async def probe(part):
+        probed["bytes_on_disk"] = os.path.getsize(part.path)
+
+    class StreamedRequest:
+        """Delivers the body in small chunks, like a slow client would."""
+        headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+        async def stream(self):
+            body = multipart_body({"video_file": ("talk.mp4", video), "transcript_file": ("t.txt", TRANSCRIPT)})
+            for offset in range(0, len(body), 4096):
+                yield body[offset:offset + 4096]
+
+    received = asyncio.run(receive_multipart(StreamedRequest(), str(tmp_path), on_probe_ready=probe))
+
+    assert received["video_file"].sha256 == hashlib.sha256(video).hexdigest()
+    assert received["video_file"].size == len(video)
+    with open(received["video_file"].path, "rb") as f:
+        assert f.read() == video
+    assert received["transcript_file"].size == len(TRANSCRIPT)
+    assert 5000 <= probed["bytes_on_disk"] < len(video)  # probed while the upload was still running
+
+
+def test_stored_uploads_are_content_addressed(tmp_path):
+    paths = []
+    for _ in range(2):
+        part = upload_stream.UploadedPart("video_file", "Talk.MP4", str(tmp_path / f"{len(paths)}.part"))
+        part.feed(b"same video")
+        part.close()
+        with open(part.path, "wb") as f:
+            f.write(b"same video")
+        paths.append(store_upload(part, str(tmp_path)))
+
+    assert paths[0] == paths[1] == str(tmp_path / f"{hashlib.sha256(b'same video').hexdigest()}.mp4")
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(paths[0])]
+
+
+def test_upload_endpoint_cuts_the_uploaded_video(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "UPLOAD_DIR", str(tmp_path))
+    media_info = {"duration": 12.0, "video_codec": "h264", "width": 1280, "height": 720, "has_audio": True}
+    process = AsyncMock(return_value=VideoCutResponse(soundbites=[], merged_video_path="reel.mp4"))
+
+    with patch.object(app_module, "probe_media_info", AsyncMock(return_value=media_info)), \
+            patch.object(app_module, "process_video_cut_request", process):
+        response = TestClient(app_module.app).post(
+            "/cut-video/upload/",
+            files={"video_file": ("talk.mp4", b"video bytes", "video/mp4"),
+                   "transcript_file": ("t.txt", TRANSCRIPT, "text/plain")},
+        )
+
+    assert response.status_code == 200
+    assert response.json()["source"]["sha256"] == hashlib.sha256(b"video bytes").hexdigest()
+    video_path, transcript = process.call_args.args
+    assert video_path == os.path.join(str(tmp_path), f"{hashlib.sha256(b'video bytes').hexdigest()}.mp4")
+    assert [segment.text for segment in transcript.segments] == ["hello there", "general kenobi"]
+    assert os.listdir(tmp_path) == [os.path.basename(video_path)]  # the transcript part is removed
+
+
+def test_upload_without_a_video_stream_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "UPLOAD_DIR", str(tmp_path))
+    no_video = {"duration": None, "video_codec": None, "width": None, "height": None, "has_audio": False}
+
+    with patch.object(app_module, "probe_media_info", AsyncMock(return_value=no_video)):
+        response = TestClient(app_module.app).post(
+            "/cut-video/upload/",
+            files={"video_file": ("notes.txt", b"not a video", "text/plain"),
+                   "transcript_file": ("t.txt", TRANSCRIPT, "text/plain")},
+        )
+
+    assert response.status_code == 415
+    assert os.listdir(tmp_path) == []
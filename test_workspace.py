@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+from workspace import Workspace, WorkspaceQuotaExceeded
+
+
+def test_workspaces_are_isolated_and_removed(tmp_path):
+    first, second = Workspace(str(tmp_path)), Workspace(str(tmp_path))
+    for workspace in (first, second):
+        with open(workspace.file("segment_00_00_01.000_00_00_05.000.mp4"), "wb") as f:
+            f.write(b"x" * 100)
+
+    assert first.file("a.mp4") != second.file("a.mp4")
+    first.cleanup()
+    assert not os.path.exists(first.path)
+    assert os.path.exists(second.file("segment_00_00_01.000_00_00_05.000.mp4"))
+
+
+def test_peak_usage_is_kept_after_release(tmp_path):
+    workspace = Workspace(str(tmp_path), quota_bytes=1000)
+    for name in ("cut.mp4", "rendered.mp4"):
+        with open(workspace.file(name), "wb") as f:
+            f.write(b"x" * 300)
+
+    assert workspace.check() == 600
+    workspace.release(workspace.file("cut.mp4"), workspace.file("missing.ass"))
+    assert workspace.usage() == 300
+    assert workspace.peak_bytes == 600
+
+
+def test_quota_is_enforced(tmp_path):
+    workspace = Workspace(str(tmp_path), quota_bytes=500)
+    with open(workspace.file("cut.mp4"), "wb") as f:
+        f.write(b"x" * 501)
+
+    with pytest.raises(WorkspaceQuotaExceeded):
+        workspace.check()
@@ -0,0 +1,222 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+# Request (or job) id that progress events and spans of the current task are tagged with
+current_run_id: ContextVar[Optional[str]] = ContextVar("current_run_id", default=None)
+
+# Directory for one Chrome trace file (chrome://tracing, Perfetto) per request/job, "" = no trace files
+TRACE_DIR = os.getenv("TRACE_DIR", "")
+# spans of at most this many runs are kept in memory until their trace file is written
+TRACE_MAX_RUNS = 100
+
+METRICS_PREFIX = "video_recap"
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+SPEED_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)  # x realtime
+
+_span_ids = count(1)
+
+
+def file_size(path: Optional[str]) -> int:
+    try:
+        return os.path.getsize(path) if path else 0
+    except OSError:
+        return 0
+
+
+class Span:
+    """One timed operation of a run (a pipeline stage or an FFmpeg process) with its attributes."""
+
+    def __init__(self, name: str, run_id: Optional[str], parent: Optional["Span"], attributes: Dict):
+        self.name = name
+        self.run_id = run_id
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = {key: value for key, value in attributes.items() if value is not None}
+        self.status = "ok"
+        self.started_at = time.time()
+        self.duration = 0.0
+        self._started = time.perf_counter()
+        self._outputs: List[str] = []
+        try:
+            self.lane = id(asyncio.current_task())
+        except RuntimeError:
+            self.lane = threading.get_ident()
+
+    def set(self, **attributes):
+        self.attributes.update((key, value) for key, value in attributes.items() if value is not None)
+
+    def files(self, inputs: Iterable[str] = (), outputs: Iterable[str] = ()):
+        """Counts the size of the input files now and of the output files when the span ends."""
+        self.attributes["bytes_in"] = self.attributes.get("bytes_in", 0) + sum(file_size(path) for path in inputs)
+        self._outputs += list(outputs)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+        if self._outputs:
+            self.attributes["bytes_out"] = self.attributes.get("bytes_out", 0) + sum(map(file_size, self._outputs))
+
+
+### METRICS ###
+
+def format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{key}="{escape(str(value))}"' for key, value in labels) + "}" if labels else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series: Dict[Tuple, List] = {}  # labels -> [bucket counts, sum, count]
+
+    def observe(self, labels: Tuple[Tuple[str, str], ...], value: float):
+        counts, total, observations = self._series.get(labels) or ([0] * len(self.buckets), 0.0, 0)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        self._series[labels] = [counts, total + value, observations + 1]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, observations) in sorted(self._series.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{format_labels(labels + (('le', f'{bound:g}'),))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{format_labels(labels + (('le', '+Inf'),))} {observations}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {observations}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._series: Dict[Tuple, float] = {}
+
+    def inc(self, labels: Tuple[Tuple[str, str], ...], value: float):
+        self._series[labels] = self._series.get(labels, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{format_labels(labels)} {value:g}" for labels, value in sorted(self._series.items())]
+        return lines
+
+
+class Metrics:
+    """Aggregates finished spans into Prometheus histograms and counters (per process)."""
+
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self._lock = threading.Lock()
+        self.durations = Histogram(f"{prefix}_stage_duration_seconds", "Wall time of pipeline stages and FFmpeg "
+                                   "processes.", DURATION_BUCKETS)
+        self.speeds = Histogram(f"{prefix}_ffmpeg_speed", "FFmpeg processing speed (x realtime) per stage.",
+                                SPEED_BUCKETS)
+        self.bytes_in = Counter(f"{prefix}_stage_bytes_in_total", "Bytes of the input files read by stages.")
+        self.bytes_out = Counter(f"{prefix}_stage_bytes_out_total", "Bytes of the output files written by stages.")
+
+    def record(self, span: Span):
+        labels = (("stage", span.name),)
+        with self._lock:
+            self.durations.observe(labels + (("status", span.status),), span.duration)
+            if span.attributes.get("speed"):
+                self.speeds.observe(labels, span.attributes["speed"])
+            if span.attributes.get("bytes_in"):
+                self.bytes_in.inc(labels, span.attributes["bytes_in"])
+            if span.attributes.get("bytes_out"):
+                self.bytes_out.inc(labels, span.attributes["bytes_out"])
+
+    def render(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            lines = []
+            for metric in (self.durations, self.speeds, self.bytes_in, self.bytes_out):
+                lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+### TRACING ###
+
+class Tracer:
+    """
+    Wraps pipeline stages in spans: durations, bytes in/out and FFmpeg speed are aggregated into metrics and,
+    with a trace_dir, the spans of every run are written as one Chrome trace file when the run ends.
+    """
+
+    def __init__(self, metrics: Metrics, trace_dir: str = TRACE_DIR, max_runs: int = TRACE_MAX_RUNS):
+        self.metrics = metrics
+        self.trace_dir = trace_dir
+        self.max_runs = max_runs
+        self._current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+        self._runs: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Times the block as a child of the current span, tagged with the current run id."""
+        span = Span(name, current_run_id.get(), self._current.get(), attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except asyncio.CancelledError:
+            span.status = "cancelled"
+            raise
+        except BaseException:
+            span.status = "error"
+            raise
+        finally:
+            self._current.reset(token)
+            span.finish()
+            self.metrics.record(span)
+            self._keep(span)
+
+    def current(self) -> Optional[Span]:
+        return self._current.get()
+
+    def _keep(self, span: Span):
+        if not self.trace_dir or not span.run_id:
+            return
+        with self._lock:
+            self._runs.setdefault(span.run_id, []).append(span)
+            self._runs.move_to_end(span.run_id)
+            while len(self._runs) > self.max_runs:
+                self._runs.popitem(last=False)
+
+    def export(self, run_id: str) -> Optional[str]:
+        """Writes the spans of a finished run to <trace_dir>/<run_id>.json and forgets them."""
+        with self._lock:
+            spans = self._runs.pop(run_id, None)
+        if not self.trace_dir or not spans:
+            return None
+
+        lanes: Dict[int, int] = {}
+        events = [{
+            "name": span.name, "cat": span.status, "ph": "X", "pid": os.getpid(),
+            "tid": lanes.setdefault(span.lane, len(lanes) + 1),  # one row per task, so nested spans line up
+            "ts": int(span.started_at * 1_000_000), "dur": int(span.duration * 1_000_000),
+            "args": {"span_id": span.span_id, "parent_id": span.parent_id, **span.attributes},
+        } for span in sorted(spans, key=lambda span: span.started_at)]
+
+        os.makedirs(self.trace_dir, exist_ok=True)
+        path = os.path.join(self.trace_dir, f"{''.join(c if c.isalnum() or c in '-_' else '_' for c in run_id)}.json")
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"run_id": run_id}}, f)
+        logger.info(f"Wrote trace of run {run_id} ({len(spans)} spans) to {path}")
+        return path
+
+
+metrics = Metrics()
+tracer = Tracer(metrics)
+span = tracer.span
@@ -0,0 +1,70 @@
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from models import VideoTranscript
+
+TRANSCRIPT_LINE_SEPARATOR = "|"
+
+
+### TOKEN COUNTING ###
+
+@lru_cache(maxsize=None)
+def _token_encoding(model: str):
+    """Loads the tiktoken encoding for the model, or None if tiktoken or its encoding files are unavailable."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads its encoding files on first use, which fails on offline hosts
+        logger.warning(f"Falling back to estimated token counts: {str(e)}")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Counts tokens with tiktoken when it is available, otherwise estimates ~4 characters per token."""
+    encoding = _token_encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
+
+
+### COMPACT ENCODING ###
+
+def encode_transcript_compact(transcript: VideoTranscript, merge_tokens: Optional[int] = None,
+                              model: str = "gpt-4o") -> str:
+    """
+    Serializes the transcript as one `start_time|text` line per segment instead of the pydantic repr.
+    With merge_tokens, adjacent segments are merged (keeping the first start time) while the merged
+    text stays within that many tokens (segment token counts are summed, so each segment is counted once).
+    """
+    lines: List[List] = []  # [start_time, text, tokens]
+    for segment in transcript.segments:
+        text = " ".join(segment.text.split())
+        tokens = count_tokens(text, model) if merge_tokens else 0
+        if merge_tokens and lines and lines[-1][2] + tokens <= merge_tokens:
+            lines[-1][1] = f"{lines[-1][1]} {text}"
+            lines[-1][2] += tokens
+            continue
+        lines.append([segment.start_time.strip(), text, tokens])
+
+    return "\n".join(f"{start_time}{TRANSCRIPT_LINE_SEPARATOR}{text}" for start_time, text, _ in lines)
+
+
+def transcript_token_report(transcript: VideoTranscript, encoded: str, model: str = "gpt-4o") -> Dict[str, float]:
+    """Compares the token count of the compact encoding with the pydantic repr the prompt used to receive."""
+    repr_tokens = count_tokens(repr(transcript), model)
+    compact_tokens = count_tokens(encoded, model)
+    return {
+        "repr_tokens": repr_tokens,
+        "compact_tokens": compact_tokens,
+        "reduction": round(1 - compact_tokens / repr_tokens, 3) if repr_tokens else 0.0,
+    }
@@ -0,0 +1,64 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterable, List, Tuple
+
+from models import TranscriptSegment
+
+TIMESTAMP_PATTERN = re.compile(r"^(?:(\d+):)?(\d{1,2}):(\d{1,2})(?:[.,](\d{1,3}))?$")
+
+
+def parse_timestamp_ms(timestamp: str) -> int:
+    """
+    Parses 'hh:mm:ss.mmm', 'hh:mm:ss' or 'mm:ss' into integer milliseconds.
+    Integer arithmetic only, so '00:00:01.001' is exactly 1001 (float parsing rounds it down to 1000).
+    """
+    match = TIMESTAMP_PATTERN.match(timestamp.strip())
+    if not match:
+        raise ValueError(f"Invalid timestamp: {timestamp!r}")
+    hours, minutes, seconds, fraction = match.groups()
+    milliseconds = int(fraction.ljust(3, "0")) if fraction else 0
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + milliseconds
+
+
+def format_timestamp_ms(ms: int) -> str:
+    """Formats integer milliseconds as 'hh:mm:ss.mmm', the inverse of parse_timestamp_ms."""
+    return f"{ms // 3600000:02}:{ms % 3600000 // 60000:02}:{ms % 60000 // 1000:02}.{ms % 1000:03}"
+
+
+class TranscriptIndex:
+    """
+    Transcript segments with their start times parsed once into a compact array of integer milliseconds,
+    so time-range queries are binary searches instead of scans with string comparisons.
+    """
+
+    def __init__(self, starts_ms: Iterable[int], texts: List[str]):
+        self.starts_ms = array("q", starts_ms)
+        self.texts = texts
+        if len(self.starts_ms) != len(self.texts):
+            raise ValueError("Every segment needs a start time and a text.")
+
+    @classmethod
+    def from_segments(cls, segments: Iterable[TranscriptSegment]) -> "TranscriptIndex":
+        """Builds the index, sorting segments by start time if the transcript is out of order."""
+        parsed = [(parse_timestamp_ms(segment.start_time), segment.text) for segment in segments]
+        if any(previous[0] > current[0] for previous, current in zip(parsed, parsed[1:])):
+            parsed.sort(key=lambda item: item[0])
+        return cls((start_ms for start_ms, _ in parsed), [text for _, text in parsed])
+
+    def __len__(self) -> int:
+        return len(self.starts_ms)
+
+    def range_indices(self, start_ms: int, end_ms: int) -> Tuple[int, int]:
+        """Returns the [lo, hi) slice of segments starting within [start_ms, end_ms], both ends inclusive."""
+        return bisect_left(self.starts_ms, start_ms), bisect_right(self.starts_ms, end_ms)
+
+    def segments_between(self, start_ms: int, end_ms: int) -> List[Tuple[int, str]]:
+        """Returns (start_ms, text) for every segment starting within [start_ms, end_ms]."""
+        lo, hi = self.range_indices(start_ms, end_ms)
+        return list(zip(self.starts_ms[lo:hi], self.texts[lo:hi]))
+
+    def text_between(self, start_ms: int, end_ms: int) -> str:
+        """Joins the text of every segment starting within [start_ms, end_ms]."""
+        lo, hi = self.range_indices(start_ms, end_ms)
+        return " ".join(self.texts[lo:hi]).strip()
@@ -0,0 +1,43 @@
+import io
+import re
+from typing import BinaryIO, Iterable, Iterator, Tuple
+
+from models import TranscriptSegment, VideoTranscript
+from transcript_index import TranscriptIndex, parse_timestamp_ms
+
+# Tactiq.io lines look like "00:01:02.345 text"; headers ("# ...") and the video link line never match
+TRANSCRIPT_LINE_PATTERN = re.compile(r"^(\d{1,2}:\d{2}:\d{2}(?:[.,]\d{1,3})?)\s+(.+?)\s*$")
+
+
+def iter_transcript_segments(lines: Iterable[str]) -> Iterator[TranscriptSegment]:
+    """Yields a TranscriptSegment for every timestamped line, one line at a time."""
+    for line in lines:
+        match = TRANSCRIPT_LINE_PATTERN.match(line.strip())
+        if match:
+            yield TranscriptSegment(start_time=match.group(1), text=match.group(2))
+
+
+def iter_file_lines(file: BinaryIO, encoding: str = "utf-8") -> Iterator[str]:
+    """Streams decoded lines from a binary file object (e.g. an upload) without reading it all into memory."""
+    text = io.TextIOWrapper(file, encoding=encoding, errors="replace", newline=None)
+    try:
+        yield from text
+    finally:
+        text.detach()  # leave the caller's file open
+
+
+def ingest_transcript(lines: Iterable[str]) -> Tuple[VideoTranscript, TranscriptIndex]:
+    """
+    Parses the transcript once into the request's in-memory model and its time index.
+    Start times are parsed to milliseconds in the same pass.
+    """
+    segments = []
+    starts_ms = []
+    for segment in iter_transcript_segments(lines):
+        segments.append(segment)
+        starts_ms.append(parse_timestamp_ms(segment.start_time))
+
+    transcript = VideoTranscript(segments=segments)
+    if any(previous > current for previous, current in zip(starts_ms, starts_ms[1:])):
+        return transcript, TranscriptIndex.from_segments(segments)
+    return transcript, TranscriptIndex(starts_ms, [segment.text for segment in segments])
@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import os
+from typing import Awaitable, Callable, Dict, Optional
+from uuid import uuid4
+
+from fastapi import HTTPException, Request
+from loguru import logger
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# Parts are written to disk in chunks of this size, so memory stays bounded whatever the upload size
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+# 0 = no limit
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", "0"))
+# the source probe starts once this much of the video has been written
+PROBE_HEADER_BYTES = int(os.getenv("PROBE_HEADER_BYTES", str(4 * 1024 * 1024)))
+
+
+class UploadedPart:
+    """One file part of a streamed multipart upload, written to a temporary file and hashed on the fly."""
+
+    def __init__(self, name: str, filename: Optional[str], path: str):
+        self.name = name
+        self.filename = filename
+        self.path = path
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._buffer = bytearray()
+        self._file = open(path, "wb")
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def feed(self, data: bytes):
+        self._digest.update(data)
+        self._buffer += data
+        self.size += len(data)
+
+    async def drain(self, final: bool = False):
+        """Writes the buffered bytes in UPLOAD_CHUNK_SIZE chunks (everything when final) off the event loop."""
+        while len(self._buffer) >= UPLOAD_CHUNK_SIZE or (final and self._buffer):
+            chunk = bytes(self._buffer[:UPLOAD_CHUNK_SIZE])
+            del self._buffer[:len(chunk)]
+            await asyncio.to_thread(self._file.write, chunk)
+        if final:
+            await asyncio.to_thread(self._file.flush)
+
+    @property
+    def written(self) -> int:
+        return self.size - len(self._buffer)
+
+    def close(self):
+        self._file.close()
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def receive_multipart(request: Request, directory: str,
+                            on_probe_ready: Optional[Callable[[UploadedPart], Awaitable[None]]] = None,
+                            probe_part: str = "video_file") -> Dict[str, UploadedPart]:
+    """
+    Streams a multipart/form-data body straight from the socket to temporary files in directory, one
+    UploadedPart per field, without spooling the whole body first. Once PROBE_HEADER_BYTES of probe_part
+    are on disk, on_probe_ready is started in the background (e.g. to ffprobe the source while the rest
+    of it is still arriving).
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    os.makedirs(directory, exist_ok=True)
+    parts: Dict[str, UploadedPart] = {}
+    state = {"part": None, "field": b"", "value": b"", "headers": {}}
+
+    def on_header_field(data: bytes, start: int, end: int):
+        state["field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["field"].lower()] = state["value"]
+        state["field"], state["value"] = b"", b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        name = disposition.get(b"name", b"").decode()
+        filename = disposition[b"filename"].decode() if b"filename" in disposition else None
+        part = UploadedPart(name, filename, os.path.join(directory, f".upload-{uuid4().hex}.part"))
+        if name in parts:
+            parts.pop(name).discard()
+        parts[name] = state["part"] = part
+        state["headers"] = {}
+
+    def on_part_data(data: bytes, start: int, end: int):
+        state["part"].feed(data[start:end])
+
+    parser = MultipartParser(options[b"boundary"], {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+    })
+
+    received = 0
+    probe_task = None
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if UPLOAD_MAX_BYTES and received > UPLOAD_MAX_BYTES:
+                raise HTTPException(status_code=413, detail=f"Upload is larger than {UPLOAD_MAX_BYTES} bytes")
+            parser.write(chunk)
+            for part in parts.values():
+                await part.drain()
+
+            probed = parts.get(probe_part)
+            if on_probe_ready and probe_task is None and probed and probed.written >= PROBE_HEADER_BYTES:
+                await probed.drain(final=True)  # make the header bytes visible to the probe
+                probe_task = asyncio.ensure_future(on_probe_ready(probed))
+        parser.finalize()
+
+        for part in parts.values():
+            await part.drain(final=True)
+            part.close()
+        if on_probe_ready and probe_task is None and probe_part in parts:
+            probe_task = asyncio.ensure_future(on_probe_ready(parts[probe_part]))
+        if probe_task is not None:
+            await probe_task
+
+    except BaseException:
+        if probe_task is not None:
+            probe_task.cancel()
+        for part in parts.values():
+            part.discard()
+        raise
+
+    logger.info("Received upload: " + ", ".join(f"{part.name} ({part.size} bytes)" for part in parts.values()))
+    return parts
+
+
+def store_upload(part: UploadedPart, directory: str, default_extension: str = ".mp4") -> str:
+    """
+    Moves an uploaded part to a content-addressed path (its sha256), so re-uploading the same file reuses
+    the stored copy. Returns the final path.
+    """
+    extension = os.path.splitext(part.filename or "")[1].lower() or default_extension
+    path = os.path.join(directory, f"{part.sha256}{extension}")
+    if os.path.exists(path):
+        os.remove(part.path)
+    else:
+        os.replace(part.path, path)
+    part.path = path
+    return path
@@ -0,0 +1,181 @@
+"""
+Job worker processes for the /jobs/ API.
+
+    python worker.py --workers 4
+
+Each process claims jobs from the persistent queue (jobs.JobStore) and runs process_video_cut_request, up to
+WORKER_JOB_CONCURRENCY at a time: their LLM selections and renders share the process's pools (batch.py), so the
+next job is selected while the previous one renders. Scale by starting more worker processes on the same host;
+they all share the same SQLite queue.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Set
+
+from loguru import logger
+
+from jobs import JOB_DB_PATH, JobStore
+
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "5"))
+JOB_PROGRESS_INTERVAL_SECONDS = float(os.getenv("JOB_PROGRESS_INTERVAL_SECONDS", "1"))
+# jobs run at the same time by one worker process
+WORKER_JOB_CONCURRENCY = int(os.getenv("WORKER_JOB_CONCURRENCY", "2"))
+# Worker i serves its own Prometheus /metrics on WORKER_METRICS_PORT + i (0 = off)
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+
+
+async def run_job(store: JobStore, job_id: str, payload: Dict, heartbeat_seconds: float = JOB_HEARTBEAT_SECONDS):
+    """Runs one job, sending heartbeats and stopping it when a cancellation is requested."""
+    from batch import encode_pool, llm_pool
+    from main import process_video_cut_request
+    from models import OutputProfile, VideoTranscript
+
+    transcript = VideoTranscript.parse_raw(payload["transcript"])
+    profiles = [OutputProfile.parse_obj(profile) for profile in payload.get("profiles") or []] or None
+    task = asyncio.create_task(process_video_cut_request(payload["video_path"], transcript,
+                                                         run_id=payload.get("run_id") or job_id, profiles=profiles,
+                                                         llm_pool=llm_pool, encode_pool=encode_pool))
+
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=heartbeat_seconds)
+        if done:
+            break
+        if await asyncio.to_thread(store.heartbeat, job_id):
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            await asyncio.to_thread(store.mark_cancelled, job_id)
+            return
+
+    try:
+        response = task.result()
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {str(e)}")
+        detail = getattr(e, "detail", None) or str(e)
+        await asyncio.to_thread(store.fail, job_id, detail if isinstance(detail, str) else json.dumps(detail))
+        return
+
+    await asyncio.to_thread(store.complete, job_id, {
+        "merged_output": response.merged_video_path,
+        "stage_timings": response.stage_timings,
+        "workspace_peak_bytes": response.workspace_peak_bytes,
+        "renditions": response.renditions,
+        "soundbites": [soundbite.dict() for soundbite in response.soundbites],
+    })
+
+
+async def work(store: JobStore, worker_id: str, poll_seconds: float = JOB_POLL_SECONDS,
+               concurrency: int = WORKER_JOB_CONCURRENCY):
+    """Claims and runs up to `concurrency` jobs at a time, forever."""
+    logger.info(f"Worker {worker_id} started")
+    running: Set[asyncio.Task] = set()
+    while True:
+        if len(running) >= max(1, concurrency):
+            await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            continue
+        claimed = await asyncio.to_thread(store.claim, worker_id)
+        if claimed is None:
+            await asyncio.sleep(poll_seconds)
+            continue
+        job_id, payload = claimed
+        task = asyncio.create_task(run_job(store, job_id, payload))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+
+def progress_sink(store: JobStore, min_interval_seconds: float = JOB_PROGRESS_INTERVAL_SECONDS,
+                  writer: Optional[ThreadPoolExecutor] = None):
+    """
+    Persists FFmpeg progress of jobs (tagged with the job id), at most once per interval per stage/segment.
+    The SQLite writes run on one background thread, in order, so the event loop never waits for them.
+    """
+    last_written: Dict[tuple, float] = {}
+    writer = writer or ThreadPoolExecutor(max_workers=1, thread_name_prefix="progress")
+
+    def sink(event: Dict):
+        if not event.get("run_id"):
+            return
+        key = (event["run_id"], event["stage"], event.get("segment"))
+        now = time.monotonic()
+        if event.get("done") or now - last_written.get(key, 0.0) >= min_interval_seconds:
+            last_written[key] = now
+            writer.submit(write, event)
+
+    def write(event: Dict):
+        try:
+            store.update_progress(event["run_id"], event)
+        except Exception as e:
+            logger.warning(f"Could not store progress of job {event['run_id']}: {str(e)}")
+
+    return sink
+
+
+def serve_metrics(port: int) -> ThreadingHTTPServer:
+    """Serves the span metrics of this process on http://<host>:<port>/metrics from a background thread."""
+    from tracing import metrics
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scrapes every few seconds would flood the log
+
+    server = ThreadingHTTPServer(("", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Serving worker metrics on port {port}")
+    return server
+
+
+def worker_main(db_path: str = JOB_DB_PATH, index: int = 0):
+    """Entry point of one worker process."""
+    from ffmpeg_runner import progress_broker
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    store = JobStore(db_path)
+    progress_broker.add_sink(progress_sink(store))
+    if WORKER_METRICS_PORT:
+        serve_metrics(WORKER_METRICS_PORT + index)
+    asyncio.run(work(store, worker_id))
+
+
+def start_workers(count: int, db_path: str = JOB_DB_PATH) -> List[multiprocessing.Process]:
+    """Spawns worker processes (fresh interpreters, so nothing of the parent's event loop is inherited)."""
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for index in range(count):
+        process = context.Process(target=worker_main, args=(db_path, index), daemon=True)
+        process.start()
+        processes.append(process)
+    logger.info(f"Started {count} job worker processes")
+    return processes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--db", default=JOB_DB_PATH)
+    args = parser.parse_args()
+
+    workers = start_workers(args.workers, args.db)
+    for worker in workers:
+        worker.join()
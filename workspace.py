@@ -0,0 +1,74 @@
+import os
+import shutil
+from typing import Optional
+from uuid import uuid4
+
+from loguru import logger
+
+# Parent of the per-request workspaces, e.g. /dev/shm/video_recap for tmpfs-backed intermediates
+WORKSPACE_ROOT = os.getenv("WORKSPACE_ROOT", os.path.join("uploads", "workspaces"))
+# 0 = no quota
+WORKSPACE_QUOTA_BYTES = int(os.getenv("WORKSPACE_QUOTA_BYTES", str(10 * 1024 ** 3)))
+
+
+class WorkspaceQuotaExceeded(Exception):
+    """Raised when the intermediates of a request use more disk space than its quota."""
+
+    def __init__(self, used_bytes: int, quota_bytes: int):
+        self.used_bytes = used_bytes
+        self.quota_bytes = quota_bytes
+        super().__init__(f"Workspace uses {used_bytes} bytes, over its quota of {quota_bytes} bytes")
+
+
+class Workspace:
+    """
+    Private directory for the intermediates (cuts, subtitles, rendered segments) of one request, so concurrent
+    requests on the same timestamps never share files. Usage is checked against a byte quota after every
+    stage, the peak is recorded, and the whole directory is removed when the request ends.
+    """
+
+    def __init__(self, root: str = WORKSPACE_ROOT, quota_bytes: int = WORKSPACE_QUOTA_BYTES,
+                 name: Optional[str] = None):
+        self.path = os.path.join(root, name or uuid4().hex)
+        self.quota_bytes = quota_bytes
+        self.peak_bytes = 0
+        os.makedirs(self.path, exist_ok=True)
+
+    def file(self, filename: str) -> str:
+        """Returns the path of a file inside the workspace."""
+        return os.path.join(self.path, filename)
+
+    def usage(self) -> int:
+        """Returns the bytes currently used by the files in the workspace."""
+        used = 0
+        for directory, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                try:
+                    used += os.path.getsize(os.path.join(directory, filename))
+                except FileNotFoundError:
+                    pass  # removed by a concurrent stage
+        return used
+
+    def check(self) -> int:
+        """Records the current usage and raises WorkspaceQuotaExceeded if it is over the quota."""
+        used = self.usage()
+        self.peak_bytes = max(self.peak_bytes, used)
+        if self.quota_bytes and used > self.quota_bytes:
+            raise WorkspaceQuotaExceeded(used, self.quota_bytes)
+        return used
+
+    def release(self, *paths: str):
+        """Removes intermediates a downstream stage has consumed, after recording the usage with them."""
+        self.peak_bytes = max(self.peak_bytes, self.usage())
+        for path in filter(None, paths):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def cleanup(self):
+        """Removes the workspace and everything left in it."""
+        self.peak_bytes = max(self.peak_bytes, self.usage())
+        shutil.rmtree(self.path, ignore_errors=True)
+        logger.info(f"Removed workspace {self.path} (peak usage {self.peak_bytes} bytes)")
+